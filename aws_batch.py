@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError, ConnectionError as BotoConnectionError
+
+# 批量操作的默认并发数
+BATCH_WORKERS = 16
+# 被限流时的最多重试次数和退避时间（秒）
+THROTTLE_RETRIES = 8
+THROTTLE_BASE_DELAY = 0.5
+THROTTLE_MAX_DELAY = 20.0
+# AWS 返回的限流错误码
+THROTTLE_CODES = {'ThrottlingException', 'TooManyRequestsException', 'Throttling', 'RequestLimitExceeded'}
+# 服务端暂时性错误，幂等的写操作可以重试
+TRANSIENT_CODES = {'InternalFailureException', 'InternalServerException', 'ServiceUnavailableException'}
+
+_backoff_state = threading.local()
+
+
+def is_throttled(error):
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in THROTTLE_CODES
+
+
+def is_retryable(error):
+    """限流、服务端暂时性错误和网络错误"""
+    if isinstance(error, BotoConnectionError):
+        return True
+    return isinstance(error, ClientError) and error.response.get('Error', {}).get('Code') in \
+        THROTTLE_CODES | TRANSIENT_CODES
+
+
+def in_backoff():
+    """当前线程是否正在 call_with_backoff 中执行：此时由 call_with_backoff 负责重试，AWS 客户端不应再自行重试"""
+    return getattr(_backoff_state, 'active', False)
+
+
+def backoff_delay(attempt, base=THROTTLE_BASE_DELAY, cap=THROTTLE_MAX_DELAY):
+    """指数退避加全抖动：在 [0, min(cap, base * 2^attempt)] 中随机取值"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class TokenBucket:
+    """
+    令牌桶限速：平均每秒 rate 个请求，最多连续 burst 个
+
+    acquire() 阻塞到拿到令牌为止，多个线程共享一个实例。
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(1, rate))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimiter:
+    """
+    自适应并发限制
+
+    被限流时并发上限减半（每秒最多一次），之后每成功一次上限增加 1/上限，
+    逐步恢复到 max_concurrency。
+    """
+
+    def __init__(self, max_concurrency):
+        self.max_concurrency = max_concurrency
+        self.limit = float(max_concurrency)
+        self.throttled = 0
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        with self._cond:
+            while self._in_flight >= int(self.limit):
+                self._cond.wait()
+            self._in_flight += 1
+
+    def release(self, throttled=False):
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                self.throttled += 1
+                now = time.monotonic()
+                if now - self._last_decrease > 1.0:
+                    self.limit = max(1.0, self.limit / 2)
+                    self._last_decrease = now
+            else:
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / self.limit)
+            self._cond.notify_all()
+
+
+def call_with_backoff(fn, limiter=None, retries=THROTTLE_RETRIES, bucket=None, retryable=is_retryable):
+    """
+    调用 fn()，被限流或遇到暂时性错误时退避重试
+
+    fn() 中通过 get_client 取得的客户端不做 botocore 重试（见 in_backoff），
+    限流只在这里处理，AdaptiveLimiter 才能看到每一次限流。
+
+    参数:
+        fn: 无参数的调用
+        limiter: AdaptiveLimiter，为空时不限制并发
+        retries: 最多重试次数
+        bucket: TokenBucket，每次尝试前先取令牌，为空时不限速
+        retryable: 判断异常是否可以重试
+
+    返回:
+        fn() 的返回值
+
+    异常:
+        fn() 抛出的异常；重试次数用完后抛出最后一次的异常
+    """
+    attempt = 0
+    while True:
+        if bucket:
+            bucket.acquire()
+        if limiter:
+            limiter.acquire()
+        active = in_backoff()
+        _backoff_state.active = True
+        try:
+            result = fn()
+        except Exception as e:
+            if limiter:
+                limiter.release(throttled=is_throttled(e))
+            if not retryable(e) or attempt >= retries:
+                raise
+            time.sleep(backoff_delay(attempt))
+            attempt += 1
+            continue
+        finally:
+            _backoff_state.active = active
+        if limiter:
+            limiter.release()
+        return result
+
+
+def run_batch(fn, items, workers=BATCH_WORKERS, rate=None, retryable=is_retryable):
+    """
+    并发执行 fn(item)，按 items 的顺序逐个产出结果
+
+    前面的条目完成后立即产出，不用等全部完成；后面的条目即使先完成也会等前面的。
+
+    参数:
+        fn: 对单个条目的操作
+        items: 条目列表
+        workers: 并发数
+        rate: 每秒最多请求数（包括重试），为空时不限速
+        retryable: 判断异常是否可以重试，默认重试限流、服务端暂时性错误和网络错误；fn 不是幂等操作时应只重试限流
+
+    返回:
+        生成器，每项为 (item, result, error)，成功时 error 为 None
+    """
+    limiter = AdaptiveLimiter(workers)
+    bucket = TokenBucket(rate) if rate else None
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        futures = [executor.submit(call_with_backoff, lambda item=item: fn(item), limiter,
+                                   bucket=bucket, retryable=retryable) for item in items]
+        for item, future in zip(items, futures):
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+    finally:
+        # 中途停止迭代（如 Ctrl+C）时不再执行剩下的条目
+        executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,99 @@
+import threading
+import boto3
+from botocore.config import Config
+from aws_batch import in_backoff
+import config_in
+from log import logger
+
+AWS_DEFAULT_REGION = "ap-southeast-1"
+# 每个客户端的 HTTP 连接池大小，需大于并发下载/批量操作的线程数
+AWS_MAX_POOL_CONNECTIONS = 32
+
+# 账号编号 -> config_in 中的 (AccessKey, SecretKey) 配置名
+#   1: softgrid aws（IoT / STS）
+#   'ota': OTA 软件包所在的 S3 桶
+AWS_ACCOUNTS = {
+    1: ('AWS_ACCESS_KEY_ID', 'AWS_SECRET_ACCESS_KEY'),
+    'ota': ('CONFIG_AWS_KEY', 'CONFIG_AWS_SECRET_KEY'),
+}
+
+
+class ClientRegistry:
+    """
+    进程内共享的 boto3 客户端
+
+    每个账号只建立一个 boto3 Session，客户端按 (服务, 区域, 账号) 缓存并复用，
+    避免每次调用都重新解析 endpoint、重新建立 TLS 连接。boto3 客户端本身是线程安全的，
+    但 Session 创建客户端不是，所以创建过程在锁内完成。
+
+    在 call_with_backoff 中调用时返回不做 botocore 重试的客户端，限流交给 AdaptiveLimiter 和退避处理，
+    否则 botocore 内部的重试会掩盖限流，并发上限不会下降；其他调用使用 botocore 的标准重试。
+    """
+
+    def __init__(self, max_pool_connections=AWS_MAX_POOL_CONNECTIONS):
+        self._config = Config(max_pool_connections=max_pool_connections,
+                              retries={'max_attempts': 5, 'mode': 'standard'})
+        self._backoff_config = Config(max_pool_connections=max_pool_connections,
+                                      retries={'max_attempts': 1, 'mode': 'standard'})
+        self._sessions = {}
+        self._clients = {}
+        self._account_ids = {}
+        self._lock = threading.Lock()
+
+    def _session(self, account):
+        session = self._sessions.get(account)
+        if session is None:
+            if account not in AWS_ACCOUNTS:
+                raise ValueError(f"未知的 AWS 账号: {account}")
+            key_name, secret_name = AWS_ACCOUNTS[account]
+            session = boto3.session.Session(
+                aws_access_key_id=getattr(config_in, key_name),
+                aws_secret_access_key=getattr(config_in, secret_name),
+            )
+            self._sessions[account] = session
+        return session
+
+    def client(self, service_name, account=1, region=AWS_DEFAULT_REGION):
+        """
+        返回缓存的客户端，不存在时创建
+
+        参数:
+            service_name: 服务名，如 iot / iot-data / sts / s3
+            account: AWS_ACCOUNTS 中的账号编号
+            region: 区域
+
+        异常:
+            ValueError: 账号编号不存在
+        """
+        backoff = in_backoff()
+        key = (service_name, region, account, backoff)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                config = self._backoff_config if backoff else self._config
+                client = self._session(account).client(service_name, region_name=region, config=config)
+                self._clients[key] = client
+                logger.debug(f"创建 AWS 客户端 {service_name} ({region}, 账号 {account}"
+                             f"{', 不重试' if backoff else ''})")
+        return client
+
+    def account_id(self, account=1):
+        """通过 STS 查询账号 ID，结果在进程内缓存"""
+        account_id = self._account_ids.get(account)
+        if account_id is None:
+            account_id = self.client('sts', account).get_caller_identity()['Account']
+            self._account_ids[account] = account_id
+        return account_id
+
+    def clear(self):
+        """丢弃所有缓存的客户端（如凭证变更后）"""
+        with self._lock:
+            self._sessions.clear()
+            self._clients.clear()
+            self._account_ids.clear()
+
+
+client_registry = ClientRegistry()
@@ -1,102 +1,129 @@
 import boto3
 import json
+import threading
+import time
 import traceback
+from functools import cached_property
 from datetime import datetime, timezone, timedelta
-import config_in
+from botocore.exceptions import ClientError
+from aws_clients import client_registry, AWS_DEFAULT_REGION
+from aws_batch import BATCH_WORKERS, run_batch, is_retryable
 
-def get_client(service_name: str, aws: int, region: str = "ap-southeast-1") -> boto3.client:
+# get_shadow 默认复用多少秒内获取的影子
+SHADOW_CACHE_TTL = 10
+# list_things 每页的数量（API 上限 250）
+LIST_PAGE_SIZE = 250
+# mode 2 每秒最多发出的 UpdateThingShadow 请求数，需小于账号的 Device Shadow API 配额
+SHADOW_UPDATE_RATE = 50
+
+def get_client(service_name: str, aws: int, region: str = AWS_DEFAULT_REGION) -> boto3.client:
     '''
 
     :param service_name: iot or iot-data
     :param aws: 1: softgrid aws 2: chevalier aws
     :param region: default: ap-southeast-1
-    :return: boto3.client or None
+    :return: boto3.client or None (shared, cached per service/region/account)
     '''
-    if aws == 1:
-        # softgrid aws
-        aws_access_key_id = config_in.AWS_ACCESS_KEY_ID
-        aws_secret_access_key = config_in.AWS_SECRET_ACCESS_KEY
-    else:
+    if aws != 1:
         print(f"please input correct aws number")
         return None
-    iot_client = boto3.client(
-        service_name,
-        aws_access_key_id=aws_access_key_id,
-        aws_secret_access_key=aws_secret_access_key,
-        region_name=region
+    return client_registry.client(service_name, aws, region)
+
+def get_account_id(aws: int) -> str:
+    '''
+    :param aws: 1: softgrid aws
+    :return: the account id, cached after the first STS call
+    '''
+    return client_registry.account_id(aws)
+
+def put_desired(thing_name, desired_state: dict, aws: int) -> int:
+    '''
+    :return: the shadow version after the update; raises on any error (used by the bulk update)
+    '''
+    iot_client = get_client('iot-data', aws)
+    response = iot_client.update_thing_shadow(
+        thingName=thing_name,
+        payload=json.dumps({
+                'state': {
+                    'desired': desired_state
+                }
+        })
     )
-    return iot_client
+    invalidate_shadow(thing_name, aws)
+    return json.loads(response['payload'].read()).get('version')
 
 def update_thing_shadow(thing_name, shadow: str, aws: int):
-    # 创建IoT客户端
-    iot_client = get_client('iot-data', aws)
     try:
-        desired_state = json.loads(shadow)
-        response = iot_client.update_thing_shadow(
-            thingName=thing_name,
-            payload=json.dumps({
-                    'state': {
-                        'desired': desired_state
-                    }
-            })
-        )
-        if response['ResponseMetadata']['HTTPStatusCode'] == 200:
-            print(f"{thing_name}: shadow更新为{shadow}成功")
-        else:
-            print(f"{thing_name}: 更新shadow失败，错误信息：{response['ResponseMetadata']['HTTPErrorMessage']}")
+        put_desired(thing_name, json.loads(shadow), aws)
+        print(f"{thing_name}: shadow更新为{shadow}成功")
     except Exception as e:
         print(f"update {thing_name} shadow {shadow} failed")
         print(traceback.format_exc())
 
-def get_thing_shadow(thing_name, aws: int) -> str:
-    # 创建IoT客户端
-    iot_client = get_client('iot-data', aws)
+def load_updated(results_path: str, desired_state: dict) -> set:
+    '''
+    :return: the things whose latest record in the results file is a successful update to desired_state
+    '''
+    latest = {}
     try:
-        shadow = iot_client.get_thing_shadow(thingName=thing_name)
-        #print(f"{shadow}")
-        content = shadow['payload'].read().decode('utf-8')
-        #print(f"{type(content)}")
-        # 解析内容为JSON格式
-        # data = json.loads(content)
-        # 打印解析后的数据
-        # print(f'the_device_{thing_name}_shaodw_is:{content}')
-        #print(json.dumps(data, indent=4))
-        #print(f"{shadow['payload'].read()}")
-        return content
-    except Exception as e:
-        print(traceback.format_exc())
-        return None
+        with open(results_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                latest[record['thing']] = record
+    except OSError:
+        return set()
+    return {thing for thing, record in latest.items()
+            if record['status'] == 'ok' and record['desired'] == desired_state}
 
-def get_thing_version(thing_name, aws: int) -> str:
-    # 创建IoT客户端
-    iot_client = get_client('iot-data', aws)
+def bulk_update_shadow(things, shadow: str, aws: int, workers: int = BATCH_WORKERS,
+                       rate: float = SHADOW_UPDATE_RATE, results_path: str = None) -> list:
+    '''
+    update the desired state of many things concurrently, at most rate requests per second
+    throttling, server errors and network errors are retried with jittered exponential backoff
+    :param results_path: one json record per thing is appended to it; things already updated to
+                         the same desired state in an earlier run are skipped
+    :return: the things that failed
+    '''
+    desired_state = json.loads(shadow)
+    done = load_updated(results_path, desired_state) if results_path else set()
+    todo = [thing for thing in dict.fromkeys(things) if thing and thing not in done]
+    if done:
+        print(f"skip {len(done)} things already updated in {results_path}")
+
+    failed = []
+    results = open(results_path, 'a', encoding='utf-8') if results_path else None
     try:
-        shadow = iot_client.get_thing_shadow(thingName=thing_name)
-        content = shadow['payload'].read().decode('utf-8')
-        jdata = json.loads(content)
-        value = jdata.get("state").get("reported")
-        v = value.get("CurrentVersion") or value.get("app_version")
-        py = value.get("PythonVersion")
-        # print(f'the_device_{thing_name}_version_is:  {v}')
-        return content, v, py
-    except Exception as e:
-        print(traceback.format_exc())
-        return None
+        for thing, version, error in run_batch(lambda thing: put_desired(thing, desired_state, aws), todo,
+                                               workers, rate, is_retryable):
+            record = {'thing': thing, 'desired': desired_state, 'status': 'ok' if error is None else 'failed',
+                      'version': version, 'error': None if error is None else str(error),
+                      'time': datetime.now(timezone.utc).isoformat()}
+            if results:
+                results.write(json.dumps(record, ensure_ascii=False) + '\n')
+                results.flush()
+            if error is None:
+                print(f"{thing}: shadow更新为{shadow}成功 (version {version})")
+            else:
+                failed.append(thing)
+                print(f"{thing}: 更新shadow失败，错误信息：{str(error)}")
+    finally:
+        if results:
+            results.close()
+    print(f"total: {len(todo)}, ok: {len(todo) - len(failed)}, failed: {len(failed)}")
+    if failed and results_path:
+        print(f"rerun the same command to retry the failed things, results: {results_path}")
+    return failed
 
-def get_key_word(thing_name, aws: int, key: str) -> str:
-    # 创建IoT客户端
+def read_shadow(thing_name, aws: int) -> str:
+    '''
+    :return: the shadow document as a json string; raises on any error (used by the batch modes)
+    '''
     iot_client = get_client('iot-data', aws)
-    try:
-        shadow = iot_client.get_thing_shadow(thingName=thing_name)
-        content = shadow['payload'].read().decode('utf-8')
-        jdata = json.loads(content)
-        value = jdata.get("state").get("reported")
-        v = value.get(key)
-        print(f'the_device_{thing_name}_{key}_is:  {v}')
-        return content
-    except Exception as e:
-        print(traceback.format_exc())
-        return None
+    shadow = iot_client.get_thing_shadow(thingName=thing_name)
+    return shadow['payload'].read().decode('utf-8')
 
 def get_latest_metadata_timestamp(metadata):
     """递归提取 metadata 中所有时间戳，返回最大值（秒级）"""
@@ -117,84 +144,223 @@ def get_latest_metadata_timestamp(metadata):
     _extract_timestamps(metadata)
     return max(timestamps) if timestamps else None
 
+def _beijing_time(ts):
+    # 1. 获取UTC时间并附加时区
+    utc_time = datetime.utcfromtimestamp(ts).replace(tzinfo=timezone.utc)
+    # 2. 转换为北京时间（东八区）
+    beijing_time = utc_time.astimezone(timezone(timedelta(hours=8)))
+    # 3. 格式化为目标字符串（去掉时区偏移）
+    return beijing_time.strftime("%Y-%m-%dT%H:%M:%S")
+
+class ShadowSnapshot:
+    '''
+    one fetched shadow document of a thing; every view is parsed lazily and at most once
+    use get_shadow() to share a recent snapshot between the gui and the cli instead of fetching again
+    '''
+
+    def __init__(self, thing_name, content: str, fetched: float = None):
+        self.thing_name = thing_name
+        self.content = content
+        self.fetched = fetched or time.monotonic()
+
+    @cached_property
+    def document(self) -> dict:
+        return json.loads(self.content)
+
+    @cached_property
+    def state(self) -> dict:
+        return self.document.get('state') or {}
+
+    @property
+    def desired(self) -> dict:
+        return self.state.get('desired') or {}
+
+    @property
+    def reported(self) -> dict:
+        return self.state.get('reported') or {}
+
+    @property
+    def metadata(self) -> dict:
+        return self.document.get('metadata') or {}
+
+    @property
+    def version(self):
+        '''the shadow document version, increased on every update'''
+        return self.document.get('version')
+
+    @property
+    def current_version(self):
+        return self.reported.get("CurrentVersion") or self.reported.get("app_version")
+
+    @property
+    def python_version(self):
+        return self.reported.get("PythonVersion")
+
+    @cached_property
+    def latest_timestamp(self):
+        return get_latest_metadata_timestamp(self.metadata)
+
+    @cached_property
+    def latest_reported_timestamp(self):
+        return get_latest_metadata_timestamp(self.metadata.get('reported', {}))
+
+    @property
+    def update_times(self):
+        '''
+        :return: [latest update time, latest reported time] in beijing time, or None
+        '''
+        if self.latest_timestamp and self.latest_reported_timestamp:
+            return [_beijing_time(self.latest_timestamp), _beijing_time(self.latest_reported_timestamp)]
+        return None
+
+    def get(self, path: str, default=None):
+        '''
+        :param path: dotted key path from the document root, such as state.reported.CurrentVersion;
+                     desired.x / reported.x are short for state.desired.x / state.reported.x
+        '''
+        keys = path.split('.')
+        value = self.state if keys[0] in ('desired', 'reported') else self.document
+        for key in keys:
+            if not isinstance(value, dict) or key not in value:
+                return default
+            value = value[key]
+        return value
+
+_shadow_cache = {}
+_shadow_cache_lock = threading.Lock()
+
+def get_shadow(thing_name, aws: int, max_age: float = SHADOW_CACHE_TTL) -> ShadowSnapshot:
+    '''
+    :param max_age: reuse a snapshot fetched less than max_age seconds ago, 0 always fetches
+    :return: ShadowSnapshot; raises on any error
+    '''
+    key = (thing_name, aws)
+    with _shadow_cache_lock:
+        snapshot = _shadow_cache.get(key)
+    if snapshot and time.monotonic() - snapshot.fetched < max_age:
+        return snapshot
+    snapshot = ShadowSnapshot(thing_name, read_shadow(thing_name, aws))
+    with _shadow_cache_lock:
+        _shadow_cache[key] = snapshot
+    return snapshot
+
+def invalidate_shadow(thing_name, aws: int = None):
+    '''drop the cached snapshots of a thing, called after its shadow is updated'''
+    with _shadow_cache_lock:
+        for key in [key for key in _shadow_cache if key[0] == thing_name and aws in (None, key[1])]:
+            del _shadow_cache[key]
+
+def get_thing_shadow(thing_name, aws: int) -> str:
+    try:
+        return get_shadow(thing_name, aws).content
+    except Exception as e:
+        print(traceback.format_exc())
+        return None
+
+def get_thing_version(thing_name, aws: int) -> str:
+    try:
+        shadow = get_shadow(thing_name, aws)
+        # print(f'the_device_{thing_name}_version_is:  {shadow.current_version}')
+        return shadow.content, shadow.current_version, shadow.python_version
+    except Exception as e:
+        print(traceback.format_exc())
+        return None
+
+def get_key_word(thing_name, aws: int, key: str) -> str:
+    try:
+        shadow = get_shadow(thing_name, aws)
+        print(f'the_device_{thing_name}_{key}_is:  {shadow.reported.get(key)}')
+        return shadow.content
+    except Exception as e:
+        print(traceback.format_exc())
+        return None
+
 def get_thing_shadow_update_time(thing_name, aws):
     # 创建IoT Data客户端
     client = get_client('iot-data', aws)
 
     try:
-        # 获取设备影子
-        response = client.get_thing_shadow(thingName=thing_name)
-        # 读取并解析Payload
-        payload = json.loads(response['payload'].read())
-        # 提取时间戳（单位：毫秒）
-        # print(json.dumps(payload, indent=4))
-        # print(type(payload))
-        # timestamp_sec = payload.get('timestamp')
-        # print(timestamp_sec)
-        actual_latest_ts = get_latest_metadata_timestamp(payload.get('metadata', {}))
-        if actual_latest_ts:
-            # 1. 获取UTC时间并附加时区
-            utc_time = datetime.utcfromtimestamp(actual_latest_ts).replace(tzinfo=timezone.utc)
-            # 2. 转换为北京时间（东八区）
-            beijing_time = utc_time.astimezone(timezone(timedelta(hours=8)))
-
-            # 3. 格式化为目标字符串（去掉时区偏移）
-            beijing_str = beijing_time.strftime("%Y-%m-%dT%H:%M:%S")
-            # print(beijing_str)
-
-        actual_latest_ts2 = get_latest_metadata_timestamp(payload['metadata'].get('reported', {}))
-        if actual_latest_ts2:
-            # 1. 获取UTC时间并附加时区
-            utc_time = datetime.utcfromtimestamp(actual_latest_ts2).replace(tzinfo=timezone.utc)
-            # 2. 转换为北京时间（东八区）
-            beijing_time = utc_time.astimezone(timezone(timedelta(hours=8)))
-
-            # 3. 格式化为目标字符串（去掉时区偏移）
-            beijing_str2 = beijing_time.strftime("%Y-%m-%dT%H:%M:%S")
-            # print(beijing_str)
-        if beijing_str and beijing_str2:
-            return [beijing_str, beijing_str2]
-        else:
-            return None
+        return get_shadow(thing_name, aws).update_times
     except client.exceptions.ResourceNotFoundException:
         return f"Thing '{thing_name}'不存在"
     except Exception as e:
         return f"发生错误: {str(e)}"
 
-def list_thing(aws: int):
-    # 创建IoT客户端
-    iot_client = get_client('iot', aws)
-    next_token = None
-    all_things = []
-    try:
-        while True:
-            if next_token:
-                response = iot_client.list_things(nextToken=next_token)
-            else:
-                response = iot_client.list_things()
-            #all_things.extend(response['things'])
-            for item in response['things']:
-                #print(item)
-                if 'thingName' and 'thingTypeName' in item:
-                    all_things.append([item['thingName'], item['thingTypeName']])
-            #print(type(response['things']))
-            #all_things.extend([response['things']['thingName'], response['things']['thingTypeName']])
-            # 检查是否还有更多页面
-            if 'nextToken' in response:
-                next_token = response['nextToken']
-            else:
-                break
-        for thing in all_things:
-            print(thing)
+def iter_thing_pages(aws: int, thing_type: str = None, attribute_name: str = None, attribute_value: str = None,
+                     page_size: int = LIST_PAGE_SIZE):
+    '''
+    list the things page by page, the filters are applied by aws (list_things)
+    the next page is only requested when the caller asks for it, so memory stays flat for huge accounts
+    :param thing_type: such as lbb300
+    :param attribute_name / attribute_value: only the things with this attribute
+    :return: generator of pages, each page is a list of list_things items (thingName, thingTypeName, attributes, ...)
+    '''
+    kwargs = {}
+    if thing_type:
+        kwargs['thingTypeName'] = thing_type
+    if attribute_name:
+        kwargs['attributeName'] = attribute_name
+        if attribute_value:
+            kwargs['attributeValue'] = attribute_value
+    paginator = get_client('iot', aws).get_paginator('list_things')
+    for page in paginator.paginate(PaginationConfig={'PageSize': page_size}, **kwargs):
+        yield page['things']
 
-        for thing in all_things:
-            print(thing[0])
+def iter_things(aws: int, thing_type: str = None, attribute_name: str = None, attribute_value: str = None):
+    '''
+    :return: generator of list_things items, see iter_thing_pages
+    '''
+    for page in iter_thing_pages(aws, thing_type, attribute_name, attribute_value):
+        yield from page
 
+def list_thing(aws: int, thing_type: str = None, attribute_name: str = None, attribute_value: str = None):
+    # 边拉取边输出，每行: thingName thingTypeName
+    count = 0
+    try:
+        for item in iter_things(aws, thing_type, attribute_name, attribute_value):
+            print(f"{item['thingName']}\t{item.get('thingTypeName', '')}")
+            count += 1
+        print(f"total: {count}")
     except Exception as e:
-        #print(f"{e}")
         print(traceback.format_exc())
 
 
+def _format_shadow_result(thing_name, mode, key, shadow):
+    if mode == '1':
+        return f"{thing_name}: {shadow.content}"
+    if mode == '1.1':
+        return f'the_device_{thing_name}_version_is:  {shadow.current_version}  python: {shadow.python_version}'
+    if mode == '4':
+        return f'the_device_{thing_name}_{key}_is:  {shadow.reported.get(key)}'
+    update_time = shadow.update_times
+    if update_time:
+        return f"设备 {thing_name} 影子的最后更新时间: {update_time[0]}, 影子最后上报时间： {update_time[1]}"
+    return f"设备 {thing_name} 影子的最后更新时间: none"
+
+def show_shadows(things, aws: int, mode: str, key: str = None, workers: int = BATCH_WORKERS):
+    '''
+    read the shadows of many things concurrently and print them in the order of things
+    :param mode: 1: whole shadow 1.1: version 4: reported key word 5: latest update time
+    :param workers: concurrent requests, reduced automatically while aws is throttling
+    :return: the number of failed things
+    '''
+    failed = 0
+    for thing, shadow, error in run_batch(lambda thing: get_shadow(thing, aws), things, workers):
+        if error is None:
+            try:
+                print(_format_shadow_result(thing, mode, key, shadow))
+                continue
+            except Exception as e:
+                error = e
+        failed += 1
+        if isinstance(error, ClientError) and error.response['Error']['Code'] == 'ResourceNotFoundException':
+            print(f"Thing '{thing}'不存在")
+        else:
+            print(f"{thing}: 发生错误: {str(error)}")
+    print(f"total: {len(things)}, failed: {failed}")
+    return failed
+
+
 if __name__ == '__main__':
     import argparse
     argpaser = argparse.ArgumentParser()
@@ -208,15 +374,35 @@ if __name__ == '__main__':
                                                                             "    2: update the device's shadow."
                                                                             "    exam: -m 2 -t S0001234 -v 2.3.5 or -m 2 -v 2.3.5 -f haha.txt;"
                                                                             "    3: list all the devices on aws."
-                                                                            "    exam: -m 3"
+                                                                            "    exam: -m 3 --thing-type lbb300"
                                                                             "4: get the key words from reported"
-                                                                            "5: get the latest shadow update time")
+                                                                            "5: get the latest shadow update time"
+                                                                            "    snapshot: save all things and shadows to the local inventory"
+                                                                            "    watch: wait until the things report the -v version"
+                                                                            " (default: their DesiredVersion), exam: -m watch -f haha.txt -v 2.3.5"
+                                                                            "    sync: refresh the local inventory with the things changed since the last sync"
+                                                                            "    inventory: versions from the local inventory,"
+                                                                            " -v 2.3.5 to list the things on a version")
     argpaser.add_argument("-k", "--key", action="store", dest="key", help='''the thing's desired shadow's key word, '''
                                                                                 '''such as: DesiredVersion''')
     argpaser.add_argument("-v", "--value", action="store", dest="value", help='''the thing's desired shadow's value, '''
                                                                           '''such as: 2.1.0''')
     argpaser.add_argument("-p", "--type", action="store", dest="type", help='''the thing's desired shadow's value's type, '''
                                                                               '''such as: int or str, default is str''')
+    argpaser.add_argument("-w", "--workers", action="store", dest="workers", type=int, default=BATCH_WORKERS,
+                          help="concurrent requests for the -f modes, default is %(default)s")
+    argpaser.add_argument("-r", "--rate", action="store", dest="rate", type=float, default=SHADOW_UPDATE_RATE,
+                          help="mode 2: max shadow updates per second, default is %(default)s")
+    argpaser.add_argument("-o", "--results", action="store", dest="results",
+                          help="mode 2: the results file (json lines), default is <file>.results.jsonl with -f;"
+                               " things already updated in it are skipped")
+    argpaser.add_argument("--thing-type", action="store", dest="thing_type",
+                          help="only the things of this thing type, such as: lbb300")
+    argpaser.add_argument("--attribute", action="store", dest="attribute",
+                          help="mode 3: only the things with this attribute, such as: region=sg or region")
+    argpaser.add_argument("--timeout", action="store", dest="timeout", type=float, default=3600,
+                          help="mode watch: max seconds to wait, default is %(default)s")
+    argpaser.add_argument("--db", action="store", dest="db", help="the local inventory database file")
     args = argpaser.parse_args()
 
     if int(args.aws) != 1 and int(args.aws) != 2:
@@ -237,13 +423,9 @@ if __name__ == '__main__':
         for i in things:
             print(i)
         print(f"will get these devices' shadow, if ok, please input yes or no")
-        str = input()
-        if str.upper() == "YES" or str.upper() == "Y":
-            for thing in things:
-                if args.mode == '1':
-                    get_thing_shadow(thing, int(args.aws))
-                elif args.mode == '1.1':
-                    get_thing_version(thing, int(args.aws))
+        answer = input()
+        if answer.upper() == "YES" or answer.upper() == "Y":
+            show_shadows(things, int(args.aws), args.mode, workers=args.workers)
         else:
             print('restart')
             exit()
@@ -272,16 +454,17 @@ if __name__ == '__main__':
         for i in things:
             print(i)
         print(f'will update the desired version number of these devices, if ok,please input yes or no')
-        str = input()
-        if str.upper() == "YES" or str.upper() == "Y":
-            for thing in things:
-                update_thing_shadow(thing, desired_state, int(args.aws))
+        answer = input()
+        if answer.upper() == "YES" or answer.upper() == "Y":
+            results_path = args.results or (f"{args.file}.results.jsonl" if args.file else None)
+            bulk_update_shadow(things, desired_state, int(args.aws), args.workers, args.rate, results_path)
         else:
             print('restart')
             exit()
     elif args.mode == '3':
         #list all the devices on aws
-        list_thing(int(args.aws))
+        attribute_name, _, attribute_value = (args.attribute or '').partition('=')
+        list_thing(int(args.aws), args.thing_type, attribute_name, attribute_value)
     elif args.mode == '4':
         #get the key words from reported shadow
         if args.thing:
@@ -296,10 +479,9 @@ if __name__ == '__main__':
         for i in things:
             print(i)
         print(f"will get these devices' shadow, if ok, please input yes or no")
-        str = input()
-        if str.upper() == "YES" or str.upper() == "Y":
-            for thing in things:
-                get_key_word(thing, int(args.aws), args.key)
+        answer = input()
+        if answer.upper() == "YES" or answer.upper() == "Y":
+            show_shadows(things, int(args.aws), args.mode, args.key, workers=args.workers)
     elif args.mode == '5':
         if args.thing:
             things.append(args.thing)
@@ -313,14 +495,53 @@ if __name__ == '__main__':
         for i in things:
             print(i)
         print(f"will get these devices' shadow, if ok, please input yes or no")
-        str = input()
-        if str.upper() == "YES" or str.upper() == "Y":
-            for thing in things:
-                update_time = get_thing_shadow_update_time(thing, 1)
-                if update_time:
-                    print(f"设备 {thing} 影子的最后更新时间: {update_time[0]}, 影子最后上报时间： {update_time[1]}")
-                else:
-                    print(f"设备 {thing} 影子的最后更新时间: none")
+        answer = input()
+        if answer.upper() == "YES" or answer.upper() == "Y":
+            show_shadows(things, 1, args.mode, workers=args.workers)
+    elif args.mode == 'watch':
+        from convergence import ConvergenceWatcher, CONVERGED, PENDING, STALLED, MISSING
+        if args.thing:
+            things.append(args.thing)
+        elif args.file:
+            with open(args.file, 'r') as f:
+                things = [line.strip() for line in f if line.strip()]
+        else:
+            print(f'please input a thing name or the file of thing names')
+            exit()
+        watcher = ConvergenceWatcher({thing: args.value for thing in things}, int(args.aws), args.workers)
+
+        def show_progress(summary, progress):
+            print(f"\rconverged: {summary[CONVERGED]}  pending: {summary[PENDING]}  stalled: {summary[STALLED]}"
+                  f"  missing: {summary[MISSING]}  ({progress.thing_name}: {progress.reported})   ", end='', flush=True)
 
+        try:
+            watcher.run(args.timeout, show_progress)
+        except KeyboardInterrupt:
+            pass
+        print()
+        for progress in watcher.things.values():
+            if progress.state != CONVERGED:
+                print(f"{progress.thing_name}\t{progress.state}\treported: {progress.reported}\t"
+                      f"target: {progress.target}\t{progress.error or ''}")
+    elif args.mode == 'snapshot':
+        from inventory import Inventory, INVENTORY_DB
+        inventory = Inventory(args.db or INVENTORY_DB)
+        stats = inventory.snapshot(int(args.aws), args.workers, report=print)
+        print(f"things: {stats['things']}, shadows: {stats['shadows']}, no shadow: {stats['missing']}, "
+              f"failed: {stats['failed']}, removed: {stats['pruned']}, saved to {inventory.path}")
+    elif args.mode == 'sync':
+        from inventory import Inventory, INVENTORY_DB
+        inventory = Inventory(args.db or INVENTORY_DB)
+        stats = inventory.sync(int(args.aws), args.workers, report=print)
+        print(", ".join(f"{k}: {v}" for k, v in stats.items()))
+    elif args.mode == 'inventory':
+        from inventory import Inventory, INVENTORY_DB
+        inventory = Inventory(args.db or INVENTORY_DB)
+        if args.value:
+            for device in inventory.devices(args.thing_type, args.value):
+                print(device['name'], device['thing_type'], device['python_version'], device['desired_version'])
+        else:
+            for thing_type, version, count in inventory.version_counts(args.thing_type):
+                print(f"{thing_type}\t{version}\t{count}")
     else:
         print(f'please input the correct parameter')
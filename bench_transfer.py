@@ -0,0 +1,137 @@
+"""
+SFTP 传输速度测试
+
+在本机启动一个模拟网络延迟的 TCP 代理，通过代理连接 SSH 服务器，
+对每个传输参数配置分别测试上传和下载速度。
+
+用法:
+    python bench_transfer.py --host 127.0.0.1 --user test --password test --size 32 --rtt 0 20 100
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from ssh_pool import SSHSession, TRANSFER_PROFILES
+from transfer import TransferProgress, _send_from, download
+
+
+class LatencyProxy:
+    """把本地端口转发到 target，每个方向上增加 rtt/2 的延迟"""
+
+    def __init__(self, target_host, target_port, rtt_ms):
+        self.target = (target_host, target_port)
+        self.delay = rtt_ms / 2000.0
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        self._ready.wait()
+        return self.port
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._handle, '127.0.0.1', 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+        server.close()
+
+    async def _handle(self, client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_connection(*self.target)
+        await asyncio.gather(self._pipe(client_reader, server_writer),
+                             self._pipe(server_reader, client_writer),
+                             return_exceptions=True)
+
+    async def _pipe(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+
+        async def receive():
+            while True:
+                data = await reader.read(65536)
+                queue.put_nowait((loop.time() + self.delay, data))
+                if not data:
+                    return
+
+        async def deliver():
+            while True:
+                due, data = await queue.get()
+                wait = due - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+                if not data:
+                    writer.close()
+                    return
+                writer.write(data)
+                await writer.drain()
+
+        await asyncio.gather(receive(), deliver())
+
+
+def bench_profile(args, port, profile, local_file, size):
+    """返回 (上传 MB/s, 下载 MB/s)"""
+    session = SSHSession('127.0.0.1', args.user, args.password, port=port, timeout=10, profile=profile)
+    ssh = {'client': session}
+    remote_path = f"{args.remote_dir}/dms_bench_{os.getpid()}"
+    try:
+        session.connect()
+        start = time.monotonic()
+        _send_from(ssh, local_file, remote_path, 0, TransferProgress(size))
+        upload = size / (time.monotonic() - start) / 1024 / 1024
+
+        with tempfile.TemporaryDirectory() as tmp:
+            start = time.monotonic()
+            download(ssh, remote_path, os.path.join(tmp, 'download'))
+            download_rate = size / (time.monotonic() - start) / 1024 / 1024
+        session.open_sftp().remove(remote_path)
+        return upload, download_rate
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SFTP 传输速度测试")
+    parser.add_argument('--host', default='127.0.0.1', help="SSH 服务器地址")
+    parser.add_argument('--port', type=int, default=22, help="SSH 服务器端口")
+    parser.add_argument('--user', required=True, help="SSH 用户名")
+    parser.add_argument('--password', required=True, help="SSH 密码")
+    parser.add_argument('--size', type=int, default=32, help="测试文件大小（MB）")
+    parser.add_argument('--rtt', type=int, nargs='+', default=[0, 20, 100], help="模拟的往返延迟（毫秒）")
+    parser.add_argument('--profiles', nargs='+', default=list(TRANSFER_PROFILES), help="要测试的传输参数配置")
+    parser.add_argument('--remote-dir', default='/tmp', help="服务器上存放测试文件的目录")
+    args = parser.parse_args()
+
+    size = args.size * 1024 * 1024
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(os.urandom(size))
+        local_file = f.name
+
+    print(f"{'RTT(ms)':>8} {'配置':>8} {'上传 MB/s':>10} {'下载 MB/s':>10}")
+    try:
+        for rtt in args.rtt:
+            proxy = LatencyProxy(args.host, args.port, rtt)
+            port = proxy.start()
+            try:
+                for profile in args.profiles:
+                    try:
+                        upload, download_rate = bench_profile(args, port, profile, local_file, size)
+                        print(f"{rtt:>8} {profile:>8} {upload:>10.2f} {download_rate:>10.2f}")
+                    except Exception as e:
+                        print(f"{rtt:>8} {profile:>8} 失败: {e}")
+            finally:
+                proxy.stop()
+    finally:
+        os.remove(local_file)
+
+
+if __name__ == '__main__':
+    main()
@@ -4,10 +4,25 @@ from PyQt5.QtWidgets import QFileDialog, QDialog, QVBoxLayout, QListWidget, QLab
 from PyQt5.QtWidgets import QDateTimeEdit
 from PyQt5.QtGui import QPixmap, QFont
 from PyQt5.QtCore import Qt, QSize, QDateTime
-from aws_tool import get_thing_shadow
+from aws_tool import get_shadow
+from thing_win import ThingPickerDialog
+from worker import run_async
 import images_rc
 from log import logger
 
+# 各设备类型 INIT 模式使用的默认影子配置文件
+SHADOW_FILES = {
+    "LMDC": os.path.join("Shadow", "LMDC_shadow.json"),
+    "LMDC-V2": os.path.join("Shadow", "LMDC_shadow.json"),
+    "LBB300": os.path.join("Shadow", "LBB300_shadow.json"),
+    "LBB400": os.path.join("Shadow", "LBB400_shadow.json"),
+}
+
+
+def desired_shadow(thing_name):
+    """读取设备影子的 state.desired（在后台线程中执行）"""
+    return get_shadow(thing_name, 1).desired
+
 
 class TimeRangeDialog(QDialog):
     def __init__(self, parent=None):
@@ -132,14 +147,17 @@ class DownloadDialog(QDialog):
 
 
 class ImageDialog(QDialog):
-    def __init__(self, device_type, mode_value, sn, parent=None):
+    def __init__(self, device_type, mode_value, sn, parent=None, thing_type=None):
         super().__init__(parent)
         self.device_type = device_type
+        self.thing_type = thing_type
         self.mode_value = mode_value
         self.shadow_content = None
         self.result_data = None
         self.up_shadow_data = None
         self.sn = sn
+        self.loading = False
+        self.btn_copy_config = None
         self._setup_ui()
         self._load_device_image(self.device_type)
 
@@ -191,10 +209,10 @@ class ImageDialog(QDialog):
         # 配置操作按钮（一行）
         config_btn_layout = QHBoxLayout()
 
-        btn_get_config = QPushButton("获取Shadow")
-        btn_get_config.setFont(font)
-        btn_get_config.clicked.connect(self._on_get_config)
-        config_btn_layout.addWidget(btn_get_config)
+        self.btn_get_config = QPushButton("获取Shadow")
+        self.btn_get_config.setFont(font)
+        self.btn_get_config.clicked.connect(self._on_get_config)
+        config_btn_layout.addWidget(self.btn_get_config)
 
         btn_save_config = QPushButton("保存Shadow")
         btn_save_config.setFont(font)
@@ -203,6 +221,13 @@ class ImageDialog(QDialog):
 
         control_layout.addLayout(config_btn_layout)
 
+        # INIT 模式可以参考 AWS 上同类型设备的 Shadow
+        if self.mode_value['mode'] == "INIT":
+            self.btn_copy_config = QPushButton("参考已有设备")
+            self.btn_copy_config.setFont(font)
+            self.btn_copy_config.clicked.connect(self._on_copy_config)
+            control_layout.addWidget(self.btn_copy_config)
+
         # 关闭按钮（独立一行）
         btn_close = QPushButton("关闭")
         btn_close.setFont(font)
@@ -235,15 +260,8 @@ class ImageDialog(QDialog):
         """获取配置按钮点击事件"""
         if self.mode_value['mode'] == "INIT":
             try:
-                if self.device_type in ["LMDC-V2", "LMDC"]:
-                    # 获取当前目录下的Shadow/LMDC_shadow.jsonc文件
-                    shadow_file_path = os.path.join("Shadow", "LMDC_shadow.json")
-                if self.device_type in ["LBB300"]:
-                    # 获取当前目录下的Shadow/LMDC_shadow.jsonc文件
-                    shadow_file_path = os.path.join("Shadow", "LBB300_shadow.json")
-                if self.device_type in ["LBB400"]:
-                    # 获取当前目录下的Shadow/LMDC_shadow.jsonc文件
-                    shadow_file_path = os.path.join("Shadow", "LBB400_shadow.json")
+                # 获取当前目录下的Shadow/<设备类型>_shadow.json文件
+                shadow_file_path = SHADOW_FILES[self.device_type]
 
                 # 读取文件内容
                 with open(shadow_file_path, 'r', encoding='utf-8') as file:
@@ -258,24 +276,41 @@ class ImageDialog(QDialog):
                 self.shaw_display.setPlainText(f"Error: {str(e)}")
 
         elif self.mode_value['mode'] == "OTA" or self.mode_value['mode'] == "SWITCH":
-            self.shadow_content = get_thing_shadow(self.sn['value'], 1)
-            try:
-                # 将 shadow_content 解析为 JSON
-                shadow_json = json.loads(self.shadow_content)
+            # 取 state.desired，之后获取版本时复用同一份影子
+            self._load_desired(self.sn['value'], "处理 shadow 数据时出错")
 
-                # 提取 state.desired 数据（如果存在）
-                desired_data = shadow_json.get('state', {}).get('desired', {})
+    def _on_copy_config(self):
+        """从 AWS 上选择一台同类型设备，把它的 desired 配置作为模板"""
+        dialog = ThingPickerDialog(self.thing_type, self)
+        if not dialog.exec_() or not dialog.selected_thing:
+            return
+        self._load_desired(dialog.selected_thing, f"获取 {dialog.selected_thing} 的 shadow 失败")
 
-                # 将 desired_data 格式化为带缩进的 JSON 字符串，便于显示
-                formatted_desired = json.dumps(desired_data, indent=2, ensure_ascii=False)
-                self.shadow_content = formatted_desired
-                self.shaw_display.setPlainText(self.shadow_content)
-                self.shaw_display.setReadOnly(False)
+    def _load_desired(self, thing_name, error_text):
+        """在后台线程中读取设备影子的 desired，完成后显示到 shaw_display"""
+        if self.loading:
+            return
+        self._set_loading(True)
+        self.shaw_display.setPlainText(f"正在获取 {thing_name} 的 shadow...")
 
-            except json.JSONDecodeError as e:
-                self.shaw_display = f"解析 shadow 内容出错: {str(e)}"
-            except Exception as e:
-                self.shaw_display = f"处理 shadow 数据时出错: {str(e)}"
+        def on_result(desired_data):
+            # 将 desired_data 格式化为带缩进的 JSON 字符串，便于显示
+            self.shadow_content = json.dumps(desired_data, indent=2, ensure_ascii=False)
+            self.shaw_display.setPlainText(self.shadow_content)
+            self.shaw_display.setReadOnly(False)
+
+        def on_error(err):
+            exctype, value, tb = err
+            self.shaw_display.setPlainText(f"{error_text}: {value}")
+
+        run_async(desired_shadow, thing_name, on_result=on_result, on_error=on_error,
+                  on_finished=lambda: self._set_loading(False))
+
+    def _set_loading(self, loading):
+        self.loading = loading
+        self.btn_get_config.setEnabled(not loading)
+        if self.btn_copy_config is not None:
+            self.btn_copy_config.setEnabled(not loading)
 
     def _on_save_config(self):
         """保存配置按钮点击事件"""
@@ -333,6 +368,11 @@ class ImageDialog(QDialog):
     def _close(self):
         self.close()
 
+    def reject(self):
+        # 加载中不允许关闭窗口，避免回调访问已销毁的控件
+        if not self.loading:
+            super().reject()
+
     def _load_device_image(self, device_type):
         """加载并适配图片"""
         if device_type == "LMDC":
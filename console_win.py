@@ -0,0 +1,25 @@
+from PyQt5.QtWidgets import QPlainTextEdit
+from PyQt5.QtCore import pyqtSignal
+from PyQt5.QtGui import QFont
+
+# 控制台最多保留的行数，超出后自动丢弃最早的行
+CONSOLE_MAX_LINES = 2000
+
+
+class ConsoleWidget(QPlainTextEdit):
+    """只读的命令输出控制台，append_line 可以在任意线程调用"""
+
+    line_received = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setFont(QFont('Consolas', 10))
+        self.setMaximumBlockCount(CONSOLE_MAX_LINES)
+        self.setLineWrapMode(QPlainTextEdit.NoWrap)
+        # 后台线程 emit 时 Qt 会排队到主线程执行
+        self.line_received.connect(self.appendPlainText)
+
+    def append_line(self, stream, line):
+        """stream_exec 的行回调，stderr 的行加上前缀"""
+        self.line_received.emit(f"[err] {line}" if stream == 'stderr' else line)
@@ -0,0 +1,137 @@
+import heapq
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from botocore.exceptions import ClientError
+from aws_tool import get_shadow
+from aws_batch import BATCH_WORKERS, TokenBucket, call_with_backoff
+
+# 轮询间隔（秒）：影子有变化时用最短间隔，没有变化时逐次加倍到最长间隔
+POLL_MIN_INTERVAL = 5
+POLL_MAX_INTERVAL = 120
+# 所有设备共享的每秒最多读取次数
+WATCH_RATE = 10
+# 超过这个时间（秒）影子都没有任何更新的设备算作停滞
+STALL_AFTER = 600
+# 默认最长等待时间（秒）
+WATCH_TIMEOUT = 3600
+
+CONVERGED, PENDING, STALLED, MISSING = 'converged', 'pending', 'stalled', 'missing'
+
+
+class ThingProgress:
+    """一台设备的升级进度"""
+
+    def __init__(self, thing_name, target=None):
+        self.thing_name = thing_name
+        self.target = target
+        self.reported = None
+        self.state = PENDING
+        self.last_timestamp = None
+        self.last_change = time.monotonic()
+        self.interval = POLL_MIN_INTERVAL
+        self.polls = 0
+        self.error = None
+
+
+class ConvergenceWatcher:
+    """
+    轮询一批设备的影子，直到 reported 的 CurrentVersion/app_version 等于目标版本
+
+    metadata 时间戳有变化（设备在上报）的设备按最短间隔轮询，安静的设备逐步降低频率；
+    所有读取共享一个令牌桶，被限流时退避重试。
+    """
+
+    def __init__(self, targets, aws=1, workers=BATCH_WORKERS, rate=WATCH_RATE, stall_after=STALL_AFTER):
+        """
+        参数:
+            targets: {设备名: 目标版本}，目标版本为空时使用影子中的 desired.DesiredVersion
+            aws: AWS 账号编号
+            workers: 并发读取数
+            rate: 每秒最多读取次数
+            stall_after: 多久没有更新算作停滞（秒）
+        """
+        self.things = {name: ThingProgress(name, target) for name, target in targets.items()}
+        self.aws = aws
+        self.workers = workers
+        self.stall_after = stall_after
+        self._bucket = TokenBucket(rate)
+
+    def summary(self):
+        """{converged/pending/stalled/missing: 数量}"""
+        counts = {CONVERGED: 0, PENDING: 0, STALLED: 0, MISSING: 0}
+        for progress in self.things.values():
+            counts[progress.state] += 1
+        return counts
+
+    def _poll(self, progress):
+        shadow = call_with_backoff(lambda: get_shadow(progress.thing_name, self.aws, max_age=0),
+                                   bucket=self._bucket)
+        return shadow.current_version, shadow.desired.get("DesiredVersion"), shadow.latest_timestamp
+
+    def _update(self, progress, result):
+        now = time.monotonic()
+        progress.polls += 1
+        reported, desired, timestamp = result
+        progress.reported = reported
+        progress.error = None
+        progress.target = progress.target or desired
+        if progress.target and reported == progress.target:
+            progress.state = CONVERGED
+            return
+        if timestamp != progress.last_timestamp:
+            # 第一次轮询或设备刚上报过：保持最短间隔
+            if progress.last_timestamp is not None:
+                progress.last_change = now
+            progress.last_timestamp = timestamp
+            progress.interval = POLL_MIN_INTERVAL
+        else:
+            progress.interval = min(progress.interval * 2, POLL_MAX_INTERVAL)
+        progress.state = STALLED if now - progress.last_change > self.stall_after else PENDING
+
+    def run(self, timeout=WATCH_TIMEOUT, on_update=None, cancel_event=None):
+        """
+        轮询到所有设备完成、超时或被取消
+
+        参数:
+            timeout: 最长等待时间（秒）
+            on_update: 每轮询完一台设备回调一次，参数为 (summary(), ThingProgress)
+            cancel_event: set 后停止
+
+        返回:
+            dict: summary()
+        """
+        deadline = time.monotonic() + timeout
+        queue = [(0.0, name) for name in self.things]
+        heapq.heapify(queue)
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            while queue or running:
+                now = time.monotonic()
+                if now >= deadline or (cancel_event and cancel_event.is_set()):
+                    break
+                while queue and queue[0][0] <= now and len(running) < self.workers:
+                    _, name = heapq.heappop(queue)
+                    progress = self.things[name]
+                    running[executor.submit(self._poll, progress)] = progress
+
+                next_due = queue[0][0] - now if queue else 1.0
+                done, _ = wait(running, timeout=max(0.05, min(1.0, next_due)), return_when=FIRST_COMPLETED)
+                for future in done:
+                    progress = running.pop(future)
+                    try:
+                        self._update(progress, future.result())
+                    except ClientError as e:
+                        if e.response['Error']['Code'] == 'ResourceNotFoundException':
+                            progress.state = MISSING
+                        progress.error = str(e)
+                        progress.interval = POLL_MAX_INTERVAL
+                    except Exception as e:
+                        progress.error = str(e)
+                        progress.interval = min(progress.interval * 2, POLL_MAX_INTERVAL)
+                    if progress.state not in (CONVERGED, MISSING):
+                        heapq.heappush(queue, (time.monotonic() + progress.interval, progress.thing_name))
+                    if on_update:
+                        on_update(self.summary(), progress)
+            for future in running:
+                future.cancel()
+        return self.summary()
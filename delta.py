@@ -0,0 +1,208 @@
+import hashlib
+import io
+import os
+import shlex
+import tarfile
+import tempfile
+from ssh_stream import stream_exec
+from transfer import TransferProgress
+from log import logger
+
+# 需要更新的文件超过这个比例时直接传完整软件包
+DELTA_MAX_RATIO = 0.7
+_SHA_MARKER = "__DMS_SHA__"
+_LIST_MARKER = "__DMS_LIST__"
+# 设备上记录最近一次部署的软件包文件清单（相对 target_dir），增量更新只删除旧软件包中有、新软件包中没有的文件
+PACKAGE_LIST = ".dms_package_files"
+
+
+class DeltaVerifyError(Exception):
+    """增量更新后设备上的文件与软件包不一致"""
+
+
+def _normalize(name):
+    """tar 成员名和 find 输出统一成不带 ./ 前缀的相对路径"""
+    while name.startswith('./'):
+        name = name[2:]
+    return name.rstrip('/')
+
+
+def local_manifest(package_path):
+    """
+    读取本地软件包中每个普通文件的 SHA-256 和权限
+
+    返回:
+        dict: {相对路径: (sha256, mode)}；软件包中有硬链接时返回 None（不支持增量）
+    """
+    manifest = {}
+    with tarfile.open(package_path, 'r:*') as tar:
+        for member in tar:
+            if member.islnk():
+                return None
+            if not member.isfile():
+                continue
+            sha = hashlib.sha256()
+            f = tar.extractfile(member)
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha.update(chunk)
+            manifest[_normalize(member.name)] = (sha.hexdigest(), member.mode & 0o7777)
+    return manifest
+
+
+def package_files(package_path):
+    """软件包中普通文件的相对路径（只读 tar 头，不计算校验值）"""
+    with tarfile.open(package_path, 'r:*') as tar:
+        return [_normalize(member.name) for member in tar if member.isfile()]
+
+
+def remote_manifest(ssh, target_dir, paths):
+    """
+    读取设备上 target_dir 下 paths 中每个文件的 SHA-256 和权限，以及上次部署的软件包文件清单
+
+    只计算软件包中有的文件，不扫描整个目录（目录下还有 venv、日志和数据）。
+
+    返回:
+        tuple: ({相对路径: (sha256, mode)}, 上次部署的文件列表)；
+        目录不存在时为 ({}, None)，设备上没有文件清单时列表为 None
+    """
+    # 路径列表从 stdin 传入，避免命令行过长
+    command = f"""
+        cd "{target_dir}" 2>/dev/null || {{ cat > /dev/null; exit 0; }}
+        list=$(mktemp)
+        tr '\\n' '\\0' > "$list"
+        sudo xargs -0 stat -c '%a %n' < "$list" 2>/dev/null
+        echo {_SHA_MARKER}
+        sudo xargs -0 sha256sum < "$list" 2>/dev/null
+        rm -f "$list"
+        if [ -f "{PACKAGE_LIST}" ]; then
+            echo {_LIST_MARKER}
+            cat "{PACKAGE_LIST}"
+        fi
+        exit 0
+    """
+    modes, hashes, previous = {}, {}, []
+    section = [modes]
+
+    def on_line(stream, line):
+        if stream != 'stdout' or not line:
+            return
+        if line == _SHA_MARKER:
+            section[0] = hashes
+        elif line == _LIST_MARKER:
+            section[0] = previous
+        elif section[0] is modes:
+            mode, _, path = line.partition(' ')
+            modes[_normalize(path)] = int(mode, 8)
+        elif section[0] is hashes:
+            # "<sha256>  path"
+            hashes[_normalize(line[66:])] = line[:64]
+        else:
+            previous.append(_normalize(line))
+
+    stdin = io.BytesIO('\n'.join(paths).encode('utf-8'))
+    exit_code, output, error = stream_exec(ssh, command, on_line=on_line, idle_timeout=120, tail_lines=1,
+                                           stdin_file=stdin)
+    if exit_code != 0:
+        raise RuntimeError(f"读取设备文件清单失败: {error}")
+    manifest = {path: (sha, modes.get(path)) for path, sha in hashes.items()}
+    return manifest, (previous if section[0] is previous else None)
+
+
+def write_package_list(ssh, target_dir, paths):
+    """把本次部署的软件包文件清单写到设备上，供下次增量更新判断要删除哪些文件"""
+    command = f'sudo tee "{target_dir}/{PACKAGE_LIST}" > /dev/null'
+    stdin = io.BytesIO(('\n'.join(sorted(paths)) + '\n').encode('utf-8'))
+    exit_code, output, error = stream_exec(ssh, command, idle_timeout=60, tail_lines=1, stdin_file=stdin)
+    if exit_code != 0:
+        raise RuntimeError(f"写入软件包文件清单失败: {error}")
+
+
+def record_package_files(ssh, package_path, rule):
+    """完整部署后记录软件包文件清单；失败只影响下次能否增量更新"""
+    try:
+        write_package_list(ssh, rule["target_dir"], package_files(package_path))
+    except Exception as e:
+        logger.error(f"记录软件包文件清单失败: {str(e)}")
+
+
+def plan_delta(local, remote, previous):
+    """
+    比较两个清单
+
+    返回:
+        tuple: (需要传输的文件集合, 需要删除的文件列表)
+        删除的是上次部署的软件包中有、本次软件包中没有的文件，设备上的其他文件不动
+    """
+    changed = {path for path, entry in local.items() if remote.get(path) != entry}
+    removed = sorted(path for path in previous if path not in local)
+    return changed, removed
+
+
+def build_delta_archive(package_path, changed, out_file):
+    """把软件包中的目录、符号链接和 changed 中的文件写成新的 tar.gz"""
+    with tarfile.open(package_path, 'r:*') as src, tarfile.open(fileobj=out_file, mode='w:gz') as dst:
+        for member in src:
+            if member.isfile():
+                if _normalize(member.name) in changed:
+                    dst.addfile(member, src.extractfile(member))
+            else:
+                dst.addfile(member)
+
+
+def deploy_delta(ssh, package_path, rule, progress_callback=None, on_line=None, status_callback=None,
+                 cancel_event=None):
+    """
+    增量部署：只传输设备上内容或权限不同的文件，解压后重新校验软件包中的文件
+
+    参数:
+        ssh: {'client': SSHSession}
+        package_path: 本地 .tar.gz 软件包
+        rule: validation_rules 中的规则
+
+    返回:
+        bool: False 表示不适合增量（首次安装、变化太多等），调用方应改用完整部署
+
+    异常:
+        DeltaVerifyError: 更新后的文件与软件包不一致
+    """
+    target_dir = rule["target_dir"]
+    local = local_manifest(package_path)
+    if not local:
+        return False
+    remote, previous = remote_manifest(ssh, target_dir, list(local))
+    if not remote or previous is None:
+        # 首次安装，或设备上没有上次部署的文件清单（无法确定要删除哪些旧文件）
+        return False
+
+    changed, removed = plan_delta(local, remote, previous)
+    if len(changed) > len(local) * DELTA_MAX_RATIO:
+        logger.info(f"{len(changed)}/{len(local)} 个文件有变化，使用完整软件包")
+        return False
+    logger.info(f"增量更新: 传输 {len(changed)}/{len(local)} 个文件，删除 {len(removed)} 个文件")
+
+    with tempfile.TemporaryFile() as archive:
+        build_delta_archive(package_path, changed, archive)
+        size = archive.tell()
+        archive.seek(0)
+        logger.info(f"增量包 {size} 字节，完整包 {os.path.getsize(package_path)} 字节")
+
+        remove_cmd = f"sudo rm -f -- {' '.join(shlex.quote(path) for path in removed)}" if removed else ":"
+        deploy_cmd = f"""
+            cd "{target_dir}" || exit 1
+            {remove_cmd} < /dev/null
+            sudo tar -xzf - -C "{target_dir}" || exit 1
+            sudo chown -R lmahdb:lmahdb "{target_dir}" < /dev/null
+        """
+        progress = TransferProgress(size, progress_callback, status_callback)
+        exit_code, output, error = stream_exec(ssh, deploy_cmd, on_line=on_line, idle_timeout=60,
+                                               cancel_event=cancel_event, stdin_file=archive,
+                                               stdin_callback=progress.update)
+    if exit_code != 0:
+        raise DeltaVerifyError(f"增量解压失败 (exit code: {exit_code}): {error}")
+
+    after, _ = remote_manifest(ssh, target_dir, list(local))
+    mismatched = [path for path, entry in local.items() if after.get(path) != entry]
+    if mismatched:
+        raise DeltaVerifyError(f"增量更新后 {len(mismatched)} 个文件校验失败，如 {mismatched[0]}")
+    write_package_list(ssh, target_dir, local)
+    return True
@@ -0,0 +1,97 @@
+import asyncio
+import ipaddress
+from concurrent.futures import ThreadPoolExecutor
+from fun import SSH_USERNAME, SSH_PASSWORD, get_local_ip, check_sn, device_types_for_sn
+from ssh_pool import SSHSession
+from probe import probe_device
+from log import logger
+
+SSH_PORT = 22
+# 端口探测超时（秒）和同时探测的主机数
+PROBE_TIMEOUT = 1.0
+PROBE_CONCURRENCY = 256
+# 同时登录读取 SN 的设备数（SSH 握手比较耗 CPU）
+LOGIN_CONCURRENCY = 16
+
+
+def default_network(local_ip=None, prefix=24):
+    """返回本机所在的网段，默认 /24"""
+    local_ip = local_ip or get_local_ip()
+    return str(ipaddress.ip_network(f"{local_ip}/{prefix}", strict=False))
+
+
+async def _probe(ip, port, timeout, semaphore):
+    """探测 ip:port 是否可以建立 TCP 连接"""
+    async with semaphore:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(ip, port), timeout)
+        except (asyncio.TimeoutError, OSError):
+            return False
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
+
+
+def read_device_sn(ip):
+    """登录设备读取 /etc/sn，返回 (sn, 错误信息)"""
+    session = SSHSession(ip, SSH_USERNAME, SSH_PASSWORD, timeout=5)
+    try:
+        session.connect()
+        sn = probe_device({'client': session}, timeout=5)['sn']
+        sn_error = check_sn(sn)
+        return (None, sn_error[1]) if sn_error else (sn, None)
+    except Exception as e:
+        return None, str(e)
+    finally:
+        session.close()
+
+
+async def _discover(network, port, report, progress):
+    hosts = [str(ip) for ip in ipaddress.ip_network(network, strict=False).hosts()]
+    probe_semaphore = asyncio.Semaphore(PROBE_CONCURRENCY)
+    login_semaphore = asyncio.Semaphore(LOGIN_CONCURRENCY)
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=LOGIN_CONCURRENCY)
+    done = [0]
+    devices = []
+
+    async def handle(ip):
+        active = await _probe(ip, port, PROBE_TIMEOUT, probe_semaphore)
+        done[0] += 1
+        progress(int(done[0] * 100 / len(hosts)))
+        if not active:
+            return
+        # 端口开放的主机再登录读取 SN，并按 SN 第10位解析设备类型
+        async with login_semaphore:
+            sn, error = await loop.run_in_executor(executor, read_device_sn, ip)
+        device = {'ip': ip, 'sn': sn, 'device_types': device_types_for_sn(sn) if sn else [], 'error': error}
+        devices.append(device)
+        report(device)
+
+    try:
+        await asyncio.gather(*(handle(ip) for ip in hosts))
+    finally:
+        executor.shutdown(wait=False)
+    return sorted(devices, key=lambda d: ipaddress.ip_address(d['ip']))
+
+
+def discover_devices(network=None, port=SSH_PORT, status_callback=None, progress_callback=None):
+    """
+    并发扫描网段内开放 SSH 端口的设备，并读取 SN 和设备类型
+
+    参数:
+        network: CIDR 网段，如 192.168.1.0/24；为空时使用本机所在的 /24
+        status_callback: 每发现一台设备回调一次，参数为设备 dict
+        progress_callback: 扫描进度回调，参数为百分比
+
+    返回:
+        list[dict]: 按 IP 排序的设备列表，包含 ip/sn/device_types/error
+    """
+    network = network or default_network()
+    logger.info(f"开始扫描网段 {network}")
+    return asyncio.run(_discover(network, port,
+                                 status_callback or (lambda device: None),
+                                 progress_callback or (lambda percent: None)))
@@ -0,0 +1,96 @@
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit, QProgressBar
+from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox
+from PyQt5.QtGui import QFont
+from discovery import default_network, discover_devices
+from worker import run_async
+
+
+class DevicePickerDialog(QDialog):
+    """扫描局域网设备并选择要连接的设备"""
+
+    COLUMNS = ["IP", "SN", "设备类型", "备注"]
+
+    def __init__(self, local_ip=None, parent=None):
+        super().__init__(parent)
+        self.devices = []
+        self.selected_device = None
+        self.scanning = False
+        self._setup_ui(local_ip)
+
+    def _setup_ui(self, local_ip):
+        font = QFont('Arial', 12)
+        self.setWindowTitle("扫描设备")
+        self.resize(700, 500)
+
+        layout = QVBoxLayout()
+
+        scan_layout = QHBoxLayout()
+        self.network_edit = QLineEdit(default_network(local_ip))
+        self.network_edit.setFont(font)
+        self.scan_btn = QPushButton("扫描")
+        self.scan_btn.setFont(font)
+        self.scan_btn.clicked.connect(self._scan)
+        scan_layout.addWidget(QLabel("网段:"))
+        scan_layout.addWidget(self.network_edit, stretch=1)
+        scan_layout.addWidget(self.scan_btn)
+        layout.addLayout(scan_layout)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        layout.addWidget(self.progress_bar)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.doubleClicked.connect(self._select)
+        layout.addWidget(self.table)
+
+        self.select_btn = QPushButton("选择")
+        self.select_btn.setFont(font)
+        self.select_btn.clicked.connect(self._select)
+        layout.addWidget(self.select_btn)
+
+        self.setLayout(layout)
+
+    def _scan(self):
+        if self.scanning:
+            return
+        self.scanning = True
+        self.scan_btn.setEnabled(False)
+        self.devices = []
+        self.table.setRowCount(0)
+        self.progress_bar.setValue(0)
+        run_async(discover_devices, self.network_edit.text().strip(),
+                  on_status=self._add_device, on_progress=self.progress_bar.setValue,
+                  on_error=self._on_error, on_finished=self._on_finished)
+
+    def _add_device(self, device):
+        self.devices.append(device)
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        values = [device['ip'], device['sn'] or "", "/".join(device['device_types']), device['error'] or ""]
+        for column, value in enumerate(values):
+            self.table.setItem(row, column, QTableWidgetItem(value))
+
+    def _on_error(self, err):
+        exctype, value, tb = err
+        QMessageBox.critical(self, "错误", f"扫描失败: {value}")
+
+    def _on_finished(self):
+        self.scanning = False
+        self.scan_btn.setEnabled(True)
+
+    def _select(self):
+        row = self.table.currentRow()
+        if row < 0 or self.scanning:
+            return
+        self.selected_device = self.devices[row]
+        self.accept()
+
+    def reject(self):
+        # 扫描中不允许关闭窗口，避免回调访问已销毁的控件
+        if not self.scanning:
+            super().reject()
@@ -0,0 +1,226 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from aws_tool import get_client
+from config_win import SHADOW_FILES
+from fun import validation_rules, device_software_types, device_thing_types, SSH_USERNAME, SSH_PASSWORD
+from fun import check_sn, device_types_for_sn, validate_init_file, deploy_package, run_install
+from fun import stop_service, is_service_active, create_thing_with_shadow, TRANSFER_PROFILE
+from ssh_pool import session_pool
+from probe import probe_device
+from steps import Step, StepRunner, package_key
+from log import logger
+
+FLEET_MODES = ["INIT", "OTA", "SWITCH"]
+
+# 默认同时操作的设备数量
+DEFAULT_CONCURRENCY = 4
+
+
+def load_fleet_csv(path):
+    """
+    读取设备清单 CSV
+
+    表头: ip, device_type, software_type, package
+    package 为本地软件包路径（相对路径以 CSV 所在目录为基准）；
+    也可以只填 version 列，此时使用 CSV 同目录下的 <prefix>-<version>.tar.gz
+
+    返回:
+        list[dict]: 每台设备一个 dict，包含 ip/device_type/software_type/package
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    targets = []
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            row = {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}
+            if not row.get('ip'):
+                continue
+            software_type = row.get('software_type', '')
+            package = row.get('package', '')
+            if not package and row.get('version') and software_type in validation_rules:
+                package = f"{validation_rules[software_type]['prefix']}-{row['version']}.tar.gz"
+            if package and not os.path.isabs(package):
+                package = os.path.join(base_dir, package)
+            targets.append({
+                'ip': row['ip'],
+                'device_type': row.get('device_type', ''),
+                'software_type': software_type,
+                'package': os.path.normpath(package) if package else '',
+            })
+    return targets
+
+
+def parse_ip_list(text, device_type, software_type, package):
+    """把每行一个 IP 的文本转换成设备清单，所有设备使用相同的类型和软件包"""
+    targets = []
+    for line in text.splitlines():
+        ip = line.split('#')[0].strip()
+        if ip:
+            targets.append({'ip': ip, 'device_type': device_type,
+                            'software_type': software_type, 'package': package})
+    return targets
+
+
+def load_default_shadow(device_type):
+    """读取 INIT 模式使用的默认影子配置"""
+    shadow_file_path = SHADOW_FILES.get(device_type)
+    if not shadow_file_path:
+        return None
+    with open(shadow_file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def fleet_workflow(mode, target):
+    """流程标识：模式、软件和软件包（文件名与修改时间）都相同时才续跑断点"""
+    return f"{mode}:{target['software_type']}:{package_key(target['package'])}"
+
+
+def run_fleet_device(target, mode, report, timings=None):
+    """
+    对单台设备执行 探测 → 创建设备 → 上传 → 停止服务 → 安装 → 校验 流程
+
+    已完成的步骤按 SN 记录断点，失败后重新执行时从失败的步骤继续。
+
+    参数:
+        target: load_fleet_csv / parse_ip_list 返回的设备信息
+        mode: INIT / OTA / SWITCH
+        report: report(stage, message) 状态回调
+        timings: 传入 dict 时写入各步骤耗时（秒）
+
+    返回:
+        str: 设备 SN
+
+    异常:
+        任何一步失败都抛出异常，异常信息即失败原因
+    """
+    ip = target['ip']
+    device_type = target['device_type']
+    software_type = target['software_type']
+    package = target['package']
+
+    rule = validation_rules.get(software_type)
+    if rule is None:
+        raise ValueError(f"未知的软件类型: {software_type}")
+    if software_type not in device_software_types.get(device_type, []):
+        raise ValueError(f"设备类型 {device_type} 不支持软件 {software_type}")
+    if not package or not os.path.exists(package):
+        raise FileNotFoundError(f"软件包不存在: {package}")
+    error_msg = validate_init_file(os.path.basename(package), rule)
+    if error_msg:
+        raise ValueError(error_msg)
+
+    def probe(ctx):
+        # 连接并确认 SN，每次都执行
+        ctx['ssh'] = {'client': session_pool.connect(ip, SSH_USERNAME, SSH_PASSWORD, timeout=5,
+                                                     profile=TRANSFER_PROFILE)}
+        sn = probe_device(ctx['ssh'], rule)['sn']
+        sn_error = check_sn(sn)
+        if sn_error:
+            raise ValueError(sn_error[1])
+        if device_type not in device_types_for_sn(sn):
+            raise ValueError(f"设备类型 {device_type} 与 SN {sn} 不匹配")
+        ctx['sn'] = sn
+        report('match', sn)
+
+    def provision(ctx):
+        iot_client = get_client('iot', 1)
+        try:
+            iot_client.describe_thing(thingName=ctx['sn'])
+            # 上次在这一步中途失败时设备可能已经创建，创建/写影子/绑定证书都可以重复执行
+            if ctx.get('retry_step') != 'provision':
+                raise ValueError(f"设备 {ctx['sn']} 已存在，请切换模式")
+        except iot_client.exceptions.ResourceNotFoundException:
+            pass
+        create_thing_with_shadow(ctx['sn'], device_thing_types[device_type], load_default_shadow(device_type))
+
+    def upload(ctx):
+        last_percent = [-1]
+        rate = ['']
+
+        def on_progress(percent):
+            # 进度每变化 5% 才上报一次，避免刷屏
+            if percent - last_percent[0] >= 5 or percent == 100:
+                last_percent[0] = percent
+                report('upload', f"{percent}% {rate[0]}".strip())
+
+        def on_rate(text):
+            rate[0] = text
+
+        deploy_package(ctx['ssh'], package, rule, on_progress, status_callback=on_rate, delta=mode != "INIT")
+
+    def stop(ctx):
+        stop_service(ctx['ssh'], rule['service_name'])
+
+    def install(ctx):
+        success, exit_code, error_msg = run_install(ctx['ssh'], rule, device_type)
+        if not success:
+            raise RuntimeError(f"安装失败 (exit code: {exit_code}): {error_msg[-200:]}")
+
+    def verify(ctx):
+        if not is_service_active(ctx['ssh'], rule['service_name']):
+            raise RuntimeError(f"{rule['service_name']}服务未运行")
+
+    steps = [Step('probe', probe, '连接中', always=True)]
+    if mode == "INIT" and device_type != 'LMD6000':
+        steps.append(Step('provision', provision, '创建设备'))
+    steps.append(Step('upload', upload, '上传中'))
+    if mode != "INIT":
+        steps.append(Step('stop', stop, '停止服务'))
+    steps += [Step('install', install, '安装中'), Step('verify', verify, '检查服务')]
+
+    ctx = {}
+    runner = StepRunner(fleet_workflow(mode, target), steps, report)
+    try:
+        runner.run(ctx)
+    finally:
+        if timings is not None:
+            timings.update(runner.timings)
+    return ctx['sn']
+
+
+def run_fleet(targets, mode, concurrency=DEFAULT_CONCURRENCY, status_callback=None):
+    """
+    并发地对多台设备执行同一个流程
+
+    参数:
+        targets: 设备清单
+        mode: INIT / OTA / SWITCH
+        concurrency: 同时操作的设备数量上限
+        status_callback: 状态回调，参数为 (设备序号, 阶段, 消息)
+
+    返回:
+        list[dict]: 与 targets 顺序一致的结果，包含 ip/sn/status/error/elapsed/timings（各步骤耗时）
+    """
+    def report(index, stage, message=''):
+        if status_callback:
+            status_callback((index, stage, message))
+
+    def run_one(index):
+        target = targets[index]
+        ip = target['ip']
+        already_open = session_pool.get(ip) is not None
+        start = time.monotonic()
+        result = {'ip': ip, 'sn': None, 'status': 'failed', 'error': '', 'timings': {}}
+        try:
+            result['sn'] = run_fleet_device(target, mode, lambda stage, message='': report(index, stage, message),
+                                            result['timings'])
+            result['status'] = 'ok'
+        except Exception as e:
+            logger.error(f"批量操作 {ip} 失败: {str(e)}")
+            result['error'] = str(e)
+        finally:
+            # 批量操作新建的连接用完即关闭，界面上正在使用的连接保留
+            if not already_open:
+                session_pool.close(ip)
+        result['elapsed'] = time.monotonic() - start
+
+        if result['status'] == 'ok':
+            report(index, 'done', f"成功 ({result['elapsed']:.0f}s)")
+        else:
+            report(index, 'failed', result['error'])
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, int(concurrency))) as executor:
+        return list(executor.map(run_one, range(len(targets))))
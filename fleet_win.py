@@ -0,0 +1,186 @@
+import os
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QComboBox, QSpinBox, QLineEdit
+from PyQt5.QtWidgets import QPlainTextEdit, QTableWidget, QTableWidgetItem, QHeaderView, QFileDialog, QMessageBox
+from PyQt5.QtGui import QFont, QColor
+from fleet import FLEET_MODES, DEFAULT_CONCURRENCY, load_fleet_csv, parse_ip_list, run_fleet
+from fun import device_software_types
+from worker import run_async
+
+
+class FleetDialog(QDialog):
+    """批量设备操作窗口：对多台设备并发执行 INIT/OTA/SWITCH，并显示每台设备的状态"""
+
+    COLUMNS = ["IP", "设备类型", "软件类型", "软件包", "SN", "阶段", "状态"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.targets = []
+        self.running = False
+        self._setup_ui()
+
+    def _setup_ui(self):
+        font = QFont('Arial', 12)
+        self.setWindowTitle("批量操作")
+        self.resize(1000, 700)
+
+        layout = QVBoxLayout()
+
+        # 设备来源：IP 列表 + 统一的设备类型/软件包
+        source_layout = QHBoxLayout()
+        self.ip_edit = QPlainTextEdit()
+        self.ip_edit.setFont(font)
+        self.ip_edit.setPlaceholderText("每行一个设备IP")
+        self.ip_edit.setFixedHeight(120)
+        source_layout.addWidget(self.ip_edit, stretch=1)
+
+        option_layout = QVBoxLayout()
+        type_layout = QHBoxLayout()
+        self.device_type_combo = QComboBox()
+        self.device_type_combo.setFont(font)
+        self.device_type_combo.addItems(list(device_software_types))
+        self.device_type_combo.currentTextChanged.connect(self._on_device_type_changed)
+        self.software_type_combo = QComboBox()
+        self.software_type_combo.setFont(font)
+        type_layout.addWidget(QLabel("设备类型:"))
+        type_layout.addWidget(self.device_type_combo)
+        type_layout.addWidget(QLabel("软件类型:"))
+        type_layout.addWidget(self.software_type_combo)
+        option_layout.addLayout(type_layout)
+
+        package_layout = QHBoxLayout()
+        self.package_edit = QLineEdit()
+        self.package_edit.setFont(font)
+        self.package_edit.setReadOnly(True)
+        browse_btn = QPushButton("浏览")
+        browse_btn.clicked.connect(self._browse_package)
+        package_layout.addWidget(QLabel("软件包:"))
+        package_layout.addWidget(self.package_edit, stretch=1)
+        package_layout.addWidget(browse_btn)
+        option_layout.addLayout(package_layout)
+
+        load_layout = QHBoxLayout()
+        add_btn = QPushButton("加载IP列表")
+        add_btn.clicked.connect(self._load_ip_list)
+        csv_btn = QPushButton("导入CSV")
+        csv_btn.clicked.connect(self._load_csv)
+        load_layout.addWidget(add_btn)
+        load_layout.addWidget(csv_btn)
+        option_layout.addLayout(load_layout)
+
+        source_layout.addLayout(option_layout, stretch=1)
+        layout.addLayout(source_layout)
+
+        # 运行参数
+        run_layout = QHBoxLayout()
+        self.mode_combo = QComboBox()
+        self.mode_combo.setFont(font)
+        self.mode_combo.addItems(FLEET_MODES)
+        self.concurrency_spin = QSpinBox()
+        self.concurrency_spin.setFont(font)
+        self.concurrency_spin.setRange(1, 32)
+        self.concurrency_spin.setValue(DEFAULT_CONCURRENCY)
+        self.start_btn = QPushButton("开始")
+        self.start_btn.setFont(font)
+        self.start_btn.clicked.connect(self._start)
+        self.summary_label = QLabel("")
+        self.summary_label.setFont(font)
+        run_layout.addWidget(QLabel("模式:"))
+        run_layout.addWidget(self.mode_combo)
+        run_layout.addWidget(QLabel("并发数:"))
+        run_layout.addWidget(self.concurrency_spin)
+        run_layout.addWidget(self.start_btn)
+        run_layout.addWidget(self.summary_label, stretch=1)
+        layout.addLayout(run_layout)
+
+        # 设备状态表
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.setLayout(layout)
+        self._on_device_type_changed(self.device_type_combo.currentText())
+
+    def _on_device_type_changed(self, device_type):
+        self.software_type_combo.clear()
+        self.software_type_combo.addItems(device_software_types.get(device_type, []))
+
+    def _browse_package(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "选择软件包", "", "所有文件 (*.*)")
+        if file_path:
+            self.package_edit.setText(file_path)
+
+    def _load_ip_list(self):
+        targets = parse_ip_list(self.ip_edit.toPlainText(), self.device_type_combo.currentText(),
+                                self.software_type_combo.currentText(), self.package_edit.text())
+        self._set_targets(targets)
+
+    def _load_csv(self):
+        file_path, _ = QFileDialog.getOpenFileName(self, "选择设备清单", "", "CSV (*.csv)")
+        if not file_path:
+            return
+        try:
+            self._set_targets(load_fleet_csv(file_path))
+        except Exception as e:
+            QMessageBox.critical(self, "错误", f"读取设备清单失败: {str(e)}")
+
+    def _set_targets(self, targets):
+        if self.running:
+            return
+        self.targets = targets
+        self.table.setRowCount(len(targets))
+        for row, target in enumerate(targets):
+            values = [target['ip'], target['device_type'], target['software_type'],
+                      os.path.basename(target['package']), "", "", "等待"]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        self.summary_label.setText(f"共 {len(targets)} 台设备")
+
+    def _start(self):
+        if self.running or not self.targets:
+            return
+        self.running = True
+        self.start_btn.setEnabled(False)
+        for row in range(len(self.targets)):
+            self._set_cell(row, 5, "")
+            self._set_cell(row, 6, "等待")
+        run_async(run_fleet, self.targets, self.mode_combo.currentText(), self.concurrency_spin.value(),
+                  on_status=self._on_status, on_result=self._on_result, on_error=self._on_error,
+                  on_finished=self._on_finished)
+
+    def _on_status(self, status):
+        row, stage, message = status
+        if stage == 'match':
+            self._set_cell(row, 4, message)
+            message = "SN匹配成功"
+        if stage == 'done':
+            self._set_cell(row, 6, message, QColor("green"))
+        elif stage == 'failed':
+            self._set_cell(row, 6, message, QColor("red"))
+        else:
+            self._set_cell(row, 5, stage)
+            self._set_cell(row, 6, message)
+
+    def _on_result(self, results):
+        ok = sum(1 for result in results if result['status'] == 'ok')
+        self.summary_label.setText(f"完成: 成功 {ok} 台，失败 {len(results) - ok} 台")
+
+    def _on_error(self, err):
+        exctype, value, tb = err
+        QMessageBox.critical(self, "错误", f"批量操作失败: {value}")
+
+    def _on_finished(self):
+        self.running = False
+        self.start_btn.setEnabled(True)
+
+    def _set_cell(self, row, column, text, color=None):
+        item = QTableWidgetItem(text)
+        if color:
+            item.setForeground(color)
+        self.table.setItem(row, column, item)
+
+    def reject(self):
+        # 运行中不允许关闭窗口，避免回调访问已销毁的控件
+        if not self.running:
+            super().reject()
@@ -1,14 +1,27 @@
+import functools
 import json
 import os
-import re
 import paramiko
 import socket
+import threading
 from PyQt5.QtWidgets import QMessageBox, QFileDialog, QDialog, QLabel
 from PyQt5.QtCore import QDateTime
-from aws_tool import get_thing_version, get_client
-import boto3
+from aws_tool import get_thing_version, get_client, invalidate_shadow
 from config_win import DownloadDialog, ImageDialog, TimeRangeDialog
 from log import logger
+from worker import run_async, ui_call
+from ssh_pool import session_pool
+from probe import probe_device
+from ssh_stream import stream_exec
+from package_store import ensure_package
+from transfer import TransferProgress, download
+from ssh_stream import CommandCancelled
+from delta import deploy_delta, record_package_files
+from s3_catalog import S3_VERSION_PATHS, version_catalog
+from package_index import PackageIndex, parse_package_name, sort_package_names, strip_extension
+from mirror import package_mirror
+from shadow_mqtt import ShadowSubscriber
+from steps import Step, StepRunner, package_key
 import config_in
 
 # 定义各软件类型的验证规则
@@ -70,13 +83,126 @@ validation_rules = {
     }
 }
 
+# SSH 登录凭据
+SSH_USERNAME = "long0929g"
+SSH_PASSWORD = "Password$9026G"
+# SSH 传输参数配置，见 ssh_pool.TRANSFER_PROFILES
+TRANSFER_PROFILE = getattr(config_in, 'CONFIG_TRANSFER_PROFILE', 'default')
+
+# SN 第10个字符与设备类型的匹配规则
+sn_device_types = {
+    '0': ['LMDC', 'LMDC-V2'],
+    '1': ['LMD6000'],
+    '2': ['LBB300'],
+    '7': ['LBB400']
+}
+
+# 设备类型对应的 AWS Thing Type
+device_thing_types = {
+    'LMDC': "LMDC-TSB",
+    'LMDC-V2': "LMDC-TSB",
+    'LBB300': "lbb300",
+    'LBB400': "LBB400",
+    'LMD6000': "LMD-TSS",
+}
+
+# 各设备类型支持的软件类型
+device_software_types = {
+    'LMDC': ["LiftBennu100"],
+    'LMDC-V2': ["LiftBennu100"],
+    'LBB300': ["LiftPhoenix300-v2", "LiftPhoenix400", "LiftPhoenix500"],
+    'LBB400': ["LiftPhoenix300-v2", "LiftPhoenix400", "LiftPhoenix500"],
+    'LMD6000': ["LMD-TSS"],
+}
+
 """通过SSH上传文件并部署到指定目录"""
 
+# 正在后台运行的任务名称，防止重复点击同一个按钮
+_running_tasks = set()
+# 取消按钮按下后 set，正在执行的远程命令会被终止
+_cancel_event = threading.Event()
+# 安装脚本的截止时间（秒）
+INSTALL_TIMEOUT = 600
+# S3 升级写入 DesiredVersion 后等待设备上报新版本的最长时间（秒）
+OTA_CONFIRM_TIMEOUT = getattr(config_in, 'CONFIG_OTA_CONFIRM_TIMEOUT', 600)
+# S3 方式通过影子的 DesiredVersion 升级的软件
+S3_SHADOW_SOFTWARE = ['LiftBennu100', 'LiftPhoenix300-v2', 'LiftPhoenix400', 'LiftPhoenix500']
+
+
+def _add_status_label(ui_components, text):
+    """在状态区域添加一条绿色提示"""
+    success_label = QLabel(text)
+    success_label.setStyleSheet("color: green; font-weight: bold; font-size: 18px;")
+    ui_components['seventh_row']['content_layout'].addWidget(success_label)
+
+
+def cancel_running_commands():
+    """终止后台任务中正在执行的远程命令"""
+    logger.info("取消正在执行的命令")
+    _cancel_event.set()
+
+
+def console_writer(ui_components):
+    """返回把命令输出写到界面控制台的行回调（可在后台线程调用）"""
+    return ui_components['seventh_row']['console'].append_line
+
+
+def run_task(ui_components, fn, *args, on_result=None, parent_widget=None):
+    """
+    在后台线程中执行耗时的 SSH/AWS 操作
+
+    进度会显示到进度条上，未捕获的异常在主线程中弹框提示。
+    同一个函数在上一次执行结束前不会被再次提交。
+    """
+    name = fn.__name__
+    if name in _running_tasks:
+        logger.warning(f"{name} 正在执行中，忽略重复操作")
+        return None
+
+    progress_bar = ui_components['next_to_last']['progress_bar']
+    cancel_btn = ui_components['next_to_last']['cancel_btn']
+
+    def on_error(err):
+        exctype, value, tb = err
+        QMessageBox.critical(parent_widget, "错误", f"操作失败: {value}", QMessageBox.Ok)
+
+    def on_status(text):
+        # 任务的文字状态（如上传速度）显示在进度条上
+        if isinstance(text, str):
+            progress_bar.setFormat(f"%p%  {text}")
+
+    def on_finished():
+        _running_tasks.discard(name)
+        if not _running_tasks:
+            progress_bar.setVisible(False)
+            cancel_btn.setVisible(False)
+
+    if not _running_tasks:
+        _cancel_event.clear()
+    _running_tasks.add(name)
+    progress_bar.setValue(0)
+    progress_bar.setFormat("%p%")
+    progress_bar.setVisible(True)
+    cancel_btn.setVisible(True)
+    return run_async(fn, *args, on_result=on_result, on_error=on_error, on_progress=progress_bar.setValue,
+                     on_status=on_status, on_finished=on_finished)
+
+
+def get_local_ip():
+    """获取本机在局域网中的IP地址"""
+    try:
+        # UDP connect 不会真正发包，只用来让系统选出默认路由对应的网卡地址
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            sock.connect(("8.8.8.8", 80))
+            return sock.getsockname()[0]
+    except OSError:
+        host_name = socket.gethostname()
+        return socket.gethostbyname(host_name)
+
 
 def populate_ip_addresses(local_combo):
     # 获取本机IP地址
-    host_name = socket.gethostname()
-    local_ip = socket.gethostbyname(host_name)
+    local_ip = get_local_ip()
 
     # 将本机IP添加到下拉框
     local_combo.addItem(local_ip)
@@ -92,91 +218,107 @@ def is_ip_active(ip):
         return False
 
 
-def safe_exec(ssh_client, command, timeout=30):
-    """安全执行SSH命令并自动清理资源"""
-    stdin, stdout, stderr = None, None, None
-    try:
-        stdin, stdout, stderr = ssh_client['client'].exec_command(command, timeout=timeout)
-        output = stdout.read().decode().strip()
-        error = stderr.read().decode().strip()
-        exit_code = stdout.channel.recv_exit_status()
-        return exit_code, output, error
-    finally:
-        for stream in [stdin, stdout, stderr]:
-            if stream:
-                stream.close()
+def safe_exec(ssh_client, command, timeout=30, on_line=None, deadline=None):
+    """
+    安全执行SSH命令并自动清理资源
 
+    timeout 为连续没有输出的最长时间，deadline 为命令总的截止时间；
+    on_line(stream, line) 可以实时接收每一行输出，取消按钮可以终止命令
+    """
+    return stream_exec(ssh_client, command, on_line=on_line, timeout=deadline, idle_timeout=timeout,
+                       cancel_event=_cancel_event)
 
-def try_connect(ssh_client, close_falg, sn, ui_components, parent_widget=None):
-    close_falg['ssh_close'] = False
-    """尝试连接到输入的设备IP"""
-    device_ip = ui_components['first_row']['device_input'].text()  # 从输入框获取IP
-    username = "long0929g"             # 替换为 SSH 用户名
-    password = "Password$9026G"             # 替换为 SSH 密码
-    try:
-        # 创建 SSH 客户端
-        ssh_client['client'] = paramiko.SSHClient()
-        ssh_client['client'].set_missing_host_key_policy(paramiko.AutoAddPolicy())  # 自动添加主机密钥
 
-        # 连接到设备
-        ssh_client['client'].connect(device_ip, username=username, password=password, timeout=5)
+def check_sn(value):
+    """
+    检查 SN 码是否有效
 
-        # 获取文件内容
-        exit_code, output, error = safe_exec(ssh_client, 'cat /etc/sn')  # 执行获取文件内容的命令
-        sn['value'] = output  # 读取命令输出并解码
+    返回:
+        None 表示有效，否则返回 (标题, 提示信息)
+    """
+    # 检查 SN 码是否有效
+    if not value:
+        logger.error("文件内容无效, 获取的序列号内容为空.")
+        return "文件内容无效", "获取的序列号内容为空。"
 
-        # 检查 SN 码是否有效
-        if not sn['value']:
-            logger.error("文件内容无效, 获取的序列号内容为空.")
-            QMessageBox.warning(parent_widget, "文件内容无效", "获取的序列号内容为空。", QMessageBox.Ok)
-            return  # 直接返回
+    # 检查 SN 码长度是否正确（假设标准 SN 码是 "SFT1230110009"）
+    expected_sn_length = len("SFT1230110009")  # 标准 SN 码长度
+    if len(value) != expected_sn_length:
+        logger.error(f"SN 码错误: 长度不符合要求（当前长度: {len(value)}，预期长度: {expected_sn_length}）")
+        return "SN 码错误", f"SN 码长度错误，应为 {expected_sn_length} 位。"
 
-        # 检查 SN 码长度是否正确（假设标准 SN 码是 "SFT1230110009"）
-        expected_sn_length = len("SFT1230110009")  # 标准 SN 码长度
-        if len(sn['value']) != expected_sn_length:
-            logger.error(f"SN 码错误: 长度不符合要求（当前长度: {len(sn['value'])}，预期长度: {expected_sn_length}）")
-            QMessageBox.warning(parent_widget, "SN 码错误", f"SN 码长度错误，应为 {expected_sn_length} 位。", QMessageBox.Ok)
-            return  # 直接返回
+    # 检查 SN 码格式是否符合预期（例如必须以 "SFT" 开头）
+    if not value.startswith("SFT"):
+        logger.error("SN 码错误: 格式不符合要求（必须以 'SFT' 开头）")
+        return "SN 码错误", "SN 码格式错误，必须以 'SFT' 开头。"
 
-        # 检查 SN 码格式是否符合预期（例如必须以 "SFT" 开头）
-        if not sn['value'].startswith("SFT"):
-            logger.error("SN 码错误: 格式不符合要求（必须以 'SFT' 开头）")
-            QMessageBox.warning(parent_widget, "SN 码错误", "SN 码格式错误，必须以 'SFT' 开头。", QMessageBox.Ok)
-            return  # 直接返回
+    return None
 
-        # 如果 SN 码有效，显示到 UI
-        ui_components['second_row']['sn_display'].setText(sn['value'])
-        # 连接成功，禁用控件
-        ui_components['first_row']['local_combo'].setEnabled(False)
-        ui_components['first_row']['device_input'].setEnabled(False)
-        ui_components['first_row']['connect_btn'].setEnabled(False)
-        ui_components['first_row']['close_btn'].setEnabled(True)
 
-        ui_components['second_row']['sn_display'].setEnabled(True)
-        ui_components['second_row']['device_type_combo'].addItems(["LMDC", "LBB400", "LBB300", "LMD6000", "LMDC-V2"])
-        ui_components['second_row']['device_type_combo'].setEnabled(True)
-        ui_components['second_row']['match_but'].setEnabled(True)
+def device_types_for_sn(value):
+    """根据 SN 的第10个字符返回可匹配的设备类型列表"""
+    sn_element = value[9] if value and len(value) >= 10 else None  # 获取第10个字符（索引9）
+    return sn_device_types.get(sn_element, [])
 
-        # 显示连接成功的标签
-        success_label = QLabel("✅ 设备连接成功！")
-        success_label.setStyleSheet("color: green; font-weight: bold; font-size: 18px;")
-        ui_components['seventh_row']['content_layout'].addWidget(success_label)
+
+def try_connect(ssh_client, close_falg, sn, ui_components, parent_widget=None):
+    close_falg['ssh_close'] = False
+    """尝试连接到输入的设备IP（在后台线程中执行）"""
+    device_ip = ui_call(ui_components['first_row']['device_input'].text)  # 从输入框获取IP
+    try:
+        # 从会话池获取持久连接（断线后会在下一次使用时自动重连）
+        ssh_client['client'] = session_pool.connect(device_ip, SSH_USERNAME, SSH_PASSWORD, timeout=5,
+                                                    profile=TRANSFER_PROFILE)
+
+        # 一次远程调用获取 SN 以及系统信息
+        info = probe_device(ssh_client)
+        sn['value'] = info['sn'] or ''
+        logger.info(f"设备信息: 系统 {info['os_info']}, Python {info['python_version']}, "
+                    f"剩余空间 {info['disk_free_kb']} KB")
+
+        sn_error = check_sn(sn['value'])
+        if sn_error:
+            ui_call(QMessageBox.warning, parent_widget, *sn_error, QMessageBox.Ok)
+            return  # 直接返回
+
+        ui_call(_on_connected, sn, ui_components)
 
     except paramiko.SSHException as e:
         logger.error(f"连接失败: SSH 连接异常: {str(e)}")
-        QMessageBox.critical(parent_widget, "连接失败", f"SSH 连接异常: {str(e)}", QMessageBox.Ok)
+        ui_call(QMessageBox.critical, parent_widget, "连接失败", f"SSH 连接异常: {str(e)}", QMessageBox.Ok)
     except Exception as e:
         logger.error("连接失败", f"无法连接到设备 IP {device_ip}，错误: {str(e)}")
-        QMessageBox.critical(parent_widget, "连接失败", f"无法连接到设备 IP {device_ip}，错误: {str(e)}", QMessageBox.Ok)
+        ui_call(QMessageBox.critical, parent_widget, "连接失败", f"无法连接到设备 IP {device_ip}，错误: {str(e)}", QMessageBox.Ok)
+
+
+def _on_connected(sn, ui_components):
+    """连接成功后更新界面（主线程）"""
+    # 如果 SN 码有效，显示到 UI
+    ui_components['second_row']['sn_display'].setText(sn['value'])
+    # 连接成功，禁用控件
+    ui_components['first_row']['local_combo'].setEnabled(False)
+    ui_components['first_row']['device_input'].setEnabled(False)
+    ui_components['first_row']['scan_btn'].setEnabled(False)
+    ui_components['first_row']['connect_btn'].setEnabled(False)
+    ui_components['first_row']['close_btn'].setEnabled(True)
+
+    ui_components['second_row']['sn_display'].setEnabled(True)
+    ui_components['second_row']['device_type_combo'].addItems(["LMDC", "LBB400", "LBB300", "LMD6000", "LMDC-V2"])
+    ui_components['second_row']['device_type_combo'].setEnabled(True)
+    ui_components['second_row']['match_but'].setEnabled(True)
+
+    # 显示连接成功的标签
+    _add_status_label(ui_components, "✅ 设备连接成功！")
 
 
 def try_close(ssh_client, close_falg, mode_value, ui_components):
     """处理断开连接"""
     if ssh_client['client']:
-        ssh_client['client'].close()  # 关闭 SSH 连接
+        session_pool.close(ssh_client['client'].host)  # 关闭 SSH 连接并移出会话池
         ssh_client['client'] = None
         ui_components['first_row']['local_combo'].setEnabled(True)
         ui_components['first_row']['device_input'].setEnabled(True)
+        ui_components['first_row']['scan_btn'].setEnabled(True)
         ui_components['first_row']['connect_btn'].setEnabled(True)
         ui_components['first_row']['close_btn'].setEnabled(False)  # 禁用Close按钮
         close_falg['ssh_close'] = True
@@ -233,21 +375,12 @@ def try_close(ssh_client, close_falg, mode_value, ui_components):
 
 def match_sn(close_falg, sn, ui_components, parent_widget=None):
     """根据sn的第10个字符与设备类型进行匹配"""
-    # 获取SN的第10个字符
-    sn_element = sn['value'][9] if len(sn['value']) >= 10 else None  # 获取第10个字符（索引9）
     device_type = ui_components['second_row']['device_type_combo'].currentText()  # 获取设备类型
-
-    # 定义匹配规则
-    match_dict = {
-        '0': ['LMDC', 'LMDC-V2'],
-        '1': ['LMD6000'],
-        '2': ['LBB300'],
-        '7': ['LBB400']
-    }
+    matched_types = device_types_for_sn(sn['value'])
 
     # 检查匹配
-    if sn_element in match_dict:
-        if device_type in match_dict[sn_element]:
+    if matched_types:
+        if device_type in matched_types:
             # 显示连接成功的标签
             success_label = QLabel("✅ 设备SN匹配成功！")
             success_label.setStyleSheet("color: green; font-weight: bold; font-size: 18px;")
@@ -388,7 +521,7 @@ def update_st_type_combo(t, sn, mode_value, close_falg, ui_components, shadow_me
     # 创建并显示独立对话框
     device_type = ui_components['second_row']['device_type_combo'].currentText()  # 获取设备类型
     if device_type != 'LMD6000':
-        image_dialog = ImageDialog(device_type, mode_value, sn)
+        image_dialog = ImageDialog(device_type, mode_value, sn, thing_type=device_thing_types.get(device_type))
         # 显示对话框并处理返回值
         if image_dialog.exec_() == QDialog.Accepted:  # 用户点击了"确定"
             shadow_message['value'] = image_dialog.get_result()  # 获取对话框返回的数据
@@ -479,7 +612,7 @@ def update_upload_ui(mode_value, close_falg, ui_components):
         if mode_value['is_init_mode'] or device_type == 'LMD6000':
             combo.addItems(["Local"])  # INIT模式只添加Local选项
         else:
-            combo.addItems(["Local", "S3"])  # 非INIT模式添加Local和S3选项
+            combo.addItems(["Local", "S3", "Mirror"])  # 非INIT模式添加Local、S3和本地镜像选项
     """根据上传模式更新UI显示"""
     # 首先隐藏所有相关控件
     ui_components['fifth_row']['csv_display'].clear()
@@ -497,8 +630,8 @@ def update_upload_ui(mode_value, close_falg, ui_components):
         ui_components['sixth_row']['browse_button'].setVisible(True)
         ui_components['fifth_row']['get_version_but'].setEnabled(True)
         ui_components['sixth_row']['start_button'].setEnabled(False)
-    elif mode == "S3":
-        # S3模式：只显示Start按钮和版本相关控件
+    elif mode in ("S3", "Mirror"):
+        # S3/Mirror模式：只显示Start按钮和版本相关控件（Mirror 模式列出本地镜像中的软件包）
         ui_components['sixth_row']['S3_Version_combo'].setVisible(True)
         ui_components['sixth_row']['S3_Version_combo'].clear()
         ui_components['fifth_row']['get_version_but'].setEnabled(True)
@@ -538,21 +671,22 @@ def validate_init_file(filename, rule):
     # if not (filename.endswith('.tar.gz') or filename.endswith('.zip')):
     #     return "只支持 .tar.gz 或 .zip 格式的文件"
 
-    # 提取文件名主干（去掉扩展名）
-    basename = filename.split('.')[0]
-    example_basename = rule['example'].split('.')[0]
-
-    # 检查前缀
-    if not basename.startswith(rule['prefix'] + '-'):
-        return f"文件名必须以 '{rule['prefix']}-' 开头"
-
-    # 提取版本号部分（去掉前缀）
-    version_part = basename[len(rule['prefix']) + 1:]
-    example_version = example_basename[len(rule['prefix']) + 1:]
-
-    # 验证版本号分段结构
-    example_segments = example_version.split('-')
-    input_segments = version_part.split('-')
+    try:
+        package = parse_package_name(filename, None, rule)
+    except ValueError as e:
+        return str(e)
+    example = parse_package_name(rule['example'], None, rule)
+
+    # Python 软件的包名必须带 Python 版本
+    if example.python_version and not package.python_version:
+        return (f"版本号中缺少Python版本\n"
+                f"要求: {rule['example']}")
+
+    # 验证版本号分段结构（预发布标记不参与比较）
+    example_segments = [v for v in [example.python_version] if v] + example.app_version.split('-')
+    input_segments = [v for v in [package.python_version] if v] + package.app_version.split('-')
+    version_part = '-'.join(input_segments)
+    example_version = '-'.join(example_segments)
 
     # 检查分段数量是否一致
     if len(input_segments) != len(example_segments):
@@ -560,11 +694,7 @@ def validate_init_file(filename, rule):
                 f"当前: {len(input_segments)}段 ({version_part})\n"
                 f"要求: {len(example_segments)}段 (如 {example_version})")
 
-    # 检查每段格式是否为 X.X.X（数字+点）
     for i, segment in enumerate(input_segments):
-        if not re.fullmatch(r'^\d+(\.\d+)*$', segment):
-            return f"版本号段 '{segment}' 格式无效（应为数字和点，如 3.9.16)"
-
         # 可选：检查每段的点数是否与example一致（如3.9.16是2个点）
         if segment.count('.') != example_segments[i].count('.'):
             return (f"版本号段 '{segment}' 点数不符\n"
@@ -574,11 +704,116 @@ def validate_init_file(filename, rule):
     return None  # 验证通过
 
 
-def upload_file_via_ssh(ssh, mode_value, ui_components, parent_widget=None):
+# 部署方式：store 先上传到设备的软件包仓库再解压；stream 边上传边解压，不在设备上保存压缩包
+DEPLOY_MODE = getattr(config_in, 'CONFIG_DEPLOY_MODE', 'store')
+
+
+def _prepare_target_cmd(rule):
+    """部署前创建目标目录并删除前缀匹配的旧文件"""
+    target_dir = rule["target_dir"]
+    return f"""
+        # 检查并创建目标目录
+        if [ ! -d "{target_dir}" ]; then
+            sudo mkdir -p "{target_dir}"
+            sudo chown lmahdb:lmahdb "{target_dir}"
+        fi;
+
+        # 检查并删除前缀匹配的文件
+        if [ -n "{rule['prefix']}" ]; then
+            sudo find "{target_dir}" -type f -name "{rule['prefix']}*" -exec rm -f {{}} \\;
+        fi;
+    """
+
+
+def stream_extract_package(ssh, local_file_path, rule, progress_callback=None, on_line=None, status_callback=None):
+    """
+    通过一个 exec 通道把本地 .tar.gz 直接送入设备上的 tar 解压，设备上不落地压缩包
+
+    参数和异常同 deploy_package；压缩包损坏时 gzip 校验失败，tar 以非 0 退出
+    """
+    target_dir = rule["target_dir"]
+    total = os.path.getsize(local_file_path)
+    progress = TransferProgress(total, progress_callback, status_callback)
+
+    # 只有 tar 读取 stdin，其余命令的 stdin 都重定向掉，避免吃掉压缩包的数据
+    deploy_cmd = f"""
+        {{ {_prepare_target_cmd(rule)} }} < /dev/null
+        sudo tar -xzf - -C "{target_dir}" || exit 1
+        sudo chown -R lmahdb:lmahdb "{target_dir}" < /dev/null
+    """
+
+    with open(local_file_path, 'rb') as f:
+        exit_code, output, error_msg = stream_exec(ssh, deploy_cmd, on_line=on_line, idle_timeout=60,
+                                                   cancel_event=_cancel_event, stdin_file=f,
+                                                   stdin_callback=progress.update)
+    if exit_code != 0:
+        logger.error(f"部署失败 (exit code: {exit_code}): {error_msg}")
+        raise Exception(f"部署失败 (exit code: {exit_code}): {error_msg}")
+
+
+def deploy_package(ssh, local_file_path, rule, progress_callback=None, on_line=None, status_callback=None,
+                   delta=False):
+    """
+    上传软件包并解压到 rule['target_dir']（不涉及界面，可在任意线程调用）
+
+    参数:
+        ssh: {'client': SSHSession}
+        local_file_path: 本地软件包路径
+        rule: validation_rules 中对应软件类型的规则
+        progress_callback: 上传进度回调，参数为百分比
+        on_line: 部署命令的输出行回调 on_line(stream, line)
+        status_callback: 上传速度/剩余时间回调，参数为文本
+        delta: 是否先尝试只传输有变化的文件（OTA/SWITCH），失败时自动改用完整软件包
+
+    异常:
+        部署命令有错误输出时抛出 Exception；上传后 SHA-256 不一致时抛出 ChecksumMismatch
+    """
+    if delta and local_file_path.endswith(('.tar.gz', '.tgz')):
+        try:
+            if deploy_delta(ssh, local_file_path, rule, progress_callback, on_line, status_callback, _cancel_event):
+                return
+        except CommandCancelled:
+            raise
+        except Exception as e:
+            logger.error(f"增量更新失败，改用完整软件包: {str(e)}")
+
+    if DEPLOY_MODE == 'stream' and local_file_path.endswith(('.tar.gz', '.tgz')):
+        stream_extract_package(ssh, local_file_path, rule, progress_callback, on_line, status_callback)
+        record_package_files(ssh, local_file_path, rule)
+        return
+
+    # 1. 上传到设备的软件包仓库（支持断点续传并校验 SHA-256，仓库中已有时跳过上传）
+    package_path = ensure_package(ssh, local_file_path, progress_callback, status_callback)
+
+    # 2. 部署到目标目录
+    target_dir = rule["target_dir"]
+
+    # 构建部署命令：直接从仓库解压，不再复制到目标目录
+    deploy_cmd = f"""
+        {_prepare_target_cmd(rule)}
+
+        # 在目标目录中解压文件
+        sudo tar -xvf "{package_path}" -C "{target_dir}"
+
+        # 设置权限
+        sudo chown -R lmahdb:lmahdb "{target_dir}"
+    """
+
+    exit_code, output, error_msg = safe_exec(ssh, deploy_cmd, on_line=on_line)
+
+    if error_msg:
+        logger.error(f"部署失败: {error_msg}")
+        raise Exception(f"部署失败: {error_msg}")
+    # 记录软件包文件清单，下次增量更新时只删除旧软件包中的文件
+    record_package_files(ssh, local_file_path, rule)
+
+
+def upload_file_via_ssh(ssh, mode_value, ui_components, parent_widget=None, progress_callback=None,
+                        status_callback=None):
     # ui_components['third_row']['mode_switch_but'].setEnabled(False)
 
     # 1. 获取并标准化本地路径（关键修复）
-    raw_path = ui_components['sixth_row']['local_version_edit'].text().strip()
+    raw_path = ui_call(ui_components['sixth_row']['local_version_edit'].text).strip()
     local_file_path = os.path.normpath(raw_path)  # 转换路径分隔符
 
     if not os.path.exists(local_file_path):
@@ -590,62 +825,23 @@ def upload_file_via_ssh(ssh, mode_value, ui_components, parent_widget=None):
         )
     if not local_file_path:
         logger.error("请先选择要上传的文件")
-        QMessageBox.warning(parent_widget, "警告", "请先选择要上传的文件！")
+        ui_call(QMessageBox.warning, parent_widget, "警告", "请先选择要上传的文件！")
         # ui_components['third_row']['mode_switch_but'].setEnabled(True)
         return
 
     filename = os.path.basename(local_file_path)
     # logger.error(f'{filename}')
-    software_type = ui_components['fourth_row']['st_type_combo'].currentText()
+    software_type = ui_call(ui_components['fourth_row']['st_type_combo'].currentText)
 
     rule = validation_rules[software_type]
+    target_dir = rule["target_dir"]
 
     try:
-        # 1. 上传文件到临时目录
-        temp_path = f"/home/long0929g/{filename}"
-        sftp = ssh['client'].open_sftp()
-        sftp.put(local_file_path, temp_path)
-
-        # 2. 部署到目标目录
-        target_dir = rule["target_dir"]
-
-        # 构建部署命令
-        deploy_cmd = f"""
-            # 检查并创建目标目录
-            if [ ! -d "{target_dir}" ]; then
-                sudo mkdir -p "{target_dir}"
-                sudo chown lmahdb:lmahdb "{target_dir}"
-            fi;
-
-            # 检查并删除前缀匹配的文件
-            if [ -n "{rule['prefix']}" ]; then
-                sudo find "{target_dir}" -type f -name "{rule['prefix']}*" -exec rm -f {{}} \\;
-            fi;
+        deploy_package(ssh, local_file_path, rule, progress_callback, console_writer(ui_components), status_callback,
+                       delta=mode_value['mode'] != "INIT")
 
-            # 复制文件到目标目录
-            sudo cp -f "{temp_path}" "{target_dir}/"
-
-            # 在目标目录中解压文件
-            sudo tar -xvf "{target_dir}/{filename}" -C "{target_dir}"
-
-            # 删除压缩包（保留解压后的文件）
-            sudo rm -f "{target_dir}/{filename}"
-
-            # 设置权限
-            sudo chown -R lmahdb:lmahdb "{target_dir}"
-        """
-
-        exit_code, output, error_msg = safe_exec(ssh, deploy_cmd)
-
-        if error_msg:
-            logger.error(f"部署失败: {error_msg}")
-            # ui_components['third_row']['mode_switch_but'].setEnabled(True)
-            raise Exception(f"部署失败: {error_msg}")
-
-        # 3. 清理临时文件
-        sftp.remove(temp_path)
-
-        QMessageBox.information(
+        ui_call(
+            QMessageBox.information,
             parent_widget,
             "部署成功",
             f"文件已成功部署到: {target_dir}\n"
@@ -653,14 +849,13 @@ def upload_file_via_ssh(ssh, mode_value, ui_components, parent_widget=None):
             f"文件名: {filename}\n"
             f"目标路径: {target_dir}/{filename}"
         )
-        ui_components['sixth_row']['start_button'].setEnabled(True)
-        success_label = QLabel("✅ 上传文件成功！")
-        success_label.setStyleSheet("color: green; font-weight: bold; font-size: 18px;")
-        ui_components['seventh_row']['content_layout'].addWidget(success_label)
+        ui_call(ui_components['sixth_row']['start_button'].setEnabled, True)
+        ui_call(_add_status_label, ui_components, "✅ 上传文件成功！")
 
     except Exception as e:
         logger.error(f"请检查SSH连接和权限配置{str(e)}")
-        QMessageBox.critical(
+        ui_call(
+            QMessageBox.critical,
             parent_widget,
             "错误",
             f"操作失败: {str(e)}\n"
@@ -668,9 +863,6 @@ def upload_file_via_ssh(ssh, mode_value, ui_components, parent_widget=None):
         )
         # ui_components['third_row']['mode_switch_but'].setEnabled(True)
         return
-    finally:
-        if 'sftp' in locals():
-            sftp.close()
 
 
 # 添加文件浏览方法
@@ -731,7 +923,7 @@ def browse_file(ssh, mode_value, ui_components, parent_widget=None):
     # 6. 验证通过后更新UI
     ui_components['sixth_row']['local_version_edit'].setText(file_path)
     logger.info(f"已验证的初始化文件: {file_name}")
-    upload_file_via_ssh(ssh, mode_value, ui_components, parent_widget=None)
+    run_task(ui_components, upload_file_via_ssh, ssh, mode_value, ui_components, parent_widget)
 
 
 def execute_ssh_command(ssh, command):
@@ -750,20 +942,22 @@ def execute_ssh_command(ssh, command):
 
 # 添加获取版本的方法
 def get_software_version(mode_value, ssh, sn, ui_components, parent_widget=None):
-    upload_type = ui_components['fourth_row']['upload_label_combo'].currentText()
-    software_type = ui_components['fourth_row']['st_type_combo'].currentText()
+    """获取设备当前软件版本（在后台线程中执行）"""
+    upload_type = ui_call(ui_components['fourth_row']['upload_label_combo'].currentText)
+    software_type = ui_call(ui_components['fourth_row']['st_type_combo'].currentText)
     if mode_value['mode'] == "INIT":
         return
     if not software_type:  # 空选择
         return
 
     rule = validation_rules[software_type]
-    ui_components['fifth_row']['csv_display'].clear()
+    csv_display = ui_components['fifth_row']['csv_display']
+    ui_call(csv_display.clear)
 
     try:
         # 3. 特殊处理LMD-TSS（版本文件）
         if software_type == "LMD-TSS":
-            QMessageBox.warning(parent_widget, "警告", f"目前不支持 {software_type} 操作")
+            ui_call(QMessageBox.warning, parent_widget, "警告", f"目前不支持 {software_type} 操作")
             return
             # version_file_path = f"{rule['version_path']}/{rule['version_file']}"
             # stdin, stdout, stderr = ssh['client'].exec_command(f"cat {version_file_path}")
@@ -785,54 +979,58 @@ def get_software_version(mode_value, ssh, sn, ui_components, parent_widget=None)
 
         # 4. 处理其他软件类型（命令获取版本）
         else:
-            # 获取主版本
-            version_cmd = f"{rule['version_command']}"
-            pyversion_cmd = "python3 --version"
-            # pyversion_cmd = f"{rule['pyversion_command']}"
-
-            # 执行版本命令
-            version_output = execute_ssh_command(ssh, version_cmd)
+            # 一次远程调用同时获取主版本和Python版本
+            info = probe_device(ssh, rule)
+            version_output = info['app_version']
             if not version_output:
-                ui_components['fifth_row']['csv_display'].setText("获取主版本失败")
+                ui_call(csv_display.setText, "获取主版本失败")
                 return
 
-            # 执行Python版本命令
-            py_version_output = execute_ssh_command(ssh, pyversion_cmd)
-            if not py_version_output:
-                ui_components['fifth_row']['csv_display'].setText("获取Python版本失败")
+            py_version = info['python_version']
+            if not py_version:
+                ui_call(csv_display.setText, "获取Python版本失败")
                 return
 
             # 拼接版本字符串 (prefix-主版本-Python版本)
-            py_version = py_version_output.split()[1]
-            version_str = f"{rule['prefix']}-{py_version}-{version_output.strip()}"
+            version_str = f"{rule['prefix']}-{py_version}-{version_output}"
             if upload_type == "Local":
                 """更新UI显示版本信息"""
-                ui_components['fifth_row']['csv_display'].setText(version_str)
-                ui_components['sixth_row']['browse_button'].setEnabled(True)
-                # ui_components['sixth_row']['start_button'].setEnabled(True)
-                ui_components['fifth_row']['get_version_but'].setEnabled(False)
+                def show_local_version():
+                    csv_display.setText(version_str)
+                    ui_components['sixth_row']['browse_button'].setEnabled(True)
+                    # ui_components['sixth_row']['start_button'].setEnabled(True)
+                    ui_components['fifth_row']['get_version_but'].setEnabled(False)
+                    _add_status_label(ui_components, "✅ 获取版本成功！")
 
-                success_label = QLabel("✅ 获取版本成功！")
-                success_label.setStyleSheet("color: green; font-weight: bold; font-size: 18px;")
-                ui_components['seventh_row']['content_layout'].addWidget(success_label)
+                ui_call(show_local_version)
             if upload_type == "S3":
-                ui_components['fifth_row']['csv_display'].setText(version_str)
+                ui_call(csv_display.setText, version_str)
                 # 填充S3版本列表
-                if populate_s3_versions(ui_components, py_version):
+                if populate_s3_versions(ui_components, py_version, parent_widget):
                     # 设置到显示控件
-                    ui_components['fifth_row']['get_version_but'].setEnabled(False)
-                    ui_components['sixth_row']['start_button'].setEnabled(True)
-                    ui_components['sixth_row']['S3_Version_combo'].setEnabled(True)
+                    def show_s3_version():
+                        ui_components['fifth_row']['get_version_but'].setEnabled(False)
+                        ui_components['sixth_row']['start_button'].setEnabled(True)
+                        ui_components['sixth_row']['S3_Version_combo'].setEnabled(True)
+                        _add_status_label(ui_components, "✅ 获取版本成功！")
+
+                    ui_call(show_s3_version)
                 else:
                     return
+            if upload_type == "Mirror":
+                ui_call(csv_display.setText, version_str)
+                if populate_mirror_versions(ui_components, py_version, parent_widget):
+                    def show_mirror_version():
+                        ui_components['fifth_row']['get_version_but'].setEnabled(False)
+                        ui_components['sixth_row']['start_button'].setEnabled(True)
+                        ui_components['sixth_row']['S3_Version_combo'].setEnabled(True)
+                        _add_status_label(ui_components, "✅ 获取版本成功！")
 
-                success_label = QLabel("✅ 获取版本成功！")
-                success_label.setStyleSheet("color: green; font-weight: bold; font-size: 18px;")
-                ui_components['seventh_row']['content_layout'].addWidget(success_label)
+                    ui_call(show_mirror_version)
 
     except Exception as e:
         logger.error(f"获取版本失败: {str(e)}")
-        ui_components['fifth_row']['csv_display'].setText(f"版本获取错误: {str(e)}")
+        ui_call(csv_display.setText, f"版本获取错误: {str(e)}")
 
 
 def extract_version_info(software_type, s3_response):
@@ -869,26 +1067,25 @@ def extract_version_info(software_type, s3_response):
             if 'LiftBennu100/' in key and key.endswith('.tar.gz'):
                 # 提取类似 embedded-software/LiftBennu100/LiftBennu100-3.0.3.tar.gz 中的 LiftBennu100-3.0.3
                 filename = key.split('/')[-1]  # LiftBennu100-3.0.3.tar.gz
-                version = filename.rsplit('.', 2)[0]  # 从右边分割两次，取第一部分（去掉最后两个点及之后内容）
+                version = strip_extension(filename)  # 去掉 .tar.gz 扩展名
                 version_list.append(version)
 
         elif software_type == 'LiftPhoenix300-v2':
             if 'LiftPhoenix300/' in key and (key.endswith('.tar.gz') or key.endswith('.zip')):
                 # 提取类似 embedded-software/LiftPhoenix300/LiftPhoenix300-V2-2.0.1.tar.gz 中的 LiftPhoenix300-V2-2.0.1
                 filename = key.split('/')[-1]  # LiftPhoenix300-V2-2.0.1.tar.gz
-                version = filename.rsplit('.', 1)[0]  # 从右边分割一次，取第一部分（去掉最后一个点及之后内容）
+                version = strip_extension(filename)  # 去掉 .tar.gz/.zip 扩展名
                 version_list.append(version)
 
         elif software_type == 'LiftPhoenix500':
             if 'LiftPhoenix500/' in key and (key.endswith('.tar.gz') or key.endswith('.zip')):
                 # 提取类似 embedded-software/LiftPhoenix500/LiftPhoenix500-3.9.16-0.0.0-beta.3.tar.gz 中的 LiftPhoenix500-3.9.16-0.0.0-beta.3
                 filename = key.split('/')[-1]  # LiftPhoenix500-3.9.16-0.0.0-beta.3.tar.gz
-                version = filename.rsplit('.', 1)[0]  # 从右边分割一次，取第一部分（去掉最后一个点及之后内容）
+                version = strip_extension(filename)  # 去掉 .tar.gz/.zip 扩展名
                 version_list.append(version)
 
-    # 去重并排序
-    version_list = sorted(list(set(version_list)), reverse=True)
-    return version_list
+    # 去重并按版本号从新到旧排序
+    return sort_package_names(software_type, validation_rules[software_type], version_list)
 
 
 def download_via_s3(software_type, download_path):
@@ -910,136 +1107,141 @@ def on_versions_loaded(success, result):
 
 # 从S3桶中获取软件版本并填充下拉框
 def populate_s3_versions(ui_components, py_version, parent_widget=None):
-    """从S3桶中获取软件版本并填充下拉框"""
+    """从S3桶中获取软件版本并填充下拉框（可在后台线程中调用）"""
+    s3_version_combo = ui_components['sixth_row']['S3_Version_combo']
+    st_type_combo = ui_components['fourth_row']['st_type_combo']
     # 清空当前下拉框内容
-    ui_components['sixth_row']['S3_Version_combo'].clear()
+    ui_call(s3_version_combo.clear)
     # 获取当前选择的软件类型
-    software_type = ui_components['fourth_row']['st_type_combo'].currentText()
+    software_type = ui_call(st_type_combo.currentText)
 
     try:
         if software_type == 'LMD-TSS':
-            QMessageBox.warning(parent_widget, "警告", f"不支持加载 {software_type} 的版本信息")
+            ui_call(QMessageBox.warning, parent_widget, "警告", f"不支持加载 {software_type} 的版本信息")
             return
-        else:
-            s3 = boto3.client(
-                's3',
-                aws_access_key_id=config_in.CONFIG_AWS_KEY,
-                aws_secret_access_key=config_in.CONFIG_AWS_SECRET_KEY,
-                region_name=config_in.CONFIG_AWS_S3_OTA_BUCKET_REGION  # 你的S3桶所在区域
-            )
 
         # 根据软件类型确定S3路径
-        s3_paths = {
-            'LiftBennu100': 'embedded-software/LiftBennu100/',
-            'LiftPhoenix300-v2': 'embedded-software/LiftPhoenix300/',
-            'LiftPhoenix500': 'embedded-software/LiftPhoenix500/',
-            'LMD-TSS': 'lmd-tss/'
-        }
+        s3_paths = S3_VERSION_PATHS
 
         # 特殊处理：没有可用版本的软件类型
         if software_type == 'LiftPhoenix400':
             logger.error("LiftPhoenix400目前没有可用软件版本")
-            ui_components['fourth_row']['st_type_combo'].addItem("目前没有可用软件版本")
-            QMessageBox.information(parent_widget, "提示", "LiftPhoenix400目前没有可用软件版本")
+            ui_call(st_type_combo.addItem, "目前没有可用软件版本")
+            ui_call(QMessageBox.information, parent_widget, "提示", "LiftPhoenix400目前没有可用软件版本")
             return False
 
         # 检查软件类型是否在支持列表中
         if software_type not in s3_paths:
             logger.error(f"不支持加载 {software_type} 的版本信息")
-            ui_components['fourth_row']['st_type_combo'].addItem("不支持的软件类型")
-            QMessageBox.warning(parent_widget, "警告", f"不支持加载 {software_type} 的版本信息")
+            ui_call(st_type_combo.addItem, "不支持的软件类型")
+            ui_call(QMessageBox.warning, parent_widget, "警告", f"不支持加载 {software_type} 的版本信息")
             return False
 
         # 构建S3路径参数
         if software_type == 'LMD-TSS':
-            QMessageBox.warning(parent_widget, "警告", f"不支持加载 {software_type} 的版本信息")
+            ui_call(QMessageBox.warning, parent_widget, "警告", f"不支持加载 {software_type} 的版本信息")
             # response = s3.list_objects_v2(Bucket='lmd-tss')
         else:
-            bucket = config_in.CONFIG_AWS_S3_OTA_BUCKET
             prefix = s3_paths[software_type]
-            # 列出指定路径下的对象
-            response = s3.list_objects_v2(
-                Bucket=bucket,
-                Prefix=prefix
-            )
+            # 从本地版本目录缓存读取（包含所有分页，过期时在后台刷新）
+            response = version_catalog.listing(prefix)
 
         # 提取并格式化版本信息
         versions = extract_version_info(software_type, response)
 
-        # 过滤版本：只保留包含指定Python版本的软件
-        filtered_versions = [v for v in versions if py_version in v]
+        # 过滤版本：只保留Python版本完全一致的软件
+        index = PackageIndex.from_names(software_type, validation_rules[software_type], versions)
+        filtered_versions = [package.name for package in index.candidates(software_type, py_version)]
 
         # 清空并填充下拉框
-        ui_components['sixth_row']['S3_Version_combo'].clear()
+        ui_call(s3_version_combo.clear)
 
         if filtered_versions:
-            for version in filtered_versions:
-                ui_components['sixth_row']['S3_Version_combo'].addItem(version)
+            ui_call(s3_version_combo.addItems, filtered_versions)
         else:
             logger.error(f"没有找到包含Python {py_version}的软件版本")
-            ui_components['sixth_row']['S3_Version_combo'].addItem(f"未找到Python {py_version}的版本")
-            QMessageBox.information(parent_widget, "提示",
-                                  f"没有找到包含Python {py_version}的软件版本")
+            ui_call(s3_version_combo.addItem, f"未找到Python {py_version}的版本")
+            ui_call(QMessageBox.information, parent_widget, "提示",
+                    f"没有找到包含Python {py_version}的软件版本")
             return False
 
     except Exception as e:
         logger.error(f"加载版本信息失败: {str(e)}")
-        ui_components['sixth_row']['S3_Version_combo'].addItem("加载失败")
-        QMessageBox.critical(parent_widget, "错误", f"加载版本信息失败: {str(e)}")
+        ui_call(s3_version_combo.addItem, "加载失败")
+        ui_call(QMessageBox.critical, parent_widget, "错误", f"加载版本信息失败: {str(e)}")
         return False
     
     return True
 
 
-def download_via_ssh(ssh, ui_components, download_path, remote_path, dialog, parent_widget=None):
+def populate_mirror_versions(ui_components, py_version, parent_widget=None):
+    """用本地镜像中与设备Python版本一致的软件包填充下拉框（可在后台线程中调用）"""
+    s3_version_combo = ui_components['sixth_row']['S3_Version_combo']
+    software_type = ui_call(ui_components['fourth_row']['st_type_combo'].currentText)
+    ui_call(s3_version_combo.clear)
+
+    index = PackageIndex.from_names(software_type, validation_rules[software_type], package_mirror.names(software_type))
+    names = [package.name for package in index.candidates(software_type, py_version)]
+    if not names:
+        logger.error(f"本地镜像中没有Python {py_version}的 {software_type} 软件包")
+        ui_call(s3_version_combo.addItem, f"镜像中没有Python {py_version}的版本")
+        ui_call(QMessageBox.information, parent_widget, "提示",
+                f"本地镜像中没有Python {py_version}的 {software_type} 软件包，请先在网络良好时下载到镜像")
+        return False
+    ui_call(s3_version_combo.addItems, names)
+    return True
+
+
+def download_via_ssh(ssh, ui_components, download_path, remote_path, dialog, parent_widget=None, progress_callback=None):
     """通过SSH下载选中的日志文件"""
-    selected_files = [item.text() for item in dialog.file_list_widget.selectedItems()]
+    selected_files = ui_call(lambda: [item.text() for item in dialog.file_list_widget.selectedItems()])
 
     if not selected_files:
         logger.error("请至少选择一个文件进行下载")
-        QMessageBox.warning(parent_widget, "警告", "请至少选择一个文件进行下载")
+        ui_call(QMessageBox.warning, parent_widget, "警告", "请至少选择一个文件进行下载")
         return
 
     try:
-        sftp = ssh['client'].open_sftp()
-        for filename in selected_files:
+        for index, filename in enumerate(selected_files):
             remote_file = f"{remote_path}/{filename}"
             local_file = f"{download_path}/{filename}"
-            sftp.get(remote_file, local_file)
+            download(ssh, remote_file, local_file)
+            if progress_callback:
+                progress_callback(int((index + 1) * 100 / len(selected_files)))
             # print(f"已下载: {filename}")
 
-        QMessageBox.information(parent_widget, "完成", f"已成功下载 {len(selected_files)} 个文件")
-        success_label = QLabel("✅ 下载log文件成功！")
-        success_label.setStyleSheet("color: green; font-weight: bold; font-size: 18px;")
-        ui_components['seventh_row']['content_layout'].addWidget(success_label)
+        ui_call(QMessageBox.information, parent_widget, "完成", f"已成功下载 {len(selected_files)} 个文件")
+        ui_call(_add_status_label, ui_components, "✅ 下载log文件成功！")
 
     except Exception as e:
         logger.error(f"下载失败: {str(e)}")
-        QMessageBox.critical(parent_widget, "错误", f"下载失败: {str(e)}")
+        ui_call(QMessageBox.critical, parent_widget, "错误", f"下载失败: {str(e)}")
         return
 
 
-def show_download_dialog(ssh, ui_components, parent_widget=None):
+def show_download_dialog(ssh, ui_components, parent_widget=None, progress_callback=None):
+    """日志下载流程（在后台线程中执行，对话框通过 ui_call 在主线程弹出）"""
     # 获取时间范围
-    start_time, end_time = TimeRangeDialog.get_time_range_from_user(parent_widget)
+    start_time, end_time = ui_call(TimeRangeDialog.get_time_range_from_user, parent_widget)
     if not start_time or not end_time:
         return  # 用户取消了操作
 
     # 验证时间范围
     if QDateTime.fromString(start_time, "yyyy-MM-dd HH:mm:ss") > QDateTime.fromString(end_time, "yyyy-MM-dd HH:mm:ss"):
-        QMessageBox.warning(parent_widget, "错误", "开始时间不能晚于结束时间")
+        ui_call(QMessageBox.warning, parent_widget, "错误", "开始时间不能晚于结束时间")
         return
 
-    dialog = DownloadDialog()
+    dialog = ui_call(DownloadDialog)
     generated_files = []  # 用于记录生成的临时文件
 
     # 获取下载类型
-    download_type = ui_components['last_layout']['Download_label_combo'].currentText()
+    download_type = ui_call(ui_components['last_layout']['Download_label_combo'].currentText)
 
     # 如果是S3下载类型，直接提示不支持并返回
     if download_type == "S3":
         logger.warning("当前不支持通过S3下载")
-        QMessageBox.information(
+        ui_call(
+            QMessageBox.information,
             parent_widget,
             "功能提示",
             "目前暂不支持通过S3下载，请使用本地下载方式。",
@@ -1048,7 +1250,7 @@ def show_download_dialog(ssh, ui_components, parent_widget=None):
         return
 
     # 获取软件类型
-    software_type = ui_components['last_layout']['log_st_type_combo'].currentText()
+    software_type = ui_call(ui_components['last_layout']['log_st_type_combo'].currentText)
     if software_type in validation_rules:
         remote_path = validation_rules[software_type]['target_dir']
 
@@ -1099,23 +1301,27 @@ def show_download_dialog(ssh, ui_components, parent_widget=None):
         generated_files = remote_files if not cmd_info.get('direct_download', False) else []
 
         # 清空并填充文件列表
-        dialog.file_list_widget.clear()
-        for file in sorted(remote_files):
-            dialog.file_list_widget.addItem(file.split('/')[-1])
+        def fill_file_list():
+            dialog.file_list_widget.clear()
+            for file in sorted(remote_files):
+                dialog.file_list_widget.addItem(file.split('/')[-1])
+
+        ui_call(fill_file_list)
 
     except Exception as e:
         logger.error(f"处理日志文件失败: {str(e)}")
-        QMessageBox.warning(parent_widget, "错误", f"处理日志文件失败: {str(e)}")
+        ui_call(QMessageBox.warning, parent_widget, "错误", f"处理日志文件失败: {str(e)}")
         return
 
     # 执行对话框
-    if dialog.exec_():
+    if ui_call(dialog.exec_):
         try:
-            download_path = dialog.path_display.text()
+            download_path = ui_call(dialog.path_display.text)
             remote_path = "/opt/lmd-tss/log" if software_type == "LMD-TSS" else remote_path
 
             # 执行下载
-            download_via_ssh(ssh, ui_components, download_path, remote_path, dialog)
+            download_via_ssh(ssh, ui_components, download_path, remote_path, dialog,
+                             progress_callback=progress_callback)
 
             # 仅非直接下载模式需要清理临时文件
             if generated_files and not cmd_info.get('direct_download', False):
@@ -1128,7 +1334,7 @@ def show_download_dialog(ssh, ui_components, parent_widget=None):
 
         except Exception as e:
             logger.error(f"下载过程中出错: {str(e)}")
-            QMessageBox.warning(parent_widget, "错误", f"下载过程中出错: {str(e)}")
+            ui_call(QMessageBox.warning, parent_widget, "错误", f"下载过程中出错: {str(e)}")
         finally:
             # 确保即使出错也尝试清理（仅限非直接下载模式）
             if generated_files and not cmd_info.get('direct_download', False):
@@ -1138,6 +1344,13 @@ def show_download_dialog(ssh, ui_components, parent_widget=None):
                     pass
 
 
+@functools.lru_cache(maxsize=None)
+def certificate_arn(certificate_id):
+    """查询证书 ARN（同时确认证书存在），结果在进程内缓存"""
+    iot = get_client('iot', 1)
+    return iot.describe_certificate(certificateId=certificate_id)['certificateDescription']['certificateArn']
+
+
 # 添加证书
 def attach_cert_to_existing_thing(thing_name, certificate_id):
     """
@@ -1151,19 +1364,8 @@ def attach_cert_to_existing_thing(thing_name, certificate_id):
         # 1. 验证设备存在（匹配图片中的Thing name）
         iot.describe_thing(thingName=thing_name)
 
-        # 2. 构造证书ARN（需与图片中设备所在区域一致）
-        region = iot.meta.region_name
-        account_id = get_client('sts', 1).get_caller_identity()['Account']
-        cert_arn = f"arn:aws:iot:{region}:{account_id}:cert/{certificate_id}"
-
-        # 3. 验证证书存在
-        iot.describe_certificate(certificateId=certificate_id)
-
-        # 4. 执行绑定（图片流程的后续独立操作）
-        iot.attach_thing_principal(
-            thingName=thing_name,
-            principal=cert_arn
-        )
+        # 2. 验证证书存在并绑定（证书ARN只查询一次）
+        attach_certificate(thing_name, certificate_id)
         # print(f"✅ 证书 {certificate_id} 已绑定到设备 {thing_name}")
 
     except iot.exceptions.ResourceNotFoundException as e:
@@ -1178,6 +1380,84 @@ def attach_cert_to_existing_thing(thing_name, certificate_id):
         raise
 
 
+def attach_certificate(thing_name, certificate_id=None):
+    """把证书绑定到设备，不检查设备是否存在（抛出 AWS 的异常）"""
+    get_client('iot', 1).attach_thing_principal(
+        thingName=thing_name,
+        principal=certificate_arn(certificate_id or config_in.CONFIG_CERTIFICATE_ID)
+    )
+
+
+def run_install(ssh_client, rule, device_type, on_line=None, deadline=INSTALL_TIMEOUT):
+    """
+    在设备上执行安装脚本（不涉及界面）
+
+    参数:
+        on_line: 脚本输出的行回调 on_line(stream, line)
+        deadline: 脚本总的截止时间（秒）
+
+    返回:
+        tuple: (success: bool, exit_code: int, error_msg: str)
+        install.sh 以 set -x 运行，成功标志 "+ exit 0" 出现在 stderr 中；LMD6000 没有该标志
+    """
+    # 构建执行命令
+    exec_cmd = f"""
+        sudo su lmahdb {rule['executable_file']}
+    """
+
+    exit_code, output, error_msg = safe_exec(ssh_client, exec_cmd, on_line=on_line, deadline=deadline)
+    success = device_type == 'LMD6000' or "+ exit 0" in error_msg
+    return success, exit_code, error_msg
+
+
+def create_thing(thing_name, thing_type):
+    """在 AWS 上创建 Thing（参数相同时重复创建不会报错）"""
+    get_client('iot', 1).create_thing(
+        thingName=thing_name,
+        thingTypeName=thing_type,
+    )
+
+
+def write_shadow(thing_name, desired=None):
+    """写入设备影子（INIT 的初始影子和 OTA 的期望配置），desired 合并到 state.desired"""
+    # 完全匹配用户提供的影子结构
+    shadow_payload = {
+        "state": {
+            "desired": {
+                "welcome": "aws-iot"
+            },
+            "reported": {
+                "welcome": "aws-iot"
+            }
+        }
+    }
+    if desired:
+        shadow_payload["state"]["desired"].update(desired)
+
+    # "Unnamed shadow"
+    get_client('iot-data', 1).update_thing_shadow(
+        thingName=thing_name,
+        payload=json.dumps(shadow_payload)
+    )
+    invalidate_shadow(thing_name)
+
+
+def create_thing_with_shadow(thing_name, thing_type, desired=None, certificate_id=None):
+    """
+    创建 Thing、写入初始影子并绑定证书（不涉及界面）
+
+    参数:
+        thing_name: 设备SN
+        thing_type: AWS Thing Type（见 device_thing_types）
+        desired: 写入 state.desired 的影子配置
+        certificate_id: 要绑定的证书ID，默认 CONFIG_CERTIFICATE_ID
+    """
+    create_thing(thing_name, thing_type)
+    write_shadow(thing_name, desired)
+    # 刚创建的设备不需要再 describe_thing
+    attach_certificate(thing_name, certificate_id)
+
+
 def execute_software(ui_components, software_type, ssh_client, parent_widget=None):
     """
     执行指定类型的软件程序
@@ -1190,12 +1470,13 @@ def execute_software(ui_components, software_type, ssh_client, parent_widget=Non
     返回:
         bool: 是否执行成功
     """
-    device_type = ui_components['second_row']['device_type_combo'].currentText()
+    device_type = ui_call(ui_components['second_row']['device_type_combo'].currentText)
     try:
         # 检查软件类型是否在验证规则中
         if software_type not in validation_rules:
             logger.error(f"⚠️ 未知软件类型: {software_type}")
-            QMessageBox.warning(
+            ui_call(
+                QMessageBox.warning,
                 parent_widget,
                 "未知类型",
                 f"未知的软件类型: {software_type}"
@@ -1204,18 +1485,14 @@ def execute_software(ui_components, software_type, ssh_client, parent_widget=Non
 
         rule = validation_rules[software_type]
 
-        # 构建执行命令
-        exec_cmd = f"""
-            sudo su lmahdb {rule['executable_file']}
-        """
-
         # 通过SSH执行命令
-        exit_code, output, error_msg = safe_exec(ssh_client, exec_cmd)
+        success, exit_code, error_msg = run_install(ssh_client, rule, device_type, console_writer(ui_components))
         if device_type != 'LMD6000':
             # 检查退出码为0且输出中包含"+ exit 0"
-            if "+ exit 0" in error_msg:
+            if success:
                 logger.debug(f"✅ 成功启动 {software_type} (exit code: {exit_code})")
-                QMessageBox.information(
+                ui_call(
+                    QMessageBox.information,
                     parent_widget,
                     "执行成功",
                     f"已成功启动 {software_type}\n输出: {error_msg}"
@@ -1231,7 +1508,8 @@ def execute_software(ui_components, software_type, ssh_client, parent_widget=Non
                     error_display += f"错误信息: {error_msg}"
 
                 logger.error(f" 执行 {software_type} 失败: {error_display}")
-                QMessageBox.warning(
+                ui_call(
+                    QMessageBox.warning,
                     parent_widget,
                     "执行失败",
                     f"启动 {software_type} 失败:\n{error_display}"
@@ -1242,7 +1520,8 @@ def execute_software(ui_components, software_type, ssh_client, parent_widget=Non
 
     except Exception as e:
         logger.error(f"执行软件时出错: {str(e)}")
-        QMessageBox.critical(
+        ui_call(
+            QMessageBox.critical,
             parent_widget,
             "执行错误",
             f"执行过程中发生错误:\n{str(e)}"
@@ -1250,6 +1529,12 @@ def execute_software(ui_components, software_type, ssh_client, parent_widget=Non
         return False
 
 
+def is_service_active(ssh_client, service_name):
+    """服务是否处于 active 状态（不涉及界面）"""
+    info = probe_device(ssh_client, {'service_name': service_name})
+    return info['service_state'] == 'active'
+
+
 # 检查设备是否正常运行
 def check_service_active(mode_value, ssh_client, service_name, type, parent_widget=None):
     """
@@ -1264,26 +1549,23 @@ def check_service_active(mode_value, ssh_client, service_name, type, parent_widg
         bool: True表示服务正在运行，False表示服务未运行或检查失败
     """
     try:
-        # 执行精简版检查命令
-        exit_code, output, error = safe_exec(ssh_client, f"systemctl is-active {service_name} 2>/dev/null")
-
         # 检查返回状态和输出
-        if exit_code == 0:
+        if is_service_active(ssh_client, service_name):
             if type:
                 if mode_value['mode'] == "INIT":
-                    QMessageBox.information(parent_widget, "服务状态", f"{service_name}初始化成功", QMessageBox.Ok)
+                    ui_call(QMessageBox.information, parent_widget, "服务状态", f"{service_name}初始化成功", QMessageBox.Ok)
                 else:
-                    QMessageBox.information(parent_widget, "服务状态", f"{service_name}更新成功", QMessageBox.Ok)
+                    ui_call(QMessageBox.information, parent_widget, "服务状态", f"{service_name}更新成功", QMessageBox.Ok)
             return True
         else:
             if not type:
-                QMessageBox.warning(parent_widget, "服务状态", f"{service_name}服务未运行", QMessageBox.Ok)
+                ui_call(QMessageBox.warning, parent_widget, "服务状态", f"{service_name}服务未运行", QMessageBox.Ok)
             else:
-                QMessageBox.warning(parent_widget, "服务状态", f"{service_name}服务未运行，请先启动服务", QMessageBox.Ok)
+                ui_call(QMessageBox.warning, parent_widget, "服务状态", f"{service_name}服务未运行，请先启动服务", QMessageBox.Ok)
             return False
 
     except Exception as e:
-        QMessageBox.critical(parent_widget, "检查失败", f"无法检查服务状态:\n{str(e)}", QMessageBox.Ok)
+        ui_call(QMessageBox.critical, parent_widget, "检查失败", f"无法检查服务状态:\n{str(e)}", QMessageBox.Ok)
         return False
 
 
@@ -1331,181 +1613,193 @@ def stop_service(ssh_client, service_name, parent_widget=None):
     #     return False
 
 
+def open_shadow_watch(thing_name, target_version, status_callback=None):
+    """
+    通过 MQTT 订阅设备影子，等待设备上报 target_version
+
+    返回:
+        (ShadowSubscriber, ShadowWatch)；无法连接（如程序中没有内置证书）时返回 (None, None)
+    """
+    def on_update(watch):
+        if status_callback:
+            status_callback(f"设备上报版本 {watch.reported_version}，目标 {watch.target}")
+
+    try:
+        subscriber = ShadowSubscriber().connect()
+    except Exception as e:
+        logger.error(f"无法订阅设备 {thing_name} 的影子: {str(e)}")
+        return None, None
+    return subscriber, subscriber.watch(thing_name, target_version, on_update)
+
+
 # 创建设备，并且启动设备
-def start_to_softwar(mode_value, sn, ui_components, shadow_message, ssh_client, parent_widget=None):
+def start_to_softwar(mode_value, sn, ui_components, shadow_message, ssh_client, parent_widget=None,
+                     progress_callback=None, status_callback=None):
+    """
+    执行INIT/OTA/SWITCH流程（在后台线程中执行）
+
+    流程按 探测 → 创建设备 → 上传 → 停止服务 → 写影子 → 安装 → 校验 分步执行，已完成的步骤按 SN 记录断点，
+    中途失败后再次执行时从失败的步骤继续。
+    """
     certificate_id = config_in.CONFIG_CERTIFICATE_ID
-    software_type = ui_components['fourth_row']['st_type_combo'].currentText()
-    device_type = ui_components['second_row']['device_type_combo'].currentText()
-    upload_type = ui_components['fourth_row']['upload_label_combo'].currentText()
+    mode = mode_value['mode']
+    software_type = ui_call(ui_components['fourth_row']['st_type_combo'].currentText)
+    device_type = ui_call(ui_components['second_row']['device_type_combo'].currentText)
+    upload_type = ui_call(ui_components['fourth_row']['upload_label_combo'].currentText)
     service_name = validation_rules.get(software_type, {}).get('service_name')
+    if mode != "INIT" and upload_type in ('S3', 'Mirror'):
+        # S3 方式选择的是版本，Mirror 方式选择的是镜像中的软件包
+        selected = ui_call(ui_components['sixth_row']['S3_Version_combo'].currentText)
+        workflow_package = selected
+    else:
+        package_path = ui_call(ui_components['sixth_row']['local_version_edit'].text)
+        selected = os.path.basename(package_path)
+        # 与批量操作相同：同名软件包重新打包后从头执行
+        workflow_package = package_key(package_path)
+    # S3 方式写入影子的 DesiredVersion，在下面按包名解析
+    version_number = None
 
     iot_client = get_client('iot', 1)  # 假设使用目标账户客户端
-    iot_data = get_client('iot-data', 1)
 
-    if device_type != 'LMD6000':
-        if not shadow_message['value']:
+    def probe(ctx):
+        if device_type != 'LMD6000' and not shadow_message['value']:
             logger.error("请先获取设备影子配置")
-            QMessageBox.warning(parent_widget, "操作中断", "请先获取设备影子配置", QMessageBox.Ok)
-            return
-
-    # 完全匹配用户提供的影子结构
-    shadow_payload = {
-        "state": {
-            "desired": {
-                "welcome": "aws-iot"  # 图片中要求的字段
-            },
-            "reported": {
-                "welcome": "aws-iot"  # 保持与desired一致
-            }
-        }
-    }
+            ui_call(QMessageBox.warning, parent_widget, "操作中断", "请先获取设备影子配置", QMessageBox.Ok)
+            return False
 
-    if mode_value['mode'] == "INIT":
-        """
-        完整的IoT设备初始化流程
-        :param thing_name: 设备名称 (如 "SN123456")
-        :param group_name: 设备组名称 (如 "LMDC")
-        :param initial_shadow: 初始影子配置 (如 {"version": "1.0.0"})
-        """
-
-        # 1. 验证SN码格式（符合图片中的命名规则）
-        if not all(c.isalnum() or c in ('-', '_', ':') for c in sn['value']):
-            raise ValueError("SN码只能包含字母、数字、连字符、下划线或冒号")
-
-        # 2. 确定设备类型
-        def get_thing_type(device_type):
-            if device_type in ["LMDC", "LMDC-V2"]:
-                return "LMDC-TSB"
-            elif device_type == "LBB300":
-                return "lbb300"
-            elif device_type == "LBB400":
-                return "LBB400"
-            elif device_type == "LMD6000":
-                return "LMD-TSS"
-            else:
-                # 新增：不支持的类型弹出提示框
-                QMessageBox.warning(
+        if mode == "INIT":
+            # 验证SN码格式
+            if not all(c.isalnum() or c in ('-', '_', ':') for c in sn['value']):
+                raise ValueError("SN码只能包含字母、数字、连字符、下划线或冒号")
+            if device_type not in device_thing_types:
+                # 不支持的类型弹出提示框
+                ui_call(
+                    QMessageBox.warning,
                     parent_widget,
                     "不支持的类型",
                     f"当前不支持 {device_type} 类型的设备，仅支持 LMDC/LMDC-V2/LBB300/LBB400/LMD6000",
                     QMessageBox.Ok
                 )
-                return None  # 返回None表示不支持
-
-        thing_type = get_thing_type(device_type)
-        if thing_type is None:  # 检查是否是不支持的类型
-            return  # 直接返回，不继续执行
+                return False
+            return True
 
-        # 尝试获取设备信息，如果成功则表示设备已存在
-        if device_type != 'LMD6000':
-            try:
-                iot_client.describe_thing(thingName=sn['value'])
-                logger.error(f"设备 {sn['value']} 已存在，请切换模式")
-                # 弹出 QMessageBox 错误提示
-                QMessageBox.critical(
-                    parent_widget,  # 父窗口设为当前窗口
-                    "设备已存在",
-                    f"设备 {sn['value']} 已存在，请切换模式！",
-                    QMessageBox.Ok
-                )
-                return  # 可以选择返回或抛出特定异常
-            except iot_client.exceptions.ResourceNotFoundException:
-                try:
-                    # 2. 创建设备（带类型和属性）
-                    response = iot_client.create_thing(
-                        thingName=sn['value'],
-                        thingTypeName=thing_type,
-                    )
-
-                    if shadow_message['value']:
-                        shadow_payload["state"]["desired"].update(shadow_message['value'])
-
-                    # "Unnamed shadow"
-                    response = iot_data.update_thing_shadow(
-                        # thingName=sn['value'],
-                        thingName=sn['value'],
-                        payload=json.dumps(shadow_payload)
-                    )
-
-                    # # 验证结果
-                    # print("经典影子配置完成")
-                    attach_cert_to_existing_thing(sn['value'], certificate_id)
-                    if not execute_software(ui_components, software_type, ssh_client):
-                        return
-                    if execute_software(ui_components, software_type, ssh_client):
-                        # 调用检查方法，模式为INIT
-                        check_service_active(mode_value, ssh_client, service_name, 1)
-                except iot_client.exceptions.ResourceAlreadyExistsException:
-                    logger.debug(f"设备 {sn['value']} 已存在，跳过创建")
-                    # print(f"⚠️ 设备 {thing_name} 已存在，跳过创建")
-                except Exception as e:
-                    logger.error(f"初始化失败: {str(e)}")
-                    # print(f"❌ 初始化失败: {str(e)}")
-                    raise
-        else:
-            if not execute_software(ui_components, software_type, ssh_client):
-                return
-            if execute_software(ui_components, software_type, ssh_client):
-                # 调用检查方法，模式为INIT
-                check_service_active(mode_value, ssh_client, service_name, 1)
-    else:
         if device_type != 'LMD6000':
             try:
                 iot_client.describe_thing(thingName=sn['value'])
             except iot_client.exceptions.ResourceNotFoundException:
                 logger.error(f"设备 {sn['value']} 不存在")
-                # print(f"设备 {thing_name} 不存在")
-                return
+                return False
+        if upload_type == 'S3':
+            return check_service_active(mode_value, ssh_client, service_name, 0)
+        return True
+
+    def provision(ctx):
+        try:
+            iot_client.describe_thing(thingName=sn['value'])
+            # 上次在这一步中途失败时设备可能已经创建，创建/写影子/绑定证书都可以重复执行
+            if ctx.get('retry_step') != 'provision':
+                logger.error(f"设备 {sn['value']} 已存在，请切换模式")
+                ui_call(QMessageBox.critical, parent_widget, "设备已存在",
+                        f"设备 {sn['value']} 已存在，请切换模式！", QMessageBox.Ok)
+                return False
+        except iot_client.exceptions.ResourceNotFoundException:
+            pass
+        try:
+            # 创建设备（带类型），写入影子并绑定证书
+            create_thing_with_shadow(sn['value'], device_thing_types[device_type], shadow_message['value'],
+                                     certificate_id)
+        except iot_client.exceptions.ResourceAlreadyExistsException:
+            logger.error(f"设备 {sn['value']} 已存在且类型不同")
+            ui_call(QMessageBox.critical, parent_widget, "设备已存在",
+                    f"设备 {sn['value']} 已存在且类型不是 {device_thing_types[device_type]}", QMessageBox.Ok)
+            return False
 
+    def upload(ctx):
+        # 从本地镜像部署选中的软件包，之后与 Local 方式相同
+        package_path = package_mirror.path_for(software_type, selected)
+        if not package_path:
+            ui_call(QMessageBox.warning, parent_widget, "警告", f"本地镜像中没有 {selected}")
+            return False
+        deploy_package(ssh_client, package_path, validation_rules[software_type], progress_callback,
+                       console_writer(ui_components), status_callback, delta=True)
+        ui_call(_add_status_label, ui_components, "✅ 镜像软件包部署成功！")
+
+    def stop(ctx):
+        stop_service(ssh_client, service_name)
+
+    def shadow(ctx):
         if upload_type == 'S3':
-            if not check_service_active(mode_value, ssh_client, service_name, 0):
-                return
-            s3_version_full = ui_components['sixth_row']['S3_Version_combo'].currentText()
-            # print(f"原始版本字符串: {s3_version_full}")
-
-            # 根据 software_type 提取版本号
-            if software_type in ['LiftBennu100', 'LiftPhoenix300-v2', 'LiftPhoenix400', 'LiftPhoenix500']:
-                # 找到最后一个 '-' 并提取后面的内容
-                version_number = s3_version_full.rsplit('-', 1)[-1]
-                if shadow_message['value']:
-                    shadow_message['value']['DesiredVersion'] = version_number
-                    # print(shadow_message['value'])
-                if shadow_message['value']:
-                    shadow_payload["state"]["desired"].update(shadow_message['value'])
-
-                # "更新设备影子"
-                response = iot_data.update_thing_shadow(
-                    thingName=sn['value'],
-                    payload=json.dumps(shadow_payload)
-                )
+            if shadow_message['value']:
+                shadow_message['value']['DesiredVersion'] = version_number
+            # 先订阅再写影子，避免错过设备的上报
+            ctx['subscriber'], ctx['watch'] = open_shadow_watch(sn['value'], version_number, status_callback)
+        # "更新设备影子"
+        write_shadow(sn['value'], shadow_message['value'])
+
+    def install(ctx):
+        return execute_software(ui_components, software_type, ssh_client)
+
+    def verify(ctx):
+        if mode == "INIT":
+            # 调用检查方法，模式为INIT
+            return check_service_active(mode_value, ssh_client, service_name, 1)
+        if upload_type != 'S3':
+            if not is_service_active(ssh_client, service_name):
+                ui_call(QMessageBox.warning, parent_widget, "服务状态", f"{service_name}服务未运行", QMessageBox.Ok)
+                return False
+            ui_call(_add_status_label, ui_components, "✅ 执行成功！")
+            return True
 
-                # 调用检查方法，模式为UPDATE
-                check_service_active(mode_value, ssh_client, service_name, 1)
-                success_label = QLabel("✅ 执行成功！")
-                success_label.setStyleSheet("color: green; font-weight: bold; font-size: 18px;")
-                ui_components['seventh_row']['content_layout'].addWidget(success_label)
-            else:
-                logger.debug('原始版本字符串,目前不支持LMD-TSS')
-
-        if upload_type == "Local":
-            stop_service(ssh_client, service_name)
-            if device_type != 'LMD6000':
-                if shadow_message['value']:
-                    shadow_payload["state"]["desired"].update(shadow_message['value'])
-
-                # "更新设备影子"
-                response = iot_data.update_thing_shadow(
-                    thingName=sn['value'],
-                    payload=json.dumps(shadow_payload)
-                )
-                if not execute_software(ui_components, software_type, ssh_client):
-                    return
-                success_label = QLabel("✅ 执行成功！")
-                success_label.setStyleSheet("color: green; font-weight: bold; font-size: 18px;")
-                ui_components['seventh_row']['content_layout'].addWidget(success_label)
-            else:
-                if not execute_software(ui_components, software_type, ssh_client):
-                    return
-                success_label = QLabel("✅ 执行成功！")
-                success_label.setStyleSheet("color: green; font-weight: bold; font-size: 18px;")
-                ui_components['seventh_row']['content_layout'].addWidget(success_label)
+        if 'subscriber' not in ctx:
+            # 从这一步续跑时重新订阅
+            ctx['subscriber'], ctx['watch'] = open_shadow_watch(sn['value'], version_number, status_callback)
+        watch = ctx['watch']
+        if watch is None:
+            # 无法订阅时退回到检查服务状态，模式为UPDATE
+            check_service_active(mode_value, ssh_client, service_name, 1)
+            ui_call(_add_status_label, ui_components, "✅ 执行成功！")
+            return True
+        if not watch.wait(OTA_CONFIRM_TIMEOUT, _cancel_event):
+            ui_call(QMessageBox.warning, parent_widget, "升级未确认",
+                    f"{OTA_CONFIRM_TIMEOUT} 秒内设备未上报版本 {version_number}，"
+                    f"当前上报版本: {watch.reported_version}", QMessageBox.Ok)
+            return False
+        ui_call(_add_status_label, ui_components, f"✅ 设备已上报新版本 {version_number}")
+
+    steps = [Step('probe', probe, '检查设备', always=True)]
+    if mode == "INIT":
+        if device_type != 'LMD6000':
+            steps.append(Step('provision', provision, '创建设备'))
+        steps += [Step('install', install, '安装中'), Step('verify', verify, '检查服务')]
+    elif upload_type == 'S3':
+        if software_type not in S3_SHADOW_SOFTWARE:
+            logger.debug('原始版本字符串,目前不支持LMD-TSS')
+            return
+        try:
+            # 如 LiftPhoenix500-3.9.16-0.0.0-beta.3 中的 0.0.0，不能取最后一个 '-' 后面的预发布标记
+            version_number = parse_package_name(selected, software_type, validation_rules[software_type]).app_version
+        except ValueError as e:
+            logger.error(f"无法解析版本 {selected}: {str(e)}")
+            ui_call(QMessageBox.warning, parent_widget, "警告", f"无法解析版本 {selected}: {str(e)}")
+            return
+        steps += [Step('shadow', shadow, '更新设备影子'), Step('verify', verify, '等待设备上报新版本')]
+    elif upload_type in ('Mirror', 'Local'):
+        if upload_type == 'Mirror':
+            steps.append(Step('upload', upload, '部署镜像软件包'))
+        steps.append(Step('stop', stop, '停止服务'))
+        if device_type != 'LMD6000':
+            steps.append(Step('shadow', shadow, '更新设备影子'))
+        steps += [Step('install', install, '安装中'), Step('verify', verify, '检查服务')]
+    else:
+        return
+
+    def report(step, label):
+        if status_callback:
+            status_callback(label)
+
+    ctx = {'sn': sn['value']}
+    try:
+        StepRunner(f"{mode}:{device_type}:{software_type}:{upload_type}:{workflow_package}", steps, report).run(ctx)
+    finally:
+        if ctx.get('subscriber'):
+            ctx['subscriber'].close()
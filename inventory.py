@@ -0,0 +1,328 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from botocore.exceptions import ClientError
+from aws_tool import get_client, iter_thing_pages, read_shadow, get_latest_metadata_timestamp
+from aws_batch import BATCH_WORKERS, run_batch
+from log import get_app_dir
+
+# 本地设备清单数据库
+INVENTORY_DB = os.path.join(get_app_dir(), 'inventory.db')
+# 每个事务写入的条目数
+SNAPSHOT_BATCH = 200
+# 增量同步：查询影子中这些字段的更新时间晚于上次同步的设备（需要开启 Fleet Indexing 的影子索引）
+SYNC_QUERY = ('shadow.metadata.reported.CurrentVersion.timestamp>{since} OR '
+              'shadow.metadata.reported.app_version.timestamp>{since} OR '
+              'shadow.metadata.reported.PythonVersion.timestamp>{since} OR '
+              'shadow.metadata.desired.DesiredVersion.timestamp>{since}')
+# 索引更新有延迟，查询起点往前多取的秒数
+SYNC_SKEW = 120
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS things (
+    name TEXT PRIMARY KEY,
+    thing_type TEXT,
+    thing_version INTEGER,
+    attributes TEXT,
+    seen REAL
+);
+CREATE INDEX IF NOT EXISTS things_type ON things (thing_type);
+CREATE TABLE IF NOT EXISTS shadows (
+    name TEXT PRIMARY KEY,
+    shadow_version INTEGER,
+    current_version TEXT,
+    app_version TEXT,
+    python_version TEXT,
+    desired_version TEXT,
+    updated_ts INTEGER,
+    reported_ts INTEGER,
+    reported TEXT,
+    desired TEXT,
+    fetched REAL
+);
+CREATE INDEX IF NOT EXISTS shadows_version ON shadows (current_version);
+CREATE TABLE IF NOT EXISTS sync_failed (
+    name TEXT PRIMARY KEY,
+    error TEXT,
+    failed REAL
+);
+'''
+
+
+def parse_shadow(name, content):
+    """把影子文档解析成 shadows 表的一行"""
+    payload = json.loads(content)
+    # get_thing_shadow 返回的文档在 state 下；Fleet Indexing 返回的影子直接是 reported/desired
+    state = payload.get('state', payload)
+    metadata = payload.get('metadata', {})
+    reported = state.get('reported') or {}
+    desired = state.get('desired') or {}
+    return {
+        'name': name,
+        'shadow_version': payload.get('version'),
+        'current_version': reported.get('CurrentVersion'),
+        'app_version': reported.get('app_version'),
+        'python_version': reported.get('PythonVersion'),
+        'desired_version': desired.get('DesiredVersion'),
+        'updated_ts': get_latest_metadata_timestamp(metadata),
+        'reported_ts': get_latest_metadata_timestamp(metadata.get('reported', {})),
+        'reported': json.dumps(reported, ensure_ascii=False),
+        'desired': json.dumps(desired, ensure_ascii=False),
+        'fetched': time.time(),
+    }
+
+
+class Inventory:
+    """
+    保存在本地 SQLite 中的设备清单（things 表）和解析后的影子字段（shadows 表）
+
+    snapshot() 从 AWS 拉取一次后，版本统计等查询都直接查本地数据库。
+    """
+
+    def __init__(self, path=INVENTORY_DB):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._conn.close()
+
+    def upsert_things(self, rows):
+        """rows: [(name, thing_type, thing_version, attributes_json, seen)]"""
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO things (name, thing_type, thing_version, attributes, seen) '
+                'VALUES (?, ?, ?, ?, ?)', rows)
+
+    def upsert_shadows(self, rows):
+        """rows: parse_shadow() 返回的字典"""
+        if not rows:
+            return
+        columns = list(rows[0])
+        with self._lock, self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO shadows ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' * len(columns))})",
+                [[row[c] for c in columns] for row in rows])
+
+    def delete_shadows(self, names):
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM shadows WHERE name = ?', [(name,) for name in names])
+
+    def prune(self, before):
+        """删除 before 之前的快照中出现、最近一次快照中已不存在的设备，返回删除数量"""
+        with self._lock, self._conn:
+            for table in ('shadows', 'sync_failed'):
+                self._conn.execute(f'DELETE FROM {table} WHERE name IN (SELECT name FROM things WHERE seen < ?)',
+                                   (before,))
+            return self._conn.execute('DELETE FROM things WHERE seen < ?', (before,)).rowcount
+
+    def names(self, thing_type=None):
+        if thing_type:
+            rows = self._conn.execute('SELECT name FROM things WHERE thing_type = ? ORDER BY name', (thing_type,))
+        else:
+            rows = self._conn.execute('SELECT name FROM things ORDER BY name')
+        return [row['name'] for row in rows]
+
+    def devices(self, thing_type=None, version=None):
+        """设备及其影子字段，可按类型和当前版本（CurrentVersion 或 app_version）过滤"""
+        sql = 'SELECT * FROM things LEFT JOIN shadows USING (name) WHERE 1 = 1'
+        params = []
+        if thing_type:
+            sql += ' AND thing_type = ?'
+            params.append(thing_type)
+        if version:
+            sql += ' AND COALESCE(current_version, app_version) = ?'
+            params.append(version)
+        return [dict(row) for row in self._conn.execute(sql + ' ORDER BY name', params)]
+
+    def version_counts(self, thing_type=None):
+        """[(thing_type, version, 数量)]，version 为空表示没有影子或没有上报版本"""
+        sql = ('SELECT thing_type, COALESCE(current_version, app_version) AS version, COUNT(*) AS count '
+               'FROM things LEFT JOIN shadows USING (name)')
+        params = []
+        if thing_type:
+            sql += ' WHERE thing_type = ?'
+            params.append(thing_type)
+        sql += ' GROUP BY thing_type, version ORDER BY thing_type, count DESC'
+        return [tuple(row) for row in self._conn.execute(sql, params)]
+
+    def watermark(self):
+        """本地影子中最新的 metadata 时间戳，没有时返回 None"""
+        return self._conn.execute('SELECT MAX(updated_ts) FROM shadows').fetchone()[0]
+
+    def failed_names(self):
+        """上次读取影子失败、下次同步时需要重试的设备"""
+        return [row['name'] for row in self._conn.execute('SELECT name FROM sync_failed ORDER BY name')]
+
+    def mark_failed(self, rows):
+        """rows: [(name, 错误信息)]"""
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.executemany('INSERT OR REPLACE INTO sync_failed (name, error, failed) VALUES (?, ?, ?)',
+                                   [(name, error, now) for name, error in rows])
+
+    def clear_failed(self, names):
+        with self._lock, self._conn:
+            self._conn.executemany('DELETE FROM sync_failed WHERE name = ?', [(name,) for name in names])
+
+    def _fetch_shadows(self, names, aws, workers, report=None):
+        """
+        并发读取影子
+
+        返回:
+            tuple: (parse_shadow 行列表, 影子不存在的设备, [(失败的设备, 错误信息)])
+        """
+        rows, missing, failed = [], [], []
+        for name, content, error in run_batch(lambda n: read_shadow(n, aws), names, workers):
+            if error is None:
+                rows.append(parse_shadow(name, content))
+            elif isinstance(error, ClientError) and error.response['Error']['Code'] == 'ResourceNotFoundException':
+                missing.append(name)
+            else:
+                failed.append((name, str(error)))
+                if report:
+                    report(f"{name}: 发生错误: {str(error)}")
+        return rows, missing, failed
+
+    def shadow_versions(self, names):
+        versions = {}
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            rows = self._conn.execute(
+                f"SELECT name, shadow_version FROM shadows WHERE name IN ({', '.join('?' * len(chunk))})", chunk)
+            versions.update((row['name'], row['shadow_version']) for row in rows)
+        return versions
+
+    def sync(self, aws, workers=BATCH_WORKERS, report=None):
+        """
+        增量同步：用 Fleet Indexing 找出上次同步后影子有更新的设备，只写入影子版本有变化的设备
+
+        索引结果中带有影子文档时直接使用，不再调用 get_thing_shadow。
+        读取影子失败的设备记录在 sync_failed 表中，下次同步时先重试，不会因为时间戳起点前移而漏掉。
+        数据库为空时执行完整的 snapshot()。增量同步不会删除 AWS 上已删除的设备，需要定期执行 snapshot()。
+
+        返回:
+            dict: changed/unchanged/fetched/failed/queries 数量
+        """
+        since = self.watermark()
+        if since is None:
+            if report:
+                report("本地清单为空，执行完整快照")
+            return self.snapshot(aws, workers, report)
+
+        now = time.time()
+        stats = {'changed': 0, 'unchanged': 0, 'fetched': 0, 'failed': 0, 'queries': 0}
+        # 上次读取失败的设备不一定还能被时间戳查询命中，先单独重试
+        retry = self.failed_names()
+        if retry:
+            rows, missing, failed = self._fetch_shadows(retry, aws, workers, report)
+            self._write_shadows(rows, missing, failed)
+            stats['fetched'] += len(retry)
+            stats['changed'] += len(rows)
+            stats['failed'] += len(failed)
+        query = SYNC_QUERY.format(since=int(since) - SYNC_SKEW)
+        iot_client = get_client('iot', aws)
+        next_token = None
+        while True:
+            kwargs = {'nextToken': next_token} if next_token else {}
+            page = iot_client.search_index(indexName='AWS_Things', queryString=query, maxResults=500, **kwargs)
+            stats['queries'] += 1
+            things = page.get('things', [])
+            known = self.shadow_versions([thing['thingName'] for thing in things])
+            thing_rows, shadow_rows, to_fetch = [], [], []
+            for thing in things:
+                name = thing['thingName']
+                thing_rows.append((name, thing.get('thingTypeName'), None,
+                                   json.dumps(thing.get('attributes', {}), ensure_ascii=False), now))
+                if 'shadow' not in thing:
+                    to_fetch.append(name)
+                    continue
+                shadow_rows.append(parse_shadow(name, thing['shadow']))
+            fetched, missing, failed = self._fetch_shadows(to_fetch, aws, workers, report)
+            shadow_rows.extend(fetched)
+            stats['fetched'] += len(to_fetch)
+            stats['failed'] += len(failed)
+            # 影子版本没变的设备不用重写
+            changed = [row for row in shadow_rows
+                       if row['shadow_version'] is None or row['shadow_version'] != known.get(row['name'])]
+            stats['unchanged'] += len(shadow_rows) - len(changed)
+            shadow_rows = changed
+            self._upsert_synced(thing_rows)
+            self.upsert_shadows(shadow_rows)
+            self.delete_shadows(missing)
+            self.clear_failed([row['name'] for row in fetched] + missing)
+            self.mark_failed(failed)
+            stats['changed'] += len(shadow_rows)
+            next_token = page.get('nextToken')
+            if not next_token:
+                break
+        return stats
+
+    def _write_shadows(self, rows, missing, failed):
+        self.upsert_shadows(rows)
+        self.delete_shadows(missing)
+        self.clear_failed([row['name'] for row in rows] + missing)
+        self.mark_failed(failed)
+
+    def _upsert_synced(self, rows):
+        # 只更新类型和属性，保留 list_things 得到的 thing_version
+        with self._lock, self._conn:
+            self._conn.executemany(
+                'INSERT INTO things (name, thing_type, thing_version, attributes, seen) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (name) DO UPDATE SET thing_type = excluded.thing_type, '
+                'attributes = excluded.attributes, seen = excluded.seen', rows)
+
+    def snapshot(self, aws, workers=BATCH_WORKERS, report=None):
+        """
+        从 AWS 拉取所有设备和影子，分批写入数据库
+
+        参数:
+            aws: AWS 账号编号
+            workers: 并发读取影子的线程数
+            report: 进度回调，参数为一行文字
+
+        返回:
+            dict: things/shadows/missing/failed/pruned 数量
+        """
+        started = time.time()
+        names = []
+        batch = []
+        for page in iter_thing_pages(aws):
+            for item in page:
+                names.append(item['thingName'])
+                batch.append((item['thingName'], item.get('thingTypeName'), item.get('version'),
+                              json.dumps(item.get('attributes', {}), ensure_ascii=False), started))
+                if len(batch) >= SNAPSHOT_BATCH:
+                    self.upsert_things(batch)
+                    batch = []
+        self.upsert_things(batch)
+        if report:
+            report(f"things: {len(names)}")
+
+        stats = {'things': len(names), 'shadows': 0, 'missing': 0, 'failed': 0}
+        rows, missing, failed = [], [], []
+        for i, (name, content, error) in enumerate(run_batch(lambda n: read_shadow(n, aws), names, workers), 1):
+            if error is None:
+                rows.append(parse_shadow(name, content))
+                stats['shadows'] += 1
+            elif isinstance(error, ClientError) and error.response['Error']['Code'] == 'ResourceNotFoundException':
+                missing.append(name)
+                stats['missing'] += 1
+            else:
+                failed.append((name, str(error)))
+                stats['failed'] += 1
+                if report:
+                    report(f"{name}: 发生错误: {str(error)}")
+            if len(rows) + len(missing) + len(failed) >= SNAPSHOT_BATCH:
+                self._write_shadows(rows, missing, failed)
+                rows, missing, failed = [], [], []
+                if report:
+                    report(f"shadows: {i}/{len(names)}")
+        self._write_shadows(rows, missing, failed)
+        stats['pruned'] = self.prune(started)
+        return stats
@@ -3,15 +3,17 @@ import os
 import logging
 
 
-def setup_logger():
-    """配置全局日志记录器"""
+def get_app_dir():
+    """程序所在目录，日志和本地缓存都放在这里"""
     # 判断是否打包成 EXE
     if getattr(sys, 'frozen', False):
-        log_dir = os.path.dirname(sys.executable)  # EXE 所在目录
-    else:
-        log_dir = os.path.dirname(os.path.abspath(__file__))  # 开发时脚本目录
+        return os.path.dirname(sys.executable)  # EXE 所在目录
+    return os.path.dirname(os.path.abspath(__file__))  # 开发时脚本目录
+
 
-    log_file = os.path.join(log_dir, 'dms.log')
+def setup_logger():
+    """配置全局日志记录器"""
+    log_file = os.path.join(get_app_dir(), 'dms.log')
 
     logger = logging.getLogger()
     if not logger.handlers:
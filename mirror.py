@@ -0,0 +1,246 @@
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from s3_catalog import S3_VERSION_PATHS, version_catalog, get_s3_client
+from package_index import PACKAGE_EXTENSIONS, PackageIndex, strip_extension
+from transfer import TransferProgress
+from log import logger, get_app_dir
+
+# 本地软件包镜像目录：objects/<sha256> 保存内容，index.json 记录 S3 Key 与内容的对应关系
+MIRROR_DIR = os.path.join(get_app_dir(), 'mirror')
+# 镜像容量上限（字节）和最长保留天数（按最近使用时间）
+MIRROR_MAX_BYTES = 5 * 1024 * 1024 * 1024
+MIRROR_MAX_AGE_DAYS = 90
+# 每个软件类型、每个 Python 版本默认预取的最新版本数
+MIRROR_KEEP_LATEST = 3
+# 分段下载的段大小和并发数
+PART_SIZE = 8 * 1024 * 1024
+DOWNLOAD_WORKERS = 8
+
+
+class MirrorError(Exception):
+    """下载的软件包大小或校验值与 S3 不一致"""
+
+
+class PackageMirror:
+    """按内容寻址的本地 S3 软件包镜像，用于现场没有网络时部署"""
+
+    def __init__(self, root=MIRROR_DIR, max_bytes=MIRROR_MAX_BYTES, max_age_days=MIRROR_MAX_AGE_DAYS):
+        self.root = root
+        self.objects_dir = os.path.join(root, 'objects')
+        self.index_path = os.path.join(root, 'index.json')
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self._packages = None
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._packages is not None:
+            return
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                self._packages = json.load(f)
+        except (OSError, ValueError):
+            self._packages = {}
+
+    def _save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = f"{self.index_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self._packages, f, indent=1)
+        os.replace(tmp_path, self.index_path)
+
+    def packages(self, software_type=None):
+        """镜像中的软件包列表，每项包含 key/name/software_type/sha256/etag/size/last_access"""
+        with self._lock:
+            self._load()
+            return [dict(entry, key=key) for key, entry in self._packages.items()
+                    if software_type is None or entry['software_type'] == software_type]
+
+    def names(self, software_type):
+        return [entry['name'] for entry in self.packages(software_type)]
+
+    def path_for(self, software_type, name):
+        """
+        返回镜像中软件包的本地路径，并刷新最近使用时间
+
+        返回的文件名是原始包名，可以直接交给 deploy_package / validate_init_file
+        """
+        with self._lock:
+            self._load()
+            for key, entry in self._packages.items():
+                if entry['software_type'] == software_type and entry['name'] == name:
+                    entry['last_access'] = time.time()
+                    self._save()
+                    return self._named_path(entry, key)
+        return None
+
+    def _named_path(self, entry, key):
+        # 内容按 sha256 保存，部署时需要原始文件名，这里建立一个同名的硬链接（不支持时复制）
+        named_dir = os.path.join(self.root, 'named', entry['sha256'][:16])
+        named_path = os.path.join(named_dir, os.path.basename(key))
+        if not os.path.exists(named_path):
+            os.makedirs(named_dir, exist_ok=True)
+            blob = os.path.join(self.objects_dir, entry['sha256'])
+            try:
+                os.link(blob, named_path)
+            except OSError:
+                shutil.copyfile(blob, named_path)
+        return named_path
+
+    def _download(self, key, size, etag, progress):
+        """分段并发下载到临时文件，返回 (临时文件路径, sha256)"""
+        os.makedirs(self.objects_dir, exist_ok=True)
+        tmp_path = os.path.join(self.objects_dir, f"{hashlib.sha1(key.encode()).hexdigest()}.part")
+        with open(tmp_path, 'wb') as f:
+            f.truncate(size)
+
+        s3 = get_s3_client()
+        done = [0]
+        done_lock = threading.Lock()
+        # 第一段响应中的加密方式和用户元数据，用于选择校验方式
+        headers = {}
+
+        def fetch(start):
+            end = min(start + PART_SIZE, size) - 1
+            response = s3.get_object(Bucket=version_catalog.bucket, Key=key, Range=f"bytes={start}-{end}")
+            if start == 0:
+                headers['sse'] = response.get('ServerSideEncryption')
+                headers['metadata'] = {k.lower(): v.lower() for k, v in response.get('Metadata', {}).items()}
+            with open(tmp_path, 'r+b') as f:
+                f.seek(start)
+                for chunk in response['Body'].iter_chunks(1024 * 1024):
+                    f.write(chunk)
+                    with done_lock:
+                        done[0] += len(chunk)
+                        progress.update(done[0])
+
+        with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+            list(executor.map(fetch, range(0, size, PART_SIZE)))
+
+        if os.path.getsize(tmp_path) != size or done[0] != size:
+            raise MirrorError(f"{key} 下载大小不一致: {done[0]}/{size}")
+
+        sha256, md5 = hashlib.sha256(), hashlib.md5()
+        with open(tmp_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+                md5.update(chunk)
+        metadata = headers.get('metadata', {})
+        if 'sha256' in metadata:
+            # 上传时写入元数据的校验值优先
+            ok = sha256.hexdigest() == metadata['sha256']
+        elif 'md5' in metadata:
+            ok = md5.hexdigest() == metadata['md5']
+        elif '-' not in etag and headers.get('sse') in (None, 'AES256'):
+            ok = md5.hexdigest() == etag
+        else:
+            # 分段上传（ETag 带 "-"）或 SSE-KMS/SSE-C 加密的对象 ETag 不是 MD5，只能依赖大小和分段响应的完整性
+            ok = True
+        if not ok:
+            raise MirrorError(f"{key} 校验失败")
+        return tmp_path, sha256.hexdigest()
+
+    def fetch(self, key, software_type, progress_callback=None, status_callback=None):
+        """
+        把一个 S3 对象下载到镜像，ETag 未变化时跳过
+
+        返回:
+            dict: 镜像条目
+        """
+        info = version_catalog.objects(S3_VERSION_PATHS[software_type])[key]
+        with self._lock:
+            self._load()
+            entry = self._packages.get(key)
+            if entry and entry['etag'] == info['ETag'] \
+                    and os.path.exists(os.path.join(self.objects_dir, entry['sha256'])):
+                return entry
+
+        logger.info(f"镜像下载 {key} ({info['Size']} 字节)")
+        progress = TransferProgress(info['Size'], progress_callback, status_callback)
+        tmp_path, sha256 = self._download(key, info['Size'], info['ETag'], progress)
+        blob = os.path.join(self.objects_dir, sha256)
+        if os.path.exists(blob):
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, blob)
+
+        entry = {
+            'name': strip_extension(key),
+            'software_type': software_type,
+            'sha256': sha256,
+            'etag': info['ETag'],
+            'size': info['Size'],
+            'last_access': time.time(),
+        }
+        with self._lock:
+            self._load()
+            self._packages[key] = entry
+            self._save()
+        return entry
+
+    def prefetch(self, software_type, rule, latest=MIRROR_KEEP_LATEST, progress_callback=None,
+                 status_callback=None):
+        """
+        刷新 S3 版本目录，并把每个 Python 版本最新的 latest 个软件包下载到镜像
+
+        返回:
+            list[str]: 本次新下载的包名
+        """
+        objects = version_catalog.objects(S3_VERSION_PATHS[software_type], force=True)
+        keys = {strip_extension(key): key for key in objects if key.endswith(PACKAGE_EXTENSIONS)}
+        index = PackageIndex.from_names(software_type, rule, keys)
+
+        wanted = []
+        for python_version in index.python_versions(software_type):
+            wanted += [keys[package.name] for package in index.candidates(software_type, python_version)[:latest]]
+
+        fetched = []
+        for i, key in enumerate(wanted):
+            if status_callback:
+                status_callback(f"{i + 1}/{len(wanted)} {os.path.basename(key)}")
+            with self._lock:
+                self._load()
+                before = self._packages.get(key, {}).get('etag')
+            entry = self.fetch(key, software_type, progress_callback)
+            if entry['etag'] != before:
+                fetched.append(entry['name'])
+        self.evict()
+        return fetched
+
+    def evict(self):
+        """删除超过保留天数的软件包，再按最近使用时间淘汰到容量上限以内"""
+        with self._lock:
+            self._load()
+            now = time.time()
+            for key, entry in list(self._packages.items()):
+                if now - entry['last_access'] > self.max_age_days * 86400:
+                    logger.info(f"镜像中 {entry['name']} 超过 {self.max_age_days} 天未使用，删除")
+                    del self._packages[key]
+
+            total = 0
+            for key, entry in sorted(self._packages.items(), key=lambda item: item[1]['last_access'], reverse=True):
+                total += entry['size']
+                if total > self.max_bytes:
+                    logger.info(f"镜像空间不足，删除 {entry['name']}")
+                    del self._packages[key]
+            self._save()
+
+            # 删除不再被引用的内容
+            referenced = {entry['sha256'] for entry in self._packages.values()}
+            if os.path.isdir(self.objects_dir):
+                for name in os.listdir(self.objects_dir):
+                    if name not in referenced and not name.endswith('.part'):
+                        os.remove(os.path.join(self.objects_dir, name))
+            named_root = os.path.join(self.root, 'named')
+            if os.path.isdir(named_root):
+                for name in os.listdir(named_root):
+                    if not any(sha.startswith(name) for sha in referenced):
+                        shutil.rmtree(os.path.join(named_root, name), ignore_errors=True)
+
+
+package_mirror = PackageMirror()
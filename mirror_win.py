@@ -0,0 +1,113 @@
+import time
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QCheckBox, QSpinBox, QProgressBar
+from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox
+from PyQt5.QtGui import QFont
+from fun import validation_rules
+from mirror import MIRROR_KEEP_LATEST, package_mirror
+from s3_catalog import S3_VERSION_PATHS
+from worker import run_async
+
+
+def prefetch_packages(software_types, latest, progress_callback=None, status_callback=None):
+    """依次把多个软件类型的最新软件包下载到本地镜像，返回新下载的包名"""
+    fetched = []
+    for software_type in software_types:
+        fetched += package_mirror.prefetch(software_type, validation_rules[software_type], latest,
+                                           progress_callback, status_callback)
+    return fetched
+
+
+class MirrorDialog(QDialog):
+    """本地软件包镜像：在网络好的时候预先下载 S3 上的软件包，现场用 Mirror 方式部署"""
+
+    COLUMNS = ["软件包", "软件类型", "大小(MB)", "最近使用"]
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.running = False
+        self._setup_ui()
+        self._refresh_table()
+
+    def _setup_ui(self):
+        font = QFont('Arial', 12)
+        self.setWindowTitle("软件包镜像")
+        self.resize(800, 500)
+
+        layout = QVBoxLayout()
+
+        type_layout = QHBoxLayout()
+        self.type_checks = {}
+        for software_type in S3_VERSION_PATHS:
+            if software_type == 'LMD-TSS':
+                continue
+            check = QCheckBox(software_type)
+            check.setFont(font)
+            check.setChecked(True)
+            self.type_checks[software_type] = check
+            type_layout.addWidget(check)
+        layout.addLayout(type_layout)
+
+        run_layout = QHBoxLayout()
+        self.latest_spin = QSpinBox()
+        self.latest_spin.setFont(font)
+        self.latest_spin.setRange(1, 20)
+        self.latest_spin.setValue(MIRROR_KEEP_LATEST)
+        self.prefetch_btn = QPushButton("下载")
+        self.prefetch_btn.setFont(font)
+        self.prefetch_btn.clicked.connect(self._prefetch)
+        self.status_label = QLabel("")
+        self.status_label.setFont(font)
+        run_layout.addWidget(QLabel("每个Python版本保留最新:"))
+        run_layout.addWidget(self.latest_spin)
+        run_layout.addWidget(self.prefetch_btn)
+        run_layout.addWidget(self.status_label, stretch=1)
+        layout.addLayout(run_layout)
+
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setRange(0, 100)
+        layout.addWidget(self.progress_bar)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        layout.addWidget(self.table)
+
+        self.setLayout(layout)
+
+    def _refresh_table(self):
+        packages = sorted(package_mirror.packages(), key=lambda p: (p['software_type'], p['name']))
+        self.table.setRowCount(len(packages))
+        for row, package in enumerate(packages):
+            values = [package['name'], package['software_type'], f"{package['size'] / 1024 / 1024:.1f}",
+                      time.strftime('%Y-%m-%d %H:%M', time.localtime(package['last_access']))]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+
+    def _prefetch(self):
+        software_types = [t for t, check in self.type_checks.items() if check.isChecked()]
+        if self.running or not software_types:
+            return
+        self.running = True
+        self.prefetch_btn.setEnabled(False)
+        self.progress_bar.setValue(0)
+        run_async(prefetch_packages, software_types, self.latest_spin.value(),
+                  on_progress=self.progress_bar.setValue, on_status=self.status_label.setText,
+                  on_result=self._on_result, on_error=self._on_error, on_finished=self._on_finished)
+
+    def _on_result(self, fetched):
+        self.status_label.setText(f"完成，新下载 {len(fetched)} 个软件包")
+
+    def _on_error(self, err):
+        exctype, value, tb = err
+        QMessageBox.critical(self, "错误", f"下载失败: {value}")
+
+    def _on_finished(self):
+        self.running = False
+        self.prefetch_btn.setEnabled(True)
+        self._refresh_table()
+
+    def reject(self):
+        # 下载中不允许关闭窗口，避免回调访问已销毁的控件
+        if not self.running:
+            super().reject()
@@ -0,0 +1,157 @@
+import os
+import re
+from collections import namedtuple
+from log import logger
+
+PACKAGE_EXTENSIONS = ('.tar.gz', '.tgz', '.zip')
+
+# 软件包名解析结果，如 LiftPhoenix500-3.9.16-0.0.0-beta.3.tar.gz:
+#   python_version="3.9.16", app_version="0.0.0", prerelease="beta.3"
+# LMD-TSS 之类不依赖 Python 的软件，所有数字段都属于 app_version（如 "2.5.2-2.0.4-2.0.3"）
+PackageVersion = namedtuple('PackageVersion',
+                            'name software_type python_version app_version prerelease variant')
+
+_NUMERIC = re.compile(r'\d+(\.\d+)*')
+_VARIANT = re.compile(r'[A-Za-z]\w*')
+_PRERELEASE = re.compile(r'[0-9A-Za-z.]+')
+
+
+def strip_extension(filename):
+    """去掉目录和 .tar.gz/.tgz/.zip 扩展名"""
+    name = os.path.basename(filename)
+    for ext in PACKAGE_EXTENSIONS:
+        if name.endswith(ext):
+            return name[:-len(ext)]
+    return name
+
+
+def parse_package_name(filename, software_type, rule):
+    """
+    解析软件包文件名
+
+    参数:
+        filename: 文件名或 S3 Key
+        software_type: 软件类型
+        rule: validation_rules 中的规则，rule 中有 pyversion_command 时第一个数字段是 Python 版本
+
+    返回:
+        PackageVersion
+
+    异常:
+        ValueError: 文件名不符合 <prefix>-[变体-][Python版本-]<版本>[-预发布标记] 格式
+    """
+    name = strip_extension(filename)
+    prefix = rule['prefix']
+    if not name.startswith(prefix + '-'):
+        raise ValueError(f"文件名必须以 '{prefix}-' 开头")
+
+    parts = name[len(prefix) + 1:].split('-')
+    variant = None
+    if len(parts) > 1 and _VARIANT.fullmatch(parts[0]):
+        # 如 LiftPhoenix300-V2-2.0.1 中的 V2
+        variant = parts.pop(0)
+
+    numeric = []
+    while parts and _NUMERIC.fullmatch(parts[0]):
+        numeric.append(parts.pop(0))
+    if not numeric:
+        raise ValueError(f"'{name}' 中没有版本号")
+    for part in parts:
+        if not _PRERELEASE.fullmatch(part):
+            raise ValueError(f"版本号段 '{part}' 格式无效（应为数字和点，如 3.9.16)")
+
+    python_version = numeric.pop(0) if 'pyversion_command' in rule and len(numeric) > 1 else None
+    return PackageVersion(name, software_type, python_version, '-'.join(numeric), '-'.join(parts) or None,
+                          variant)
+
+
+def _prerelease_key(prerelease):
+    # semver: 正式版高于预发布版；预发布标记逐段比较，数字段按数值比较且低于字母段
+    if prerelease is None:
+        return (1,)
+    parts = prerelease.replace('-', '.').split('.')
+    return (0, tuple((0, int(p), '') if p.isdigit() else (1, 0, p) for p in parts))
+
+
+def version_key(package):
+    """PackageVersion 的排序键，按数值比较各版本段"""
+    app = tuple(tuple(int(n) for n in group.split('.')) for group in package.app_version.split('-'))
+    python = tuple(int(n) for n in package.python_version.split('.')) if package.python_version else ()
+    return app, _prerelease_key(package.prerelease), python
+
+
+class PackageIndex:
+    """
+    按 (软件类型, Python版本, 软件版本, 预发布标记, 变体) 索引的软件包集合
+
+    candidates() 按 (软件类型, Python版本) 直接取出兼容的软件包，已按版本从新到旧排好序。
+    """
+
+    def __init__(self, packages=()):
+        self._by_key = {}
+        self._candidates = {}
+        self._unsorted = set()
+        for package in packages:
+            self.add(package)
+
+    @classmethod
+    def from_names(cls, software_type, rule, names):
+        """解析一组文件名建立索引，无法解析的文件名被忽略"""
+        index = cls()
+        for name in names:
+            try:
+                index.add(parse_package_name(name, software_type, rule))
+            except ValueError as e:
+                logger.debug(f"忽略无法解析的软件包 {name}: {str(e)}")
+        return index
+
+    def add(self, package):
+        # 变体不同的同版本软件包（如 LiftPhoenix300-V2-2.0.1 和 LiftPhoenix300-2.0.1）是不同的软件包
+        key = (package.software_type, package.python_version, package.app_version, package.prerelease,
+               package.variant)
+        if key in self._by_key:
+            return
+        self._by_key[key] = package
+        bucket_key = (package.software_type, package.python_version)
+        self._candidates.setdefault(bucket_key, []).append(package)
+        self._unsorted.add(bucket_key)
+
+    def _bucket(self, software_type, python_version):
+        bucket_key = (software_type, python_version)
+        bucket = self._candidates.get(bucket_key, [])
+        if bucket_key in self._unsorted:
+            bucket.sort(key=version_key, reverse=True)
+            self._unsorted.discard(bucket_key)
+        return bucket
+
+    def get(self, software_type, python_version, app_version, prerelease=None, variant=None):
+        return self._by_key.get((software_type, python_version, app_version, prerelease, variant))
+
+    def candidates(self, software_type, python_version):
+        """与指定 Python 版本完全匹配的软件包，从新到旧"""
+        return list(self._bucket(software_type, python_version))
+
+    def latest(self, software_type, python_version, include_prerelease=False):
+        for package in self._bucket(software_type, python_version):
+            if include_prerelease or package.prerelease is None:
+                return package
+        return None
+
+    def python_versions(self, software_type):
+        """索引中该软件类型出现过的 Python 版本（None 表示包名中没有 Python 版本）"""
+        return [python for st, python in self._candidates if st == software_type]
+
+    def __len__(self):
+        return len(self._by_key)
+
+
+def sort_package_names(software_type, rule, names):
+    """按版本从新到旧排序文件名，无法解析的排在最后"""
+    parsed, others = [], []
+    for name in set(names):
+        try:
+            parsed.append((parse_package_name(name, software_type, rule), name))
+        except ValueError:
+            others.append(name)
+    parsed.sort(key=lambda item: version_key(item[0]), reverse=True)
+    return [name for _, name in parsed] + sorted(others, reverse=True)
@@ -0,0 +1,80 @@
+import os
+from ssh_stream import stream_exec
+from transfer import file_sha256, upload_resumable
+from log import logger
+
+# 设备上按 SHA-256 命名的软件包仓库
+PACKAGE_STORE_DIR = "/home/long0929g/.dms_packages"
+# 仓库的容量上限（字节），超出后按最近使用时间淘汰
+PACKAGE_STORE_MAX_BYTES = 1024 * 1024 * 1024
+# 未完成的上传文件超过这么多天没有续传就删除
+PARTIAL_MAX_AGE_DAYS = 1
+
+
+def store_path(sha256):
+    """软件包在设备仓库中的路径"""
+    return f"{PACKAGE_STORE_DIR}/{sha256}"
+
+
+def _run(ssh, command):
+    exit_code, output, error = stream_exec(ssh, command, timeout=60)
+    return exit_code, output
+
+
+def has_package(ssh, sha256):
+    """设备仓库中是否已有该软件包，有的话刷新其使用时间"""
+    path = store_path(sha256)
+    exit_code, output = _run(ssh, f'[ -f "{path}" ] && touch "{path}" && echo hit')
+    return output == 'hit'
+
+
+def evict(ssh, max_bytes=PACKAGE_STORE_MAX_BYTES, keep=None):
+    """
+    按最近使用时间从新到旧累计大小，超过 max_bytes 的旧软件包被删除
+
+    参数:
+        keep: 不删除的软件包 SHA-256（刚上传的软件包）
+    """
+    command = f"""
+        cd "{PACKAGE_STORE_DIR}" || exit 0
+        find . -maxdepth 1 -name '*.part' -mtime +{PARTIAL_MAX_AGE_DAYS} -delete
+        total=0
+        for f in $(ls -1t | grep -v '\\.part$'); do
+            total=$((total + $(stat -c %s "$f")))
+            if [ "$total" -gt {max_bytes} ] && [ "$f" != "{keep or ''}" ]; then
+                rm -f "$f" && echo "$f"
+            fi
+        done
+    """
+    exit_code, output = _run(ssh, command)
+    for sha256 in output.split():
+        logger.info(f"设备仓库空间不足，删除软件包 {sha256}")
+
+
+def ensure_package(ssh, local_path, progress_callback=None, status_callback=None):
+    """
+    确保设备仓库中有该软件包，已存在时跳过上传
+
+    参数:
+        ssh: {'client': SSHSession}
+        local_path: 本地软件包路径
+        progress_callback / status_callback: 见 upload_resumable
+
+    返回:
+        str: 软件包在设备上的路径
+    """
+    sha256 = file_sha256(local_path)
+    path = store_path(sha256)
+    if has_package(ssh, sha256):
+        logger.info(f"设备上已有 {os.path.basename(local_path)}（{sha256[:12]}），跳过上传")
+        if progress_callback:
+            progress_callback(100)
+        return path
+
+    _run(ssh, f'mkdir -p "{PACKAGE_STORE_DIR}"')
+    # 先上传为 .part，校验通过后再改名，仓库里只会出现完整的软件包
+    partial_path = f"{path}.part"
+    upload_resumable(ssh, local_path, partial_path, progress_callback, status_callback, local_sha256=sha256)
+    ssh['client'].open_sftp().posix_rename(partial_path, path)
+    evict(ssh, keep=sha256)
+    return path
@@ -0,0 +1,85 @@
+from log import logger
+
+# 每个字段输出行的前缀，用于在一次输出中区分各个字段
+PROBE_MARKER = "__DMS_PROBE__"
+PROBE_FIELDS = ('sn', 'app_version', 'python_version', 'service_state', 'disk_free_kb', 'os_info')
+
+
+def build_probe_script(rule=None):
+    """
+    生成一次性采集设备信息的 shell 脚本
+
+    参数:
+        rule: validation_rules 中的规则，提供 version_command / service_name / target_dir，
+              为空时只采集与软件无关的字段
+    """
+    rule = rule or {}
+    target_dir = rule.get('target_dir', '/')
+    lines = [
+        f'echo "{PROBE_MARKER}sn=$(cat /etc/sn 2>/dev/null)"',
+        f'echo "{PROBE_MARKER}python_version=$(python3 --version 2>&1)"',
+        f'd="{target_dir}"; [ -d "$d" ] || d=/',
+        f'echo "{PROBE_MARKER}disk_free_kb=$(df -Pk "$d" 2>/dev/null | awk \'NR==2 {{print $4}}\')"',
+        f'echo "{PROBE_MARKER}os_info=$(uname -srm 2>/dev/null); $(. /etc/os-release 2>/dev/null; echo $PRETTY_NAME)"',
+    ]
+    if rule.get('version_command'):
+        lines.append(f'echo "{PROBE_MARKER}app_version=$({rule["version_command"]} 2>/dev/null)"')
+    if rule.get('service_name'):
+        lines.append(f'echo "{PROBE_MARKER}service_state=$(systemctl is-active {rule["service_name"]} 2>/dev/null)"')
+    return "\n".join(lines)
+
+
+def parse_probe_output(output):
+    """
+    解析探测脚本的输出
+
+    返回:
+        dict: 包含 PROBE_FIELDS 中的所有字段，未采集到的字段为 None
+    """
+    result = dict.fromkeys(PROBE_FIELDS)
+    key = None
+    for line in output.splitlines():
+        if line.startswith(PROBE_MARKER):
+            key, _, value = line[len(PROBE_MARKER):].partition('=')
+            result[key] = value
+        elif key:
+            # 命令输出有多行时追加到上一个字段
+            result[key] = f"{result[key]}\n{line}"
+
+    for field in PROBE_FIELDS:
+        if result[field] is not None:
+            result[field] = result[field].strip() or None
+
+    # "Python 3.9.16" -> "3.9.16"
+    if result['python_version']:
+        parts = result['python_version'].split()
+        result['python_version'] = parts[1] if len(parts) > 1 and parts[0] == 'Python' else None
+    if result['disk_free_kb']:
+        result['disk_free_kb'] = int(result['disk_free_kb']) if result['disk_free_kb'].isdigit() else None
+    return result
+
+
+def probe_device(ssh_client, rule=None, timeout=15):
+    """
+    通过一次远程命令采集设备的 SN、软件版本、Python版本、服务状态、剩余空间和系统信息
+
+    参数:
+        ssh_client: {'client': SSHSession}
+        rule: validation_rules 中的规则（可选）
+
+    返回:
+        dict: 见 parse_probe_output
+    """
+    stdin, stdout, stderr = None, None, None
+    try:
+        stdin, stdout, stderr = ssh_client['client'].exec_command(build_probe_script(rule), timeout=timeout)
+        output = stdout.read().decode(errors='replace')
+        stdout.channel.recv_exit_status()
+    finally:
+        for stream in [stdin, stdout, stderr]:
+            if stream:
+                stream.close()
+
+    result = parse_probe_output(output)
+    logger.debug(f"设备探测结果: {result}")
+    return result
@@ -0,0 +1,191 @@
+"""
+仓库批量初始化：按 CSV 中的 SN 和设备类型在 AWS 上创建设备、写入初始影子并绑定证书
+
+用法:
+    python provision.py sn_list.csv --workers 8 --rate 10
+
+CSV 表头: sn, device_type；结果写入 <csv>.report.csv
+"""
+import argparse
+import csv
+import time
+from botocore.exceptions import ClientError
+from aws_tool import get_client, iter_things
+from aws_batch import TokenBucket, call_with_backoff, is_retryable, run_batch
+from fun import device_thing_types, check_sn, device_types_for_sn, certificate_arn
+from fun import create_thing, write_shadow, attach_certificate
+from fleet import load_default_shadow
+from log import logger
+import config_in
+
+# 并发数和所有 AWS 请求共享的每秒请求数（需低于 IoT 控制面 CreateThing/AttachThingPrincipal 的配额）
+PROVISION_WORKERS = 8
+PROVISION_RATE = 10
+
+REPORT_COLUMNS = ['sn', 'device_type', 'thing_type', 'status', 'stage', 'error', 'seconds']
+
+
+def load_provision_csv(path):
+    """
+    读取 SN 清单，重复的 SN 只保留第一行
+
+    返回:
+        list[dict]: 每行一个 {'sn', 'device_type'}
+    """
+    rows, seen = [], set()
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for row in csv.DictReader(f):
+            row = {k.strip().lower(): (v or '').strip() for k, v in row.items() if k}
+            sn = row.get('sn', '')
+            if sn and sn not in seen:
+                seen.add(sn)
+                rows.append({'sn': sn, 'device_type': row.get('device_type', '')})
+    return rows
+
+
+def existing_things(thing_types):
+    """按 Thing Type 各列举一次，返回已经存在的设备名"""
+    names = set()
+    for thing_type in sorted(thing_types):
+        names.update(item['thingName'] for item in iter_things(1, thing_type))
+    return names
+
+
+class Provisioner:
+    """
+    批量创建设备
+
+    每个 SN 依次执行 create → shadow → attach 三个阶段，多个 SN 并发；
+    所有请求共享一个令牌桶，被限流或遇到暂时性错误时退避重试。
+    创建之后的阶段最终失败时删除本次创建的设备和影子，重新执行即可重试；创建失败时不回滚。
+    """
+
+    def __init__(self, certificate_id=None, workers=PROVISION_WORKERS, rate=PROVISION_RATE):
+        self.certificate_id = certificate_id or config_in.CONFIG_CERTIFICATE_ID
+        self.workers = workers
+        self._bucket = TokenBucket(rate)
+        self._existing = set()
+
+    def _call(self, fn, *args):
+        return call_with_backoff(lambda: fn(*args), bucket=self._bucket, retryable=is_retryable)
+
+    def check(self, row):
+        """检查 SN 和设备类型，返回错误信息或 None"""
+        sn_error = check_sn(row['sn'])
+        if sn_error:
+            return sn_error[1]
+        if row['device_type'] not in device_thing_types:
+            return f"未知的设备类型: {row['device_type']}"
+        if row['device_type'] not in device_types_for_sn(row['sn']):
+            return f"设备类型 {row['device_type']} 与 SN {row['sn']} 不匹配"
+        return None
+
+    def _rollback(self, sn):
+        for service, operation in (('iot-data', 'delete_thing_shadow'), ('iot', 'delete_thing')):
+            try:
+                self._call(lambda: getattr(get_client(service, 1), operation)(thingName=sn))
+            except ClientError as e:
+                if e.response['Error']['Code'] != 'ResourceNotFoundException':
+                    logger.error(f"回滚 {sn} 失败: {str(e)}")
+
+    def provision_one(self, row):
+        """
+        创建一台设备
+
+        返回:
+            dict: REPORT_COLUMNS 对应的结果
+        """
+        started = time.monotonic()
+        thing_type = device_thing_types.get(row['device_type'])
+        result = {'sn': row['sn'], 'device_type': row['device_type'], 'thing_type': thing_type,
+                  'status': 'created', 'stage': '', 'error': ''}
+        error = self.check(row)
+        if error:
+            result.update(status='invalid', error=error)
+        elif row['device_type'] == 'LMD6000':
+            # LMD6000 只支持本地操作，不在 AWS 上创建
+            result['status'] = 'skipped'
+        elif row['sn'] in self._existing:
+            result['status'] = 'exists'
+        else:
+            created = False
+            try:
+                result['stage'] = 'create'
+                self._call(create_thing, row['sn'], thing_type)
+                created = True
+                result['stage'] = 'shadow'
+                self._call(write_shadow, row['sn'], load_default_shadow(row['device_type']))
+                result['stage'] = 'attach'
+                self._call(attach_certificate, row['sn'], self.certificate_id)
+                result['stage'] = 'done'
+            except Exception as e:
+                if isinstance(e, ClientError) and e.response['Error']['Code'] == 'ResourceAlreadyExistsException':
+                    # 以其他 Thing Type 存在的设备
+                    result.update(status='exists', error=str(e))
+                else:
+                    result.update(status='failed', error=str(e))
+                # 只回滚本次创建的设备；创建失败时设备可能是别人的，不能删除
+                if created:
+                    self._rollback(row['sn'])
+        result['seconds'] = f"{time.monotonic() - started:.2f}"
+        return result
+
+    def run(self, rows, on_result=None):
+        """
+        批量创建
+
+        参数:
+            rows: load_provision_csv 返回的 SN 清单
+            on_result: 每完成一台回调一次（按 rows 的顺序），参数为结果 dict
+
+        返回:
+            list[dict]: 每个 SN 的结果
+        """
+        types = {device_thing_types[r['device_type']] for r in rows if r['device_type'] in device_thing_types}
+        self._existing = existing_things(types)
+        # 证书 ARN 只查询一次，证书不存在时直接失败
+        certificate_arn(self.certificate_id)
+
+        results = []
+        for row, result, error in run_batch(self.provision_one, rows, self.workers):
+            if error is not None:
+                result = {'sn': row['sn'], 'device_type': row['device_type'], 'status': 'failed',
+                          'error': str(error)}
+            results.append(result)
+            if on_result:
+                on_result(result)
+        return results
+
+
+def write_report(path, results):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_COLUMNS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(results)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="按 CSV 批量初始化 AWS 设备")
+    parser.add_argument('csv', help="SN 清单，表头: sn, device_type")
+    parser.add_argument('--workers', type=int, default=PROVISION_WORKERS, help="并发数")
+    parser.add_argument('--rate', type=float, default=PROVISION_RATE, help="每秒最多 AWS 请求数")
+    parser.add_argument('--report', help="结果文件，默认 <csv>.report.csv")
+    args = parser.parse_args()
+
+    rows = load_provision_csv(args.csv)
+    print(f"{len(rows)} 个 SN")
+
+    def show(result):
+        print(f"{result['sn']}\t{result['status']}\t{result.get('stage', '')}\t{result.get('error', '')}")
+
+    results = Provisioner(workers=args.workers, rate=args.rate).run(rows, show)
+    report_path = args.report or f"{args.csv}.report.csv"
+    write_report(report_path, results)
+    counts = {}
+    for result in results:
+        counts[result['status']] = counts.get(result['status'], 0) + 1
+    print(", ".join(f"{status}: {count}" for status, count in counts.items()) + f"，结果: {report_path}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+import json
+import os
+import threading
+import time
+import config_in
+from aws_clients import client_registry
+from log import logger, get_app_dir
+
+# 各软件类型在 OTA 桶中的路径
+S3_VERSION_PATHS = {
+    'LiftBennu100': 'embedded-software/LiftBennu100/',
+    'LiftPhoenix300-v2': 'embedded-software/LiftPhoenix300/',
+    'LiftPhoenix500': 'embedded-software/LiftPhoenix500/',
+    'LMD-TSS': 'lmd-tss/'
+}
+
+# 版本目录的本地缓存文件
+CATALOG_FILE = os.path.join(get_app_dir(), 's3_catalog.json')
+# 缓存超过这个时间（秒）后在后台重新列举
+CATALOG_TTL = 300
+
+
+def get_s3_client():
+    return client_registry.client('s3', 'ota', config_in.CONFIG_AWS_S3_OTA_BUCKET_REGION)
+
+
+class VersionCatalog:
+    """
+    OTA 桶中软件包的目录缓存
+
+    按前缀分页列举所有对象，把 Key/ETag/LastModified/Size 保存到本地文件。
+    缓存过期后先返回旧数据，同时在后台增量刷新；没有缓存时同步列举。
+    """
+
+    def __init__(self, path=CATALOG_FILE, ttl=CATALOG_TTL, bucket=None):
+        self.path = path
+        self.ttl = ttl
+        self.bucket = bucket or config_in.CONFIG_AWS_S3_OTA_BUCKET
+        self._prefixes = None
+        self._refreshing = set()
+        self._lock = threading.RLock()
+
+    def _load(self):
+        if self._prefixes is not None:
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self._prefixes = data if data.get('bucket') == self.bucket else {}
+            self._prefixes.pop('bucket', None)
+        except (OSError, ValueError):
+            self._prefixes = {}
+
+    def _save(self):
+        try:
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({'bucket': self.bucket, **self._prefixes}, f)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            logger.error(f"保存版本目录缓存失败: {str(e)}")
+
+    def refresh(self, prefix):
+        """
+        分页列举 prefix 下的所有对象，和缓存比较后只更新有变化的条目
+
+        返回:
+            dict: {Key: {'ETag', 'LastModified', 'Size'}}
+        """
+        objects = {}
+        paginator = get_s3_client().get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for obj in page.get('Contents', []):
+                objects[obj['Key']] = {
+                    'ETag': obj['ETag'].strip('"'),
+                    'LastModified': obj['LastModified'].isoformat(),
+                    'Size': obj['Size'],
+                }
+
+        with self._lock:
+            self._load()
+            old = self._prefixes.get(prefix, {}).get('objects', {})
+            added = objects.keys() - old.keys()
+            removed = old.keys() - objects.keys()
+            changed = [key for key in objects.keys() & old.keys() if objects[key] != old[key]]
+            self._prefixes[prefix] = {'refreshed': time.time(), 'objects': objects}
+            self._save()
+        if added or removed or changed:
+            logger.info(f"{prefix} 版本目录更新: 新增 {len(added)}，删除 {len(removed)}，变化 {len(changed)}")
+        return objects
+
+    def _refresh_in_background(self, prefix):
+        with self._lock:
+            if prefix in self._refreshing:
+                return
+            self._refreshing.add(prefix)
+
+        def run():
+            try:
+                self.refresh(prefix)
+            except Exception as e:
+                logger.error(f"刷新版本目录 {prefix} 失败: {str(e)}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(prefix)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def objects(self, prefix, force=False):
+        """返回 prefix 下的对象，缓存过期时在后台刷新"""
+        with self._lock:
+            self._load()
+            entry = self._prefixes.get(prefix)
+        if entry is None or force:
+            return self.refresh(prefix)
+        if time.time() - entry['refreshed'] > self.ttl:
+            self._refresh_in_background(prefix)
+        return entry['objects']
+
+    def listing(self, prefix, force=False):
+        """返回与 list_objects_v2 响应格式相同的 {'Contents': [...]}，包含所有分页"""
+        objects = self.objects(prefix, force)
+        return {'Contents': [{'Key': key, **info} for key, info in sorted(objects.items())]}
+
+
+version_catalog = VersionCatalog()
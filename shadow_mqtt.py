@@ -0,0 +1,254 @@
+"""
+通过 MQTT 订阅设备影子的更新，设备上报的版本与期望版本一致时立即得到通知
+
+使用程序内置的 X.509 证书连接 AWS IoT；也可以连接本地 MQTT Broker 调试:
+    python shadow_mqtt.py --endpoint 127.0.0.1 --port 1883 --no-tls -t S0001234
+"""
+import json
+import os
+import ssl
+import tempfile
+import threading
+import uuid
+import paho.mqtt.client as mqtt
+import config_in
+from log import logger
+
+MQTT_PORT = 8883
+MQTT_KEEPALIVE = 60
+# 等待连接/订阅确认的时间（秒）
+MQTT_CONNECT_TIMEOUT = 10
+
+SHADOW_TOPIC = "$aws/things/{thing}/shadow/{action}"
+
+
+def reported_version(reported):
+    return reported.get("CurrentVersion") or reported.get("app_version")
+
+
+def build_tls_context(cert=None, private_key=None, root_ca=None):
+    """
+    用证书内容（PEM 字符串）建立 TLS 上下文，默认使用 config_in 中内置的证书
+
+    异常:
+        ValueError: 没有内置证书
+    """
+    cert = cert or getattr(config_in, 'CONFIG_AWS_CERT', '')
+    private_key = private_key or getattr(config_in, 'CONFIG_AWS_PRIVATE_KEY', '')
+    root_ca = root_ca or getattr(config_in, 'CONFIG_AWS_ROOTCA', '')
+    if not (cert and private_key and root_ca):
+        raise ValueError("程序中没有内置 AWS IoT 证书")
+
+    context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH, cadata=root_ca)
+    # load_cert_chain 只接受文件路径，加载后立即删除临时文件
+    with tempfile.TemporaryDirectory() as tmp:
+        cert_path = os.path.join(tmp, 'cert.pem')
+        key_path = os.path.join(tmp, 'key.pem')
+        for path, content in ((cert_path, cert), (key_path, private_key)):
+            with open(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600), 'w') as f:
+                f.write(content)
+        context.load_cert_chain(cert_path, key_path)
+    return context
+
+
+class ShadowWatch:
+    """
+    一台设备的影子订阅状态
+
+    reported 的 CurrentVersion（或 app_version）等于目标版本时 converged 被 set。
+    目标版本默认取 desired.DesiredVersion。
+    """
+
+    def __init__(self, thing_name, target_version=None, on_update=None):
+        self.thing_name = thing_name
+        self.target_version = target_version
+        self.on_update = on_update
+        self.desired = {}
+        self.reported = {}
+        self.converged = threading.Event()
+        self._lock = threading.Lock()
+
+    @property
+    def target(self):
+        return self.target_version or self.desired.get("DesiredVersion")
+
+    @property
+    def reported_version(self):
+        return reported_version(self.reported)
+
+    def update(self, state, replace=False):
+        """合并一次影子消息中的 state（documents/get 为完整状态，accepted 为增量）"""
+        with self._lock:
+            if replace:
+                self.desired = dict(state.get('desired') or {})
+                self.reported = dict(state.get('reported') or {})
+            else:
+                self.desired.update(state.get('desired') or {})
+                self.reported.update(state.get('reported') or {})
+            target, current = self.target, self.reported_version
+        if self.on_update:
+            self.on_update(self)
+        if target and current == target:
+            self.converged.set()
+
+    def wait(self, timeout=None, cancel_event=None):
+        """
+        等待设备上报目标版本
+
+        返回:
+            bool: True 表示已一致，False 表示超时或被取消
+        """
+        if cancel_event is None:
+            return self.converged.wait(timeout)
+        remaining = timeout
+        while remaining is None or remaining > 0:
+            step = 1.0 if remaining is None else min(1.0, remaining)
+            if self.converged.wait(step):
+                return True
+            if cancel_event.is_set():
+                return False
+            if remaining is not None:
+                remaining -= step
+        return self.converged.is_set()
+
+
+class ShadowSubscriber:
+    """
+    一个 MQTT 连接上订阅多台设备的影子更新
+
+    每台设备订阅 update/documents、update/accepted 和 get/accepted，
+    订阅后立即请求一次完整影子，避免订阅前设备已经上报而错过通知。
+    断线后 paho 自动重连，并在 on_connect 中重新订阅。
+    """
+
+    def __init__(self, endpoint=None, port=MQTT_PORT, tls_context=None, use_tls=True, client_id=None):
+        self.endpoint = endpoint or config_in.CONFIG_AWS_ENDPOINT
+        self.port = port
+        self.watches = {}
+        self._connected = threading.Event()
+        self._lock = threading.Lock()
+        self.client = mqtt.Client(client_id=client_id or f"{config_in.CONFIG_PROJECT_NAME}-{uuid.uuid4().hex[:12]}",
+                                  clean_session=True, protocol=mqtt.MQTTv311)
+        if use_tls:
+            self.client.tls_set_context(tls_context or build_tls_context())
+        self.client.on_connect = self._on_connect
+        self.client.on_disconnect = self._on_disconnect
+        self.client.on_message = self._on_message
+
+    def connect(self, timeout=MQTT_CONNECT_TIMEOUT):
+        """
+        连接 Broker 并启动网络线程
+
+        异常:
+            TimeoutError: 超时未连接成功
+        """
+        self.client.connect_async(self.endpoint, self.port, MQTT_KEEPALIVE)
+        self.client.loop_start()
+        if not self._connected.wait(timeout):
+            self.close()
+            raise TimeoutError(f"连接 MQTT {self.endpoint}:{self.port} 超时")
+        return self
+
+    def close(self):
+        self.client.disconnect()
+        self.client.loop_stop()
+
+    def __enter__(self):
+        return self.connect()
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _topics(self, thing_name):
+        return [SHADOW_TOPIC.format(thing=thing_name, action=action)
+                for action in ('update/documents', 'update/accepted', 'get/accepted')]
+
+    def _subscribe(self, thing_name):
+        self.client.subscribe([(topic, 1) for topic in self._topics(thing_name)])
+        self.client.publish(SHADOW_TOPIC.format(thing=thing_name, action='get'), '{}', qos=1)
+
+    def watch(self, thing_name, target_version=None, on_update=None):
+        """
+        订阅一台设备
+
+        参数:
+            thing_name: 设备SN
+            target_version: 目标版本，为空时使用影子中的 desired.DesiredVersion
+            on_update: 每收到一次影子更新回调一次（在 MQTT 网络线程中），参数为 ShadowWatch
+
+        返回:
+            ShadowWatch
+        """
+        watch = ShadowWatch(thing_name, target_version, on_update)
+        with self._lock:
+            self.watches[thing_name] = watch
+        if self._connected.is_set():
+            self._subscribe(thing_name)
+        return watch
+
+    def unwatch(self, thing_name):
+        with self._lock:
+            self.watches.pop(thing_name, None)
+        self.client.unsubscribe(self._topics(thing_name))
+
+    def _on_connect(self, client, userdata, flags, rc):
+        if rc != 0:
+            logger.error(f"MQTT 连接被拒绝: {mqtt.connack_string(rc)}")
+            return
+        self._connected.set()
+        with self._lock:
+            names = list(self.watches)
+        for thing_name in names:
+            self._subscribe(thing_name)
+
+    def _on_disconnect(self, client, userdata, rc):
+        self._connected.clear()
+        if rc != 0:
+            logger.error(f"MQTT 连接断开 ({rc})，自动重连")
+
+    def _on_message(self, client, userdata, message):
+        parts = message.topic.split('/')
+        # $aws/things/<thing>/shadow/<update|get>/<documents|accepted>
+        if len(parts) != 6:
+            return
+        thing_name, action = parts[2], '/'.join(parts[4:])
+        with self._lock:
+            watch = self.watches.get(thing_name)
+        if watch is None:
+            return
+        try:
+            payload = json.loads(message.payload)
+        except ValueError:
+            logger.error(f"无法解析 {message.topic} 的消息")
+            return
+        if action == 'update/documents':
+            watch.update(payload.get('current', {}).get('state', {}), replace=True)
+        elif action == 'get/accepted':
+            watch.update(payload.get('state', {}), replace=True)
+        else:
+            watch.update(payload.get('state', {}))
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="订阅设备影子，等待设备上报目标版本")
+    parser.add_argument('-t', '--thing', required=True, nargs='+', help="设备SN")
+    parser.add_argument('-v', '--version', help="目标版本，默认取 desired.DesiredVersion")
+    parser.add_argument('--endpoint', help="MQTT Broker 地址，默认 CONFIG_AWS_ENDPOINT")
+    parser.add_argument('--port', type=int, default=MQTT_PORT)
+    parser.add_argument('--no-tls', action='store_true', help="不使用 TLS（连接本地 Broker 调试）")
+    parser.add_argument('--timeout', type=float, default=600, help="最长等待时间（秒）")
+    args = parser.parse_args()
+
+    def show(watch):
+        print(f"{watch.thing_name}: reported {watch.reported_version}, target {watch.target}")
+
+    with ShadowSubscriber(args.endpoint, args.port, use_tls=not args.no_tls) as subscriber:
+        watches = [subscriber.watch(thing, args.version, show) for thing in args.thing]
+        for watch in watches:
+            ok = watch.wait(args.timeout)
+            print(f"{watch.thing_name}: {'已上报目标版本' if ok else '超时'}")
+
+
+if __name__ == '__main__':
+    main()
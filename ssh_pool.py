@@ -0,0 +1,225 @@
+import threading
+import paramiko
+from log import logger
+
+# SSH 保活间隔（秒），蜂窝网络下 NAT 表项很容易过期
+KEEPALIVE_INTERVAL = 15
+
+# 传输参数配置
+#   window_size / max_packet_size: SSH 通道的流控窗口和最大包大小，窗口越大，高延迟链路上同时在途的数据越多
+#   ciphers: 优先使用的加密算法（设备不支持的会被忽略），为空时使用 paramiko 默认顺序
+#   compress: 是否开启 zlib 压缩，只对带宽很低的链路有用
+#   chunk_size: 上传时每次写入的块大小
+#   prefetch_requests: 下载时同时在途的读请求数，为空时不限制
+TRANSFER_PROFILES = {
+    'default': {
+        'window_size': paramiko.common.DEFAULT_WINDOW_SIZE,
+        'max_packet_size': paramiko.common.DEFAULT_MAX_PACKET_SIZE,
+        'ciphers': None,
+        'compress': False,
+        'chunk_size': 32 * 1024,
+        'prefetch_requests': None,
+    },
+    'lan': {
+        'window_size': 4 * 1024 * 1024,
+        'max_packet_size': 32 * 1024,
+        'ciphers': ('aes128-gcm@openssh.com', 'aes128-ctr'),
+        'compress': False,
+        'chunk_size': 256 * 1024,
+        'prefetch_requests': 64,
+    },
+    'wan': {
+        'window_size': 16 * 1024 * 1024,
+        'max_packet_size': 32 * 1024,
+        'ciphers': ('aes128-gcm@openssh.com', 'aes128-ctr'),
+        'compress': False,
+        'chunk_size': 256 * 1024,
+        'prefetch_requests': 256,
+    },
+    'slow': {
+        'window_size': 16 * 1024 * 1024,
+        'max_packet_size': 32 * 1024,
+        'ciphers': ('aes128-ctr',),
+        'compress': True,
+        'chunk_size': 256 * 1024,
+        'prefetch_requests': 256,
+    },
+}
+
+
+class SSHSession:
+    """
+    单个设备的持久 SSH 会话
+
+    复用同一个 paramiko Transport 并开启 keepalive；
+    检测到 Transport 失效时，在下一次 exec_command / open_sftp 时自动重连。
+    对外提供与 paramiko.SSHClient 相同的 exec_command / open_sftp / get_transport / close 接口，
+    所以可以直接放进 DMSWindow.ssh['client'] 使用。
+    """
+
+    def __init__(self, host, username, password, port=22, timeout=5, profile='default'):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self.profile_name = profile
+        self.profile = TRANSFER_PROFILES[profile]
+        self._client = None
+        self._sftp = None
+        self._lock = threading.RLock()
+
+    def connect(self):
+        """（重新）建立连接，旧的连接和 SFTP 会被关闭"""
+        with self._lock:
+            self._close_unlocked()
+            client = paramiko.SSHClient()
+            client.set_missing_host_key_policy(paramiko.AutoAddPolicy())  # 自动添加主机密钥
+            client.connect(self.host, port=self.port, username=self.username,
+                           password=self.password, timeout=self.timeout,
+                           compress=self.profile['compress'], transport_factory=self._make_transport)
+            client.get_transport().set_keepalive(KEEPALIVE_INTERVAL)
+            self._client = client
+            return client
+
+    def _make_transport(self, sock, **kwargs):
+        """按传输参数配置创建 Transport"""
+        transport = paramiko.Transport(sock, default_window_size=self.profile['window_size'],
+                                       default_max_packet_size=self.profile['max_packet_size'], **kwargs)
+        if self.profile['ciphers']:
+            options = transport.get_security_options()
+            preferred = [c for c in self.profile['ciphers'] if c in options.ciphers]
+            options.ciphers = preferred + [c for c in options.ciphers if c not in preferred]
+        return transport
+
+    def is_alive(self):
+        """Transport 是否仍然可用"""
+        transport = self._client.get_transport() if self._client else None
+        return transport is not None and transport.is_active()
+
+    def ensure(self):
+        """返回可用的 SSHClient，连接已断开时自动重连"""
+        with self._lock:
+            if not self.is_alive():
+                if self._client is not None:
+                    logger.error(f"{self.host} SSH 连接已断开，正在重连")
+                self.connect()
+            return self._client
+
+    def exec_command(self, command, bufsize=-1, timeout=None, get_pty=False, environment=None):
+        """
+        执行远程命令，参数和返回值与 paramiko.SSHClient.exec_command 相同
+
+        只在命令肯定没有在设备上执行时重连后重试一次：打开通道失败，或者连接仍然正常、设备拒绝了执行请求。
+        执行请求发出后连接断开的，命令可能已经开始执行，不重试，直接抛出异常。
+        """
+        try:
+            channel = self.ensure().get_transport().open_session(timeout=timeout)
+        except (paramiko.SSHException, EOFError, OSError) as e:
+            logger.error(f"{self.host} 打开通道失败，重连后重试: {str(e)}")
+            channel = self._reopen_session(timeout)
+        try:
+            return self._exec(channel, command, bufsize, timeout, get_pty, environment)
+        except paramiko.SSHException as e:
+            if not channel.get_transport().is_active():
+                raise
+            logger.error(f"{self.host} 执行请求被拒绝，重连后重试: {str(e)}")
+            channel.close()
+            channel = self._reopen_session(timeout)
+            return self._exec(channel, command, bufsize, timeout, get_pty, environment)
+
+    def _reopen_session(self, timeout):
+        with self._lock:
+            client = self.connect()
+        return client.get_transport().open_session(timeout=timeout)
+
+    @staticmethod
+    def _exec(channel, command, bufsize, timeout, get_pty, environment):
+        if get_pty:
+            channel.get_pty()
+        channel.settimeout(timeout)
+        if environment:
+            channel.update_environment(environment)
+        channel.exec_command(command)
+        return (channel.makefile_stdin('wb', bufsize), channel.makefile('r', bufsize),
+                channel.makefile_stderr('r', bufsize))
+
+    def open_sftp(self):
+        """返回缓存的 SFTP 会话，调用方不需要也不应该关闭它"""
+        with self._lock:
+            client = self.ensure()
+            channel = self._sftp.get_channel() if self._sftp else None
+            if channel is None or channel.closed:
+                self._sftp = client.open_sftp()
+            return self._sftp
+
+    def get_transport(self):
+        return self.ensure().get_transport()
+
+    def close(self):
+        with self._lock:
+            self._close_unlocked()
+
+    def _close_unlocked(self):
+        if self._sftp:
+            try:
+                self._sftp.close()
+            except Exception:
+                pass
+            self._sftp = None
+        if self._client:
+            self._client.close()
+            self._client = None
+
+
+class SSHSessionPool:
+    """按设备 IP 缓存 SSHSession，线程安全"""
+
+    def __init__(self):
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def connect(self, host, username, password, **kwargs):
+        """
+        获取指定 IP 的会话，必要时建立连接
+
+        参数:
+            host: 设备 IP
+            username / password: SSH 登录凭据，变化时会重建会话
+            profile: TRANSFER_PROFILES 中的传输参数配置，变化时会重建会话
+
+        返回:
+            SSHSession: 已连接的会话
+        """
+        with self._lock:
+            session = self._sessions.get(host)
+            profile = kwargs.get('profile', 'default')
+            if session is None or (session.username, session.password, session.profile_name) != \
+                    (username, password, profile):
+                if session is not None:
+                    session.close()
+                session = SSHSession(host, username, password, **kwargs)
+                self._sessions[host] = session
+        session.ensure()
+        return session
+
+    def get(self, host):
+        with self._lock:
+            return self._sessions.get(host)
+
+    def close(self, host):
+        with self._lock:
+            session = self._sessions.pop(host, None)
+        if session:
+            session.close()
+
+    def close_all(self):
+        with self._lock:
+            sessions = list(self._sessions.values())
+            self._sessions.clear()
+        for session in sessions:
+            session.close()
+
+
+# 进程内共享的会话池
+session_pool = SSHSessionPool()
@@ -0,0 +1,167 @@
+import re
+import time
+from collections import deque
+from log import logger
+
+# 每个输出流只保留最后这么多行，防止输出很多的脚本占满内存
+STREAM_TAIL_LINES = 500
+# 单行超过这个长度（字节）时直接截断输出，防止没有换行的输出无限增长
+STREAM_MAX_LINE = 64 * 1024
+# 没有数据时的轮询间隔（秒）
+STREAM_POLL_INTERVAL = 0.05
+# 每次从通道读取的字节数
+STREAM_CHUNK_SIZE = 32 * 1024
+# 命令前先输出远端 shell 的进程号和进程组号，取消或超时时用来终止整个进程组
+_PGID_MARKER = '__dms_pgid__'
+_PGID_PREFIX = f"echo {_PGID_MARKER} $$ $(cut -d' ' -f5 /proc/$$/stat); "
+
+
+class CommandCancelled(Exception):
+    """命令被用户取消"""
+
+
+class CommandTimeout(Exception):
+    """命令超过截止时间或长时间没有输出"""
+
+
+class _LineBuffer:
+    """把收到的字节拆成行，只保留最后 tail_lines 行"""
+
+    def __init__(self, name, on_line, tail_lines, marker=None):
+        self.name = name
+        self.on_line = on_line
+        self.tail = deque(maxlen=tail_lines)
+        self.pending = b''
+        # 第一行以 marker 开头时不输出，其余部分保存在 marked 中
+        self.marker = marker
+        self.marked = None
+
+    def feed(self, data):
+        self.pending += data
+        *lines, self.pending = self.pending.split(b'\n')
+        for line in lines:
+            self._emit(line)
+        if len(self.pending) > STREAM_MAX_LINE:
+            self._emit(self.pending)
+            self.pending = b''
+
+    def flush(self):
+        if self.pending:
+            self._emit(self.pending)
+            self.pending = b''
+
+    def _emit(self, raw):
+        line = raw.decode(errors='replace').rstrip('\r')
+        if self.marker is not None:
+            marker, self.marker = self.marker, None
+            if line.startswith(marker):
+                self.marked = line[len(marker):].strip()
+                return
+        self.tail.append(line)
+        if self.on_line:
+            self.on_line(self.name, line)
+
+    def text(self):
+        return "\n".join(self.tail).strip()
+
+
+def stream_exec(ssh_client, command, on_line=None, timeout=None, idle_timeout=None, cancel_event=None,
+                tail_lines=STREAM_TAIL_LINES, stdin_file=None, stdin_callback=None):
+    """
+    执行远程命令，同时读取 stdout 和 stderr，每收到一行就回调一次
+
+    stdout/stderr 交替读取，不会因为一个流写满通道窗口而卡住命令。
+    取消或超时时向远端命令的整个进程组发送 SIGTERM：没有 pty 的通道关闭后远端进程不会收到 SIGHUP，
+    不终止的话 install.sh 之类的脚本会继续在设备上运行。
+
+    参数:
+        ssh_client: {'client': SSHSession}
+        command: 要执行的命令
+        on_line: 行回调 on_line(stream, line)，stream 为 'stdout' 或 'stderr'
+        timeout: 命令总的截止时间（秒），为空时不限制
+        idle_timeout: 连续没有输出的最长时间（秒），为空时不限制
+        cancel_event: threading.Event，被 set 后终止命令
+        tail_lines: 每个流保留的最后行数
+        stdin_file: 以二进制方式打开的文件，内容会边读边写入命令的 stdin，写完后关闭 stdin
+        stdin_callback: 已写入 stdin 的字节数回调
+
+    返回:
+        tuple: (exit_code, stdout 最后若干行, stderr 最后若干行)
+
+    异常:
+        CommandCancelled: cancel_event 被 set
+        CommandTimeout: 超过 timeout 或 idle_timeout
+    """
+    stdin, stdout, stderr = ssh_client['client'].exec_command(_PGID_PREFIX + command)
+    channel = stdout.channel
+    out = _LineBuffer('stdout', on_line, tail_lines, marker=_PGID_MARKER)
+    err = _LineBuffer('stderr', on_line, tail_lines)
+    start = last_data = time.monotonic()
+    pending = b''
+    sent = 0
+    try:
+        while True:
+            received = False
+            if stdin_file is not None and channel.exit_status_ready():
+                # 命令已经结束（如中途出错），剩余的输入不再发送
+                stdin_file = None
+            if stdin_file is not None and channel.send_ready():
+                pending = pending or stdin_file.read(STREAM_CHUNK_SIZE)
+                if pending:
+                    n = channel.send(pending)
+                    pending = pending[n:]
+                    sent += n
+                    if stdin_callback:
+                        stdin_callback(sent)
+                else:
+                    channel.shutdown_write()
+                    stdin_file = None
+                received = True
+            if channel.recv_ready():
+                out.feed(channel.recv(STREAM_CHUNK_SIZE))
+                received = True
+            if channel.recv_stderr_ready():
+                err.feed(channel.recv_stderr(STREAM_CHUNK_SIZE))
+                received = True
+            if not received and channel.exit_status_ready() \
+                    and not channel.recv_ready() and not channel.recv_stderr_ready():
+                break
+
+            now = time.monotonic()
+            if received:
+                last_data = now
+            if cancel_event is not None and cancel_event.is_set():
+                raise CommandCancelled(f"命令已取消: {command.strip()[:80]}")
+            if timeout is not None and now - start > timeout:
+                raise CommandTimeout(f"命令超过 {timeout}s 未完成")
+            if idle_timeout is not None and now - last_data > idle_timeout:
+                raise CommandTimeout(f"命令 {idle_timeout}s 没有输出")
+            if not received:
+                time.sleep(STREAM_POLL_INTERVAL)
+
+        out.flush()
+        err.flush()
+        return channel.recv_exit_status(), out.text(), err.text()
+    except (CommandCancelled, CommandTimeout) as e:
+        logger.warning(str(e))
+        _kill_process_group(ssh_client, out.marked)
+        channel.close()
+        raise
+    finally:
+        for stream in [stdin, stdout, stderr]:
+            stream.close()
+
+
+def _kill_process_group(ssh_client, marked):
+    """终止远端命令的进程组，marked 为 stream_exec 命令前输出的进程号和进程组号"""
+    match = re.fullmatch(r'(\d+) (\d+)', marked or '')
+    # 只有 shell 自己是进程组组长（sshd 为每个会话调用 setsid）时才终止，避免误杀同组的其他进程
+    if not match or match.group(1) != match.group(2):
+        logger.warning(f"未取得远端进程组号 ({marked})，命令可能仍在设备上运行")
+        return
+    pgid = match.group(2)
+    try:
+        _, stdout, _ = ssh_client['client'].exec_command(f"kill -TERM -{pgid}")
+        stdout.channel.recv_exit_status()
+    except Exception as e:
+        logger.error(f"终止远端进程组 {pgid} 失败: {str(e)}")
@@ -0,0 +1,161 @@
+import json
+import os
+import re
+import threading
+import time
+import config_in
+from log import logger, get_app_dir
+
+# 每台设备一个断点文件，记录已完成的步骤
+CHECKPOINT_DIR = os.path.join(get_app_dir(), 'checkpoints')
+# 超过这个时间（秒）的断点不再续跑，从头开始
+CHECKPOINT_MAX_AGE = getattr(config_in, 'CONFIG_CHECKPOINT_MAX_AGE', 24 * 3600)
+# 每次执行的各步骤耗时，一行一条 JSON
+STEP_TIMINGS_LOG = os.path.join(get_app_dir(), 'step_timings.jsonl')
+
+_timings_lock = threading.Lock()
+
+
+def package_key(path):
+    """软件包在流程标识中的表示：文件名加修改时间，同名软件包重新打包后不会续跑旧的断点"""
+    try:
+        return f"{os.path.basename(path)}:{int(os.path.getmtime(path))}"
+    except OSError:
+        return os.path.basename(path)
+
+
+class Step:
+    """
+    流程中的一步
+
+    run(ctx) 返回 False 表示已经提示过用户、流程到此停止；抛出异常表示失败。
+    每一步都应当可以重复执行。always=True 的步骤（如连接/探测）每次都执行，不记录断点。
+    """
+
+    def __init__(self, name, run, label='', always=False):
+        self.name = name
+        self.run = run
+        self.label = label
+        self.always = always
+
+
+class Checkpoint:
+    """一台设备在某个流程中已完成的步骤及其耗时，保存为 JSON 文件"""
+
+    def __init__(self, device, workflow, directory=CHECKPOINT_DIR):
+        self.path = os.path.join(directory, re.sub(r'[^\w.-]', '_', device) + '.json')
+        self.workflow = workflow
+        self.completed = {}
+        self.failed = None
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return
+        # 流程参数（模式、软件、软件包）变了或断点太旧时从头开始
+        if data.get('workflow') != self.workflow or time.time() - data.get('updated', 0) > CHECKPOINT_MAX_AGE:
+            return
+        self.completed = dict(data.get('completed', {}))
+        self.failed = data.get('failed')
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'workflow': self.workflow, 'completed': self.completed, 'failed': self.failed,
+                       'updated': time.time()}, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class StepRunner:
+    """
+    按顺序执行步骤，每完成一步写一次断点；再次执行同一设备的同一流程时跳过已完成的步骤
+
+    ctx 在步骤之间传递状态，第一个需要记录断点的步骤开始前 ctx['sn'] 必须已知。
+    续跑时 ctx['retry_step'] 为上次失败的步骤名，步骤可以据此放宽"资源已存在"之类的检查。
+    """
+
+    def __init__(self, workflow, steps, report=None):
+        """
+        参数:
+            workflow: 流程标识，如 "OTA:LiftPhoenix400:Local"，不同标识的断点互不通用
+            steps: Step 列表
+            report: report(步骤名, 说明) 状态回调
+        """
+        self.workflow = workflow
+        self.steps = steps
+        self.report = report
+        self.timings = {}
+
+    def run(self, ctx):
+        """
+        返回:
+            bool: True 表示全部完成，False 表示某一步返回 False
+
+        异常:
+            步骤抛出的异常，失败的步骤会记录在断点中
+        """
+        checkpoint = None
+        self.timings = {}
+        status, failed = 'stopped', None
+        try:
+            for step in self.steps:
+                if not step.always:
+                    if checkpoint is None:
+                        checkpoint = Checkpoint(ctx['sn'], self.workflow)
+                        ctx['retry_step'] = checkpoint.failed
+                        if checkpoint.completed and self.report:
+                            self.report('resume', f"跳过已完成的步骤: {', '.join(checkpoint.completed)}")
+                    if step.name in checkpoint.completed:
+                        continue
+                if self.report:
+                    self.report(step.name, step.label)
+                started = time.monotonic()
+                try:
+                    ok = step.run(ctx)
+                except Exception:
+                    failed = step.name
+                    raise
+                finally:
+                    self.timings[step.name] = round(time.monotonic() - started, 2)
+                if ok is False:
+                    break
+                if not step.always:
+                    checkpoint.completed[step.name] = self.timings[step.name]
+                    checkpoint.failed = None
+                    checkpoint.save()
+            else:
+                status = 'done'
+        except Exception:
+            status = 'failed'
+            raise
+        finally:
+            if checkpoint is not None:
+                if status == 'done':
+                    checkpoint.clear()
+                else:
+                    checkpoint.failed = failed
+                    checkpoint.save()
+            self._record(ctx.get('sn'), status, failed)
+        return status == 'done'
+
+    def _record(self, sn, status, failed):
+        total = sum(self.timings.values())
+        logger.info(f"{sn} {self.workflow} {status}，耗时 {total:.1f}s: "
+                    + ", ".join(f"{name} {seconds:.1f}s" for name, seconds in self.timings.items()))
+        record = {'time': time.time(), 'sn': sn, 'workflow': self.workflow, 'status': status,
+                  'failed': failed, 'steps': self.timings, 'total': round(total, 2)}
+        try:
+            with _timings_lock, open(STEP_TIMINGS_LOG, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        except OSError as e:
+            logger.error(f"无法写入步骤耗时: {str(e)}")
@@ -0,0 +1,149 @@
+import json
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QLineEdit, QComboBox
+from PyQt5.QtWidgets import QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox
+from PyQt5.QtGui import QFont
+from aws_tool import iter_thing_pages
+from worker import run_async
+
+# AWS 上使用的 Thing Type，空字符串表示全部
+THING_TYPES = ["", "LMDC-TSB", "lbb300", "LBB400", "LMD-TSS"]
+
+
+def next_page(pages):
+    """取生成器的下一页，没有更多时返回 None"""
+    return next(pages, None)
+
+
+class ThingPickerDialog(QDialog):
+    """按类型/属性在 AWS 上列出设备并选择一个，每次只拉取一页"""
+
+    COLUMNS = ["设备名", "类型", "属性"]
+
+    def __init__(self, thing_type=None, parent=None):
+        super().__init__(parent)
+        self.things = []
+        self.selected_thing = None
+        self.loading = False
+        self._pages = None
+        self._setup_ui(thing_type)
+        self._reload()
+
+    def _setup_ui(self, thing_type):
+        font = QFont('Arial', 12)
+        self.setWindowTitle("选择设备")
+        self.resize(700, 500)
+
+        layout = QVBoxLayout()
+
+        filter_layout = QHBoxLayout()
+        self.type_combo = QComboBox()
+        self.type_combo.setFont(font)
+        self.type_combo.addItems(THING_TYPES)
+        if thing_type in THING_TYPES:
+            self.type_combo.setCurrentText(thing_type)
+        self.attribute_edit = QLineEdit()
+        self.attribute_edit.setFont(font)
+        self.attribute_edit.setPlaceholderText("属性名=值")
+        self.query_btn = QPushButton("查询")
+        self.query_btn.setFont(font)
+        self.query_btn.clicked.connect(self._reload)
+        filter_layout.addWidget(QLabel("类型:"))
+        filter_layout.addWidget(self.type_combo)
+        filter_layout.addWidget(QLabel("属性:"))
+        filter_layout.addWidget(self.attribute_edit, stretch=1)
+        filter_layout.addWidget(self.query_btn)
+        layout.addLayout(filter_layout)
+
+        self.name_edit = QLineEdit()
+        self.name_edit.setFont(font)
+        self.name_edit.setPlaceholderText("在已加载的设备中按名称筛选")
+        self.name_edit.textChanged.connect(self._apply_name_filter)
+        layout.addWidget(self.name_edit)
+
+        self.table = QTableWidget(0, len(self.COLUMNS))
+        self.table.setHorizontalHeaderLabels(self.COLUMNS)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableWidget.SelectRows)
+        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.doubleClicked.connect(self._select)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.count_label = QLabel("")
+        self.count_label.setFont(font)
+        self.more_btn = QPushButton("加载更多")
+        self.more_btn.setFont(font)
+        self.more_btn.clicked.connect(self._load_more)
+        self.select_btn = QPushButton("选择")
+        self.select_btn.setFont(font)
+        self.select_btn.clicked.connect(self._select)
+        button_layout.addWidget(self.count_label, stretch=1)
+        button_layout.addWidget(self.more_btn)
+        button_layout.addWidget(self.select_btn)
+        layout.addLayout(button_layout)
+
+        self.setLayout(layout)
+
+    def _reload(self):
+        if self.loading:
+            return
+        attribute_name, _, attribute_value = self.attribute_edit.text().strip().partition('=')
+        self._pages = iter_thing_pages(1, self.type_combo.currentText() or None,
+                                       attribute_name.strip() or None, attribute_value.strip() or None)
+        self.things = []
+        self.table.setRowCount(0)
+        self._load_more()
+
+    def _load_more(self):
+        if self.loading or self._pages is None:
+            return
+        self.loading = True
+        self.query_btn.setEnabled(False)
+        self.more_btn.setEnabled(False)
+        self.count_label.setText(f"已加载 {len(self.things)} 台，加载中...")
+        # 生成器每次只在一个后台任务中前进一页
+        run_async(next_page, self._pages,
+                  on_result=self._add_page, on_error=self._on_error, on_finished=self._on_finished)
+
+    def _add_page(self, page):
+        if page is None:
+            self._pages = None
+            return
+        for thing in page:
+            self.things.append(thing)
+            row = self.table.rowCount()
+            self.table.insertRow(row)
+            values = [thing['thingName'], thing.get('thingTypeName', ''),
+                      json.dumps(thing.get('attributes', {}), ensure_ascii=False)]
+            for column, value in enumerate(values):
+                self.table.setItem(row, column, QTableWidgetItem(value))
+        self._apply_name_filter(self.name_edit.text())
+
+    def _apply_name_filter(self, text):
+        text = text.strip().lower()
+        for row, thing in enumerate(self.things):
+            self.table.setRowHidden(row, bool(text) and text not in thing['thingName'].lower())
+
+    def _on_error(self, err):
+        exctype, value, tb = err
+        self._pages = None
+        QMessageBox.critical(self, "错误", f"获取设备列表失败: {value}")
+
+    def _on_finished(self):
+        self.loading = False
+        self.query_btn.setEnabled(True)
+        self.more_btn.setEnabled(self._pages is not None)
+        self.count_label.setText(f"已加载 {len(self.things)} 台" + ("" if self._pages else "（全部）"))
+
+    def _select(self):
+        row = self.table.currentRow()
+        if row < 0 or self.table.isRowHidden(row):
+            return
+        self.selected_thing = self.things[row]['thingName']
+        self.accept()
+
+    def reject(self):
+        # 加载中不允许关闭窗口，避免回调访问已销毁的控件
+        if not self.loading:
+            super().reject()
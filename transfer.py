@@ -0,0 +1,173 @@
+import hashlib
+import os
+import shlex
+import time
+import paramiko
+from ssh_stream import stream_exec
+from log import logger
+
+# 每次写入远端的块大小（会话的传输参数配置中没有指定时使用）
+UPLOAD_CHUNK_SIZE = 256 * 1024
+# 连接中断后续传的最大次数
+UPLOAD_RETRIES = 5
+# 计算速度时的统计窗口（秒）
+RATE_WINDOW = 3.0
+# 状态回调的最小间隔（秒）
+STATUS_INTERVAL = 0.5
+
+
+class ChecksumMismatch(Exception):
+    """设备上文件的 SHA-256 与本地不一致"""
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """计算本地文件的 SHA-256"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def remote_sha256(ssh, remote_path):
+    """计算设备上文件的 SHA-256，文件不存在时返回 None"""
+    exit_code, output, error = stream_exec(ssh, f"sha256sum {shlex.quote(remote_path)}", timeout=300)
+    if exit_code != 0 or not output:
+        return None
+    return output.split()[0]
+
+
+def format_rate(bytes_per_sec, eta):
+    """把速度和剩余时间格式化成 "1.2 MB/s 剩余 00:35" """
+    rate = bytes_per_sec
+    for unit in ('B/s', 'KB/s', 'MB/s'):
+        if rate < 1024 or unit == 'MB/s':
+            break
+        rate /= 1024
+    if eta is None:
+        return f"{rate:.1f} {unit}"
+    minutes, seconds = divmod(int(eta), 60)
+    return f"{rate:.1f} {unit} 剩余 {minutes:02d}:{seconds:02d}"
+
+
+class TransferProgress:
+    """统计已传输字节数，计算最近一段时间的速度和剩余时间"""
+
+    def __init__(self, total, progress_callback=None, status_callback=None):
+        self.total = total
+        self.progress_callback = progress_callback
+        self.status_callback = status_callback
+        self.samples = []
+        self.last_percent = -1
+        self.last_status = 0.0
+
+    def update(self, done):
+        now = time.monotonic()
+        self.samples.append((now, done))
+        while len(self.samples) > 2 and now - self.samples[0][0] > RATE_WINDOW:
+            self.samples.pop(0)
+
+        percent = int(done * 100 / self.total) if self.total else 100
+        if self.progress_callback and percent != self.last_percent:
+            self.last_percent = percent
+            self.progress_callback(percent)
+
+        if self.status_callback and (now - self.last_status >= STATUS_INTERVAL or done >= self.total):
+            self.last_status = now
+            self.status_callback(format_rate(*self.rate()))
+
+    def rate(self):
+        """返回 (字节/秒, 剩余秒数)，样本不足时剩余时间为 None"""
+        (t0, d0), (t1, d1) = self.samples[0], self.samples[-1]
+        if t1 <= t0:
+            return 0.0, None
+        bytes_per_sec = (d1 - d0) / (t1 - t0)
+        eta = (self.total - d1) / bytes_per_sec if bytes_per_sec > 0 else None
+        return bytes_per_sec, eta
+
+
+def _remote_size(sftp, remote_path):
+    try:
+        return sftp.stat(remote_path).st_size
+    except IOError:
+        return 0
+
+
+def _send_from(ssh, local_path, remote_path, offset, progress):
+    """从 offset 处开始把本地文件追加到远端文件"""
+    chunk_size = getattr(ssh['client'], 'profile', {}).get('chunk_size', UPLOAD_CHUNK_SIZE)
+    sftp = ssh['client'].open_sftp()
+    mode = 'ab' if offset else 'wb'
+    with open(local_path, 'rb') as local_file, sftp.open(remote_path, mode) as remote_file:
+        # 不等待每个写请求的确认，减少往返等待
+        remote_file.set_pipelined(True)
+        local_file.seek(offset)
+        done = offset
+        for chunk in iter(lambda: local_file.read(chunk_size), b''):
+            remote_file.write(chunk)
+            done += len(chunk)
+            progress.update(done)
+
+
+def download(ssh, remote_path, local_path, callback=None):
+    """按会话的传输参数配置并发预读下载文件"""
+    prefetch_requests = getattr(ssh['client'], 'profile', {}).get('prefetch_requests')
+    ssh['client'].open_sftp().get(remote_path, local_path, callback=callback,
+                                  max_concurrent_prefetch_requests=prefetch_requests)
+
+
+def upload_resumable(ssh, local_path, remote_path, progress_callback=None, status_callback=None,
+                     local_sha256=None):
+    """
+    分块上传文件，中断后从远端已有的大小处续传，完成后在设备上校验 SHA-256
+
+    参数:
+        ssh: {'client': SSHSession}
+        local_path: 本地文件路径
+        remote_path: 设备上的目标路径
+        progress_callback: 进度百分比回调
+        status_callback: 速度/剩余时间文本回调
+        local_sha256: 本地文件的 SHA-256，为空时现场计算
+
+    返回:
+        str: 文件的 SHA-256
+
+    异常:
+        ChecksumMismatch: 重新完整上传后校验仍不一致
+    """
+    total = os.path.getsize(local_path)
+    local_sha256 = local_sha256 or file_sha256(local_path)
+    progress = TransferProgress(total, progress_callback, status_callback)
+
+    for full_retry in (False, True):
+        attempt = 0
+        while True:
+            try:
+                offset = _remote_size(ssh['client'].open_sftp(), remote_path)
+                if offset > total:
+                    # 远端文件比本地大，肯定不是同一个文件的一部分
+                    offset = 0
+                if offset:
+                    logger.info(f"{remote_path} 已存在 {offset}/{total} 字节，继续上传")
+                # 续传时重新统计速度
+                progress.samples.clear()
+                progress.update(offset)
+                if offset < total or total == 0:
+                    _send_from(ssh, local_path, remote_path, offset, progress)
+                break
+            except (paramiko.SSHException, EOFError, OSError) as e:
+                attempt += 1
+                if attempt > UPLOAD_RETRIES:
+                    raise
+                logger.error(f"上传中断（第 {attempt} 次），稍后续传: {str(e)}")
+                time.sleep(min(2 ** attempt, 30))
+
+        if remote_sha256(ssh, remote_path) == local_sha256:
+            return local_sha256
+        if full_retry:
+            break
+        # 续传的部分文件可能来自其他版本，删除后完整上传一次
+        logger.error(f"{remote_path} SHA-256 校验失败，重新完整上传")
+        ssh['client'].open_sftp().remove(remote_path)
+
+    raise ChecksumMismatch(f"{os.path.basename(local_path)} 上传后 SHA-256 校验失败")
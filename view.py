@@ -1,8 +1,15 @@
 from PyQt5.QtWidgets import QMainWindow, QLabel, QVBoxLayout, QWidget, QLineEdit, QHBoxLayout, QPushButton, QComboBox, QScrollArea, QSizePolicy
+from PyQt5.QtWidgets import QProgressBar
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QFont, QPalette, QColor
 from fun import try_connect, try_close, populate_ip_addresses, match_sn, update_st_type_combo, switch_mode_buttons
 from fun import update_upload_ui, get_software_version, browse_file, show_download_dialog, start_to_softwar, sn_reset
+from fun import run_task, cancel_running_commands
+from console_win import ConsoleWidget
+from ssh_pool import session_pool
+from fleet_win import FleetDialog
+from mirror_win import MirrorDialog
+from discovery_win import DevicePickerDialog
 
 
 class DMSWindow(QMainWindow):
@@ -39,6 +46,17 @@ class DMSWindow(QMainWindow):
             'upload_label_combo_flag': False
         }
 
+    def closeEvent(self, event):
+        # 退出时关闭所有缓存的 SSH 会话
+        session_pool.close_all()
+        super().closeEvent(event)
+
+    def pick_device(self):
+        """扫描局域网设备，选中后填入设备IP"""
+        dialog = DevicePickerDialog(self.local_combo.currentText(), self)
+        if dialog.exec_() and dialog.selected_device:
+            self.device_input.setText(dialog.selected_device['ip'])
+
     def creatview(self):
         # 设置字体为Arial，大小为15
         font = QFont('Arial', 18)
@@ -146,6 +164,14 @@ class DMSWindow(QMainWindow):
         self.device_input.setMinimumSize(150, 40)
         self.first_layout.addWidget(self.device_input, stretch=1)  # 可伸缩
 
+        # 扫描局域网设备
+        self.scan_btn = QPushButton('Scan')
+        self.scan_btn.setFont(font)
+        self.scan_btn.setFixedSize(100, 40)
+        self.scan_btn.setStyleSheet(button_style)
+        self.scan_btn.clicked.connect(self.pick_device)
+        self.first_layout.addWidget(self.scan_btn)
+
         # 直接添加按钮
         self.connet_btn = QPushButton('Connect')
         self.connet_btn.setFont(font)
@@ -160,8 +186,24 @@ class DMSWindow(QMainWindow):
         self.colse_btn.setStyleSheet(button_style)
         self.first_layout.addWidget(self.colse_btn)
 
+        # 批量操作按钮
+        self.fleet_btn = QPushButton('Fleet')
+        self.fleet_btn.setFont(font)
+        self.fleet_btn.setFixedSize(100, 40)
+        self.fleet_btn.setStyleSheet(button_style)
+        self.fleet_btn.clicked.connect(lambda: FleetDialog(self).exec_())
+        self.first_layout.addWidget(self.fleet_btn)
+
+        self.mirror_btn = QPushButton('Mirror')
+        self.mirror_btn.setFont(font)
+        self.mirror_btn.setFixedSize(100, 40)
+        self.mirror_btn.setStyleSheet(button_style)
+        self.mirror_btn.clicked.connect(lambda: MirrorDialog(self).exec_())
+        self.first_layout.addWidget(self.mirror_btn)
+
         # 连接按钮点击事件
-        self.connet_btn.clicked.connect(lambda: try_connect(self.ssh, self.close_falg, self.sn, self.ui_components))
+        self.connet_btn.clicked.connect(
+            lambda: run_task(self.ui_components, try_connect, self.ssh, self.close_falg, self.sn, self.ui_components))
         # 断开按钮点击事件
         self.colse_btn.clicked.connect(lambda: try_close(self.ssh, self.close_falg, self.mode_value, self.ui_components))
 
@@ -359,7 +401,7 @@ class DMSWindow(QMainWindow):
         self.get_version_but.setEnabled(False)
         self.get_version_but.setStyleSheet(button_style)
         self.get_version_but.clicked.connect(
-            lambda: get_software_version(self.mode_value, self.ssh, self.sn, self.ui_components))
+            lambda: run_task(self.ui_components, get_software_version, self.mode_value, self.ssh, self.sn, self.ui_components))
         self.fifth_layout.addWidget(self.get_version_but)
 
         # # 右侧伸缩空间（可选）
@@ -427,7 +469,8 @@ class DMSWindow(QMainWindow):
         self.start_button.setFont(font)
         self.start_button.setEnabled(False)
         self.start_button.setStyleSheet(button_style)
-        self.start_button.clicked.connect(lambda: start_to_softwar(self.mode_value, self.sn, self.ui_components, self.shadow, self.ssh))
+        self.start_button.clicked.connect(
+            lambda: run_task(self.ui_components, start_to_softwar, self.mode_value, self.sn, self.ui_components, self.shadow, self.ssh))
         self.sixth_layout.addWidget(self.start_button)
 
         # 将第六行的水平布局添加到主布局
@@ -435,13 +478,13 @@ class DMSWindow(QMainWindow):
         self.widgets[5].setLayout(self.sixth_layout)
 
         # 第七行的布局
-        self.seventh_layout = QHBoxLayout()
+        self.seventh_layout = QVBoxLayout()
         self.seventh_layout.setContentsMargins(0, 0, 0, 0)  # 无外边距
         self.seventh_layout.setSpacing(0)  # 禁用默认间距
 
         # 创建滚动区域（占满可用空间）
         self.scroll_area = QScrollArea()
-        self.scroll_area.setMinimumSize(700, 300)  # 设置固定尺寸
+        self.scroll_area.setMinimumSize(700, 200)  # 设置固定尺寸
         self.scroll_area.setWidgetResizable(True)  # 关键设置：允许内容自适应
         self.scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)  # 禁用水平滚动条
         self.scroll_area.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)  # 可伸缩
@@ -465,6 +508,12 @@ class DMSWindow(QMainWindow):
         # 添加滚动区域到布局
         self.seventh_layout.addWidget(self.scroll_area)
 
+        # 远程命令输出控制台（安装脚本等长时间命令的实时输出）
+        self.console = ConsoleWidget()
+        self.console.setMinimumSize(700, 150)
+        self.console.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
+        self.seventh_layout.addWidget(self.console)
+
         # 将第七行的水平布局添加到主布局
         self.seventh_layout.setAlignment(Qt.AlignLeft | Qt.AlignTop)
         self.widgets[6].setLayout(self.seventh_layout)
@@ -480,6 +529,21 @@ class DMSWindow(QMainWindow):
         self.log_down_label.setFont(font)
         self.next_to_last_layout.addWidget(self.log_down_label)
 
+        # 后台任务进度条（任务执行时显示）
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setFixedHeight(30)
+        self.progress_bar.setMinimumWidth(400)
+        self.progress_bar.setRange(0, 100)
+        self.progress_bar.setVisible(False)
+        self.next_to_last_layout.addWidget(self.progress_bar, stretch=1)
+
+        # 取消按钮（终止后台任务中正在执行的远程命令）
+        self.cancel_btn = QPushButton("取消")
+        self.cancel_btn.setFixedSize(80, 30)
+        self.cancel_btn.setVisible(False)
+        self.cancel_btn.clicked.connect(cancel_running_commands)
+        self.next_to_last_layout.addWidget(self.cancel_btn)
+
         # 将倒数第二行的水平布局添加到主布局
         self.next_to_last_layout.setAlignment(Qt.AlignLeft | Qt.AlignTop)
         self.widgets[-2].setLayout(self.next_to_last_layout)
@@ -522,7 +586,8 @@ class DMSWindow(QMainWindow):
         self.down_button.setFont(font)
         self.down_button.setEnabled(False)  # 初始化为禁用状态
         self.down_button.setStyleSheet(button_style)
-        self.down_button.clicked.connect(lambda: show_download_dialog(self.ssh, self.ui_components))
+        self.down_button.clicked.connect(
+            lambda: run_task(self.ui_components, show_download_dialog, self.ssh, self.ui_components))
         self.Last_layout.addWidget(self.down_button)
 
         # 将最后一行水平布局添加到主布局
@@ -535,8 +600,11 @@ class DMSWindow(QMainWindow):
                 'local_combo': self.local_combo,
                 'device_label': self.device_label,
                 'device_input': self.device_input,
+                'scan_btn': self.scan_btn,
                 'connect_btn': self.connet_btn,
-                'close_btn': self.colse_btn
+                'close_btn': self.colse_btn,
+                'fleet_btn': self.fleet_btn,
+                'mirror_btn': self.mirror_btn
             },
             'second_row': {
                 'device_type_label': self.device_type_label,
@@ -575,10 +643,13 @@ class DMSWindow(QMainWindow):
             'seventh_row': {
                 'scroll_area': self.scroll_area,
                 'content_widget': self.content_widget,
-                'content_layout': self.content_layout
+                'content_layout': self.content_layout,
+                'console': self.console
             },
             'next_to_last': {
                 'log_down_label': self.log_down_label,
+                'progress_bar': self.progress_bar,
+                'cancel_btn': self.cancel_btn,
             },
             'last_layout': {
                 'log_st_label': self.log_st_label,
@@ -0,0 +1,128 @@
+import inspect
+import sys
+import threading
+import traceback
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, Qt, pyqtSignal, pyqtSlot
+from log import logger
+
+
+class WorkerSignals(QObject):
+    """
+    后台任务的信号集合
+
+    信号对象在主线程中创建，后台线程 emit 后由 Qt 排队投递，
+    所以连接到这些信号上的回调都运行在主线程，可以直接操作界面控件。
+    """
+    progress = pyqtSignal(int)      # 进度百分比 0-100
+    status = pyqtSignal(object)     # 任务自定义的状态消息
+    result = pyqtSignal(object)     # 任务返回值
+    error = pyqtSignal(tuple)       # (异常类型, 异常对象, traceback字符串)
+    finished = pyqtSignal()         # 无论成功失败都会发出
+
+
+class Worker(QRunnable):
+    """
+    在 QThreadPool 中执行任意函数
+
+    如果目标函数声明了 progress_callback / status_callback 参数，
+    会自动注入 progress / status 信号的 emit 方法。
+    """
+
+    def __init__(self, fn, *args, **kwargs):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+        params = inspect.signature(fn).parameters
+        if 'progress_callback' in params:
+            self.kwargs['progress_callback'] = self.signals.progress.emit
+        if 'status_callback' in params:
+            self.kwargs['status_callback'] = self.signals.status.emit
+
+    @pyqtSlot()
+    def run(self):
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception:
+            exctype, value = sys.exc_info()[:2]
+            logger.error(f"后台任务 {getattr(self.fn, '__name__', self.fn)} 执行失败: {value}")
+            self.signals.error.emit((exctype, value, traceback.format_exc()))
+        else:
+            self.signals.result.emit(result)
+        finally:
+            self.signals.finished.emit()
+
+
+class _MainThreadInvoker(QObject):
+    """把可调用对象转发到主线程执行（阻塞等待执行完成）"""
+    invoke = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.invoke.connect(self._run, Qt.BlockingQueuedConnection)
+
+    @pyqtSlot(object)
+    def _run(self, call):
+        call()
+
+
+# 模块在主线程中导入，invoker 的线程归属就是主线程
+_invoker = _MainThreadInvoker()
+# 保存正在运行的 worker，避免信号对象在投递前被回收
+_active_workers = set()
+
+
+def ui_call(fn, *args, **kwargs):
+    """
+    在主线程中执行 fn 并返回其结果
+
+    后台任务中弹出 QMessageBox、读写控件都必须通过这里，
+    如果当前已经在主线程则直接调用。
+    """
+    if threading.current_thread() is threading.main_thread():
+        return fn(*args, **kwargs)
+
+    box = {}
+
+    def call():
+        try:
+            box['result'] = fn(*args, **kwargs)
+        except Exception as e:
+            box['error'] = e
+
+    _invoker.invoke.emit(call)
+    if 'error' in box:
+        raise box['error']
+    return box.get('result')
+
+
+def run_async(fn, *args, on_result=None, on_error=None, on_progress=None, on_status=None, on_finished=None,
+              **kwargs):
+    """
+    把 fn 提交到全局线程池执行
+
+    参数:
+        fn: 要在后台执行的函数
+        on_result / on_error / on_progress / on_status / on_finished: 主线程回调（可选）
+
+    返回:
+        Worker: 已提交的任务对象
+    """
+    worker = Worker(fn, *args, **kwargs)
+    if on_result:
+        worker.signals.result.connect(on_result)
+    if on_error:
+        worker.signals.error.connect(on_error)
+    if on_progress:
+        worker.signals.progress.connect(on_progress)
+    if on_status:
+        worker.signals.status.connect(on_status)
+    if on_finished:
+        worker.signals.finished.connect(on_finished)
+    worker.signals.finished.connect(lambda: _active_workers.discard(worker))
+
+    _active_workers.add(worker)
+    QThreadPool.globalInstance().start(worker)
+    return worker